@@ -5,14 +5,52 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from config import config
+from app.services.arranque import RegistroArranque, CargaDiferidaBlueprints, registrar_blueprint
+from app.services import replica
+from app.services.tareas import cola
+from app.services.tiempo_real import canal
+from app.services.eventos import bus
+from app.services import reportes_async
+from app.cli import registrar_comandos
 
 # Inicializar extensiones
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': replica.SesionEnrutada})
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Por favor inicia sesión para acceder a esta página.'
 login_manager.login_message_category = 'warning'
 
+# Blueprints del sistema: (módulo, atributo, prefijo de URL)
+BLUEPRINTS = [
+    ('app.controllers.main_controller', 'main_bp', None),
+    ('app.controllers.auth_controller', 'auth_bp', '/auth'),
+    ('app.controllers.propietario_controller', 'propietario_bp', '/propietarios'),
+    ('app.controllers.mascota_controller', 'mascota_bp', '/mascotas'),
+    ('app.controllers.especie_controller', 'especie_bp', '/especies'),
+    ('app.controllers.veterinario_controller', 'veterinario_bp', '/veterinarios'),
+    ('app.controllers.consulta_controller', 'consulta_bp', '/consultas'),
+    ('app.controllers.tratamiento_controller', 'tratamiento_bp', '/tratamientos'),
+    ('app.controllers.vacunacion_controller', 'vacunacion_bp', '/vacunacion'),
+    ('app.controllers.reportes_controller', 'reportes_bp', '/reportes'),
+    ('app.controllers.servicio_controller', 'servicio_bp', '/servicios'),
+    ('app.controllers.facturacion_controller', 'facturacion_bp', '/facturacion'),
+    ('app.controllers.usuario_controller', 'usuario_bp', '/usuarios'),
+    ('app.controllers.tareas_controller', 'tareas_bp', '/tareas'),
+    ('app.controllers.exportar_controller', 'exportar_bp', '/exportar'),
+]
+
+# Módulos que registran tareas en segundo plano (@cola.tarea)
+MODULOS_TAREAS = [
+    'app.controllers.propietario_controller',
+    'app.controllers.reportes_controller',
+    'app.controllers.vacunacion_controller',
+    'app.services.archivo',
+    'app.services.cobranza',
+    'app.services.facturas',
+    'app.services.importacion',
+    'app.services.instantaneas',
+]
+
 
 def create_app(config_name='default'):
     """
@@ -20,44 +58,36 @@ def create_app(config_name='default'):
     """
     app = Flask(__name__)
     
+    registro = RegistroArranque()
+    
     # Cargar configuración
-    app.config.from_object(config[config_name])
+    with registro.fase('configuracion'):
+        app.config.from_object(config[config_name])
     
     # Inicializar extensiones con la app
-    db.init_app(app)
-    login_manager.init_app(app)
+    with registro.fase('extensiones'):
+        replica.configurar(app)
+        db.init_app(app)
+        login_manager.init_app(app)
+        cola.init_app(app, MODULOS_TAREAS)
+        canal.init_app(app)
+        bus.init_app(app)
+        reportes_async.configurar(app)
+        registrar_comandos(app)
     
     # ============================================
     # REGISTRAR BLUEPRINTS (Controladores)
     # ============================================
+    # Con LAZY_BLUEPRINTS los controladores (y los modelos que importan)
+    # se cargan en la primera petición en lugar de durante el arranque
     
-    from app.controllers.main_controller import main_bp
-    from app.controllers.auth_controller import auth_bp
-    from app.controllers.propietario_controller import propietario_bp
-    from app.controllers.mascota_controller import mascota_bp
-    from app.controllers.especie_controller import especie_bp
-    from app.controllers.veterinario_controller import veterinario_bp
-    from app.controllers.consulta_controller import consulta_bp
-    from app.controllers.tratamiento_controller import tratamiento_bp
-    from app.controllers.vacunacion_controller import vacunacion_bp
-    from app.controllers.reportes_controller import reportes_bp
-    from app.controllers.servicio_controller import servicio_bp
-    from app.controllers.facturacion_controller import facturacion_bp
-    from app.controllers.usuario_controller import usuario_bp
-
-    app.register_blueprint(main_bp)
-    app.register_blueprint(auth_bp, url_prefix='/auth')
-    app.register_blueprint(propietario_bp, url_prefix='/propietarios')
-    app.register_blueprint(mascota_bp, url_prefix='/mascotas')
-    app.register_blueprint(especie_bp, url_prefix='/especies')
-    app.register_blueprint(veterinario_bp, url_prefix='/veterinarios')
-    app.register_blueprint(consulta_bp, url_prefix='/consultas')
-    app.register_blueprint(tratamiento_bp, url_prefix='/tratamientos')
-    app.register_blueprint(vacunacion_bp, url_prefix='/vacunacion')
-    app.register_blueprint(reportes_bp, url_prefix='/reportes')
-    app.register_blueprint(servicio_bp, url_prefix='/servicios')
-    app.register_blueprint(facturacion_bp, url_prefix='/facturacion')
-    app.register_blueprint(usuario_bp, url_prefix='/usuarios')
+    if app.config.get('LAZY_BLUEPRINTS'):
+        app.wsgi_app = CargaDiferidaBlueprints(app, BLUEPRINTS, registro)
+    else:
+        for modulo, atributo, url_prefix in BLUEPRINTS:
+            registrar_blueprint(app, modulo, atributo, url_prefix, registro)
+    
+    app.extensions['vetcare_arranque'] = registro
 
     # ============================================
     # CONTEXT PROCESSORS (Variables globales para templates)
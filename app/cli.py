@@ -0,0 +1,187 @@
+"""
+Comandos de consola (flask <comando>)
+"""
+import io
+import time
+
+import click
+
+
+def registrar_comandos(app):
+    """Registra los comandos de consola de la aplicación"""
+
+    @app.cli.command('importar')
+    @click.argument('tipo', type=click.Choice(['propietarios', 'mascotas']))
+    @click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--lote', default=2000, show_default=True, help='Filas por transacción.')
+    @click.option('--errores', type=click.Path(dir_okay=False), help='Archivo CSV para el reporte de errores.')
+    def importar(tipo, archivo, lote, errores):
+        """Importa propietarios o mascotas desde un CSV."""
+        from app.services import importacion
+
+        inicio = time.perf_counter()
+        with io.open(archivo, encoding='utf-8-sig', newline='') as entrada:
+            resultado = importacion.importar(tipo, entrada, lote)
+        duracion = time.perf_counter() - inicio
+
+        click.echo(f'{resultado.total} filas leídas, {resultado.insertados} insertadas, '
+                   f'{resultado.num_errores} con errores ({duracion:.1f} s).')
+
+        if errores and resultado.num_errores:
+            with io.open(errores, 'w', encoding='utf-8-sig', newline='') as salida:
+                importacion.escribir_errores(resultado.errores, salida)
+            click.echo(f'Reporte de errores: {errores}')
+        else:
+            for linea, valor, mensaje in resultado.errores[:20]:
+                click.echo(f'  Línea {linea} ({valor}): {mensaje}')
+
+    @app.cli.group('recordatorios')
+    def recordatorios():
+        """Recordatorios de vacunación."""
+
+    @recordatorios.command('generar')
+    @click.option('--dias', type=int, help='Días de anticipación (REMINDERS_DAYS_BEFORE).')
+    def recordatorios_generar(dias):
+        """Crea los recordatorios de las vacunaciones próximas."""
+        from app.services import recordatorios as servicio
+
+        creados = servicio.generar(dias)
+        click.echo(f'{creados} recordatorios creados.')
+
+    @recordatorios.command('enviar')
+    @click.option('--max', 'max_envios', type=int, help='Máximo de recordatorios a enviar.')
+    def recordatorios_enviar(max_envios):
+        """Envía los recordatorios pendientes."""
+        from app.services import recordatorios as servicio
+
+        inicio = time.perf_counter()
+        resultado = servicio.despachar(max_envios=max_envios)
+        duracion = time.perf_counter() - inicio
+        click.echo(f"{resultado['enviados']} enviados, {resultado['fallidos']} con error ({duracion:.1f} s).")
+
+    @app.cli.group('indices')
+    def indices():
+        """Índices de la base de datos."""
+
+    @indices.command('verificar')
+    @click.option('--plan', 'mostrar_plan', is_flag=True, help='Muestra el plan de cada sentencia.')
+    def indices_verificar(mostrar_plan):
+        """Revisa que las consultas clave usen índices (EXPLAIN QUERY PLAN en SQLite)."""
+        from app.services import planes
+
+        resultados = planes.verificar()
+        fallidas = 0
+        for r in resultados:
+            if r['problemas']:
+                fallidas += 1
+            estado = 'ERROR' if r['problemas'] else ('AVISO' if r['avisos'] else 'OK')
+            click.echo(f"[{estado}] {r['consulta']}")
+            for detalle in r['plan'] if mostrar_plan else r['problemas'] + r['avisos']:
+                click.echo(f'    {detalle}')
+
+        click.echo(f'{len(resultados)} sentencias revisadas, {fallidas} recorren tablas completas.')
+        if fallidas:
+            raise SystemExit(1)
+
+    @app.cli.group('migraciones')
+    def migraciones():
+        """Migraciones de esquema (app/migraciones)."""
+
+    @migraciones.command('estado')
+    def migraciones_estado():
+        """Muestra las migraciones aplicadas y pendientes."""
+        from app.services import migraciones as servicio
+
+        hechas = servicio.aplicadas()
+        for migracion in servicio.disponibles():
+            aplicada = hechas.get(migracion.version)
+            marca = aplicada.fecha_aplicacion.strftime('%Y-%m-%d %H:%M') if aplicada else 'pendiente'
+            click.echo(f'{migracion.version:03d} {migracion.nombre:<30} {marca}  {migracion.descripcion}')
+        for relleno in servicio.estado_rellenos():
+            estado = 'completo' if relleno['completado'] else f"hasta id {relleno['ultimo_id']}"
+            click.echo(f"Relleno {relleno['nombre']}: {relleno['filas']} filas, {estado}")
+
+    @migraciones.command('aplicar')
+    @click.option('--hasta', type=int, help='Última versión a aplicar.')
+    def migraciones_aplicar(hasta):
+        """Aplica las migraciones pendientes."""
+        from app.services import migraciones as servicio
+
+        aplicadas = servicio.actualizar(hasta, salida=click.echo)
+        click.echo(f'{len(aplicadas)} migraciones aplicadas.')
+
+    @migraciones.command('marcar')
+    @click.argument('version', type=int)
+    def migraciones_marcar(version):
+        """Marca como aplicadas, sin ejecutarlas, las migraciones hasta VERSION."""
+        from app.services import migraciones as servicio
+
+        marcadas = servicio.marcar_hasta(version)
+        click.echo(f'{len(marcadas)} migraciones marcadas.')
+
+    @app.cli.command('archivar')
+    @click.option('--dias', type=int, help='Antigüedad mínima en días (ARCHIVE_AFTER_DAYS).')
+    def archivar(dias):
+        """Mueve las consultas y vacunaciones cerradas antiguas a las tablas de archivo."""
+        from app.services import archivo
+
+        inicio = time.perf_counter()
+        movidos = archivo.archivar(dias)
+        duracion = time.perf_counter() - inicio
+        click.echo(f"{movidos['consultas']} consultas, {movidos['tratamientos']} tratamientos y "
+                   f"{movidos['vacunaciones']} vacunaciones archivadas ({duracion:.1f} s).")
+        for tabla, cantidad in archivo.contar().items():
+            click.echo(f"  {tabla}: {cantidad['en_uso']} en uso, {cantidad['archivadas']} archivadas")
+
+    @app.cli.group('facturas')
+    def facturas():
+        """Facturación."""
+
+    @facturas.command('verificar')
+    @click.option('--reparar', is_flag=True, help='Corrige las facturas con diferencias.')
+    def facturas_verificar(reparar):
+        """Compara num_items, monto_pagado y saldo_pendiente de cada factura con sus detalles y pagos."""
+        from app.services import facturas as servicio
+
+        desviadas = servicio.verificar(reparar)
+        for fila in desviadas[:50]:
+            click.echo(f'  {fila.numero_factura}: items {fila.num_items} -> {fila.num_items_esperado}, '
+                       f'pagado {float(fila.monto_pagado or 0):.2f} -> {float(fila.pagado_esperado):.2f}, '
+                       f'saldo {float(fila.saldo_pendiente or 0):.2f} -> {float(fila.saldo_esperado):.2f}')
+        accion = 'reparadas' if reparar else 'con diferencias'
+        click.echo(f'{len(desviadas)} facturas {accion}.')
+        if desviadas and not reparar:
+            raise SystemExit(1)
+
+    @app.cli.group('instantaneas')
+    def instantaneas():
+        """Instantáneas por columnas para los reportes (app/services/instantaneas.py)."""
+
+    @instantaneas.command('exportar')
+    @click.option('--completo', is_flag=True, help='Vuelve a exportar todos los meses.')
+    @click.option('--tabla', 'tablas', multiple=True, help='Tabla a exportar (se puede repetir).')
+    def instantaneas_exportar(completo, tablas):
+        """Exporta los meses recientes y los que faltan (p. ej. cada noche)."""
+        from app.services import instantaneas as servicio
+
+        desconocidas = set(tablas) - set(servicio.TABLAS)
+        if desconocidas:
+            raise click.BadParameter(', '.join(sorted(desconocidas)), param_hint='--tabla')
+        inicio = time.perf_counter()
+        resultado = servicio.exportar(list(tablas) or None, completo, salida=click.echo)
+        duracion = time.perf_counter() - inicio
+        for tabla, cantidad in resultado.items():
+            click.echo(f"{tabla}: {cantidad['meses']} meses, {cantidad['filas']} filas")
+        click.echo(f'Exportación terminada ({duracion:.1f} s).')
+
+    @instantaneas.command('estado')
+    def instantaneas_estado():
+        """Muestra los meses y filas exportados de cada tabla."""
+        from app.services import instantaneas as servicio
+
+        for tabla, resumen in servicio.estado().items():
+            if not resumen['meses']:
+                click.echo(f'{tabla:<22} sin exportar')
+                continue
+            click.echo(f"{tabla:<22} {resumen['desde']} a {resumen['hasta']} ({resumen['meses']} meses), "
+                       f"{resumen['filas']} filas, exportado {resumen['generado']}")
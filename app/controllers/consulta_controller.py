@@ -2,19 +2,26 @@
 Controlador de Consultas
 CRUD para la gestión de consultas médicas
 """
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort
 from flask_login import login_required
 from app import db
+from app.services.replica import usar_replica
 from app.models.consulta import Consulta
+from app.models.archivo import con_archivo
+from app.models.tratamiento import Tratamiento
+from app.models.fechas import en_dia
 from app.models.mascota import Mascota
 from app.models.veterinario import Veterinario
-from datetime import datetime
+from app.models.servicio import Servicio
+from app.services import agenda
+from datetime import datetime, timedelta
 
 consulta_bp = Blueprint('consultas', __name__)
 
 
 @consulta_bp.route('/')
 @login_required
+@usar_replica
 def index():
     """Lista todas las consultas"""
     estado = request.args.get('estado', '')
@@ -28,7 +35,7 @@ def index():
     if fecha:
         try:
             fecha_dt = datetime.strptime(fecha, '%Y-%m-%d').date()
-            query = query.filter(db.func.cast(Consulta.fecha_hora, db.Date) == fecha_dt)
+            query = query.filter(en_dia(Consulta.fecha_hora, fecha_dt))
         except ValueError:
             pass
     
@@ -56,6 +63,7 @@ def create():
     if request.method == 'POST':
         id_mascota = request.form.get('id_mascota', type=int)
         id_veterinario = request.form.get('id_veterinario', type=int)
+        id_servicio = request.form.get('id_servicio', type=int)
         fecha = request.form.get('fecha', '')
         hora = request.form.get('hora', '')
         motivo = request.form.get('motivo', '').strip()
@@ -77,60 +85,67 @@ def create():
         if errores:
             for error in errores:
                 flash(error, 'danger')
-            mascotas = Mascota.get_activas()
-            veterinarios = Veterinario.get_activos()
-            return render_template('consultas/create.html', 
-                                 mascotas=mascotas,
-                                 veterinarios=veterinarios)
+            return _render_create()
         
         # Combinar fecha y hora
         try:
             fecha_hora = datetime.strptime(f'{fecha} {hora}', '%Y-%m-%d %H:%M')
         except ValueError:
             flash('Formato de fecha/hora inválido.', 'danger')
-            mascotas = Mascota.get_activas()
-            veterinarios = Veterinario.get_activos()
-            return render_template('consultas/create.html', 
-                                 mascotas=mascotas,
-                                 veterinarios=veterinarios)
+            return _render_create()
         
         consulta = Consulta(
             id_mascota=id_mascota,
             id_veterinario=id_veterinario,
+            id_servicio=id_servicio,
             fecha_hora=fecha_hora,
             motivo=motivo,
             estado=Consulta.ESTADO_PROGRAMADA
         )
         
         try:
-            db.session.add(consulta)
-            db.session.commit()
+            # Evitar cruces con la agenda del veterinario (comprobación y
+            # guardado con la fila del veterinario bloqueada)
+            ocupado = agenda.reservar(consulta, agenda.duracion_servicio(id_servicio))
+            if ocupado:
+                flash(f'El veterinario ya tiene una consulta de {ocupado[0].strftime("%H:%M")} '
+                      f'a {ocupado[1].strftime("%H:%M")}. Elija otro horario.', 'danger')
+                return _render_create()
             flash('Consulta programada exitosamente.', 'success')
             return redirect(url_for('consultas.show', id=consulta.id_consulta))
         except Exception as e:
             db.session.rollback()
             flash(f'Error: {str(e)}', 'danger')
     
-    mascotas = Mascota.get_activas()
-    veterinarios = Veterinario.get_activos()
-    mascota_id = request.args.get('mascota', type=int)
-    
+    return _render_create()
+
+
+def _render_create():
+    """Formulario de nueva consulta"""
     return render_template('consultas/create.html', 
-                         mascotas=mascotas,
-                         veterinarios=veterinarios,
-                         mascota_id=mascota_id)
+                         mascotas=Mascota.get_activas(),
+                         veterinarios=Veterinario.get_activos(),
+                         servicios=Servicio.get_activos(),
+                         mascota_id=request.args.get('mascota', type=int))
 
 
 @consulta_bp.route('/<int:id>')
 @login_required
 def show(id):
     """Ver detalle de una consulta"""
-    consulta = Consulta.query.get_or_404(id)
-    tratamientos = consulta.tratamientos.all()
+    consulta = Consulta.query.get(id)
+    archivada = consulta is None
+    if archivada:
+        consulta = Consulta.get_archivada(id) or abort(404)
+        T = con_archivo(Tratamiento, id_consulta=id)
+        tratamientos = db.session.query(T).order_by(T.id_tratamiento).all()
+    else:
+        tratamientos = consulta.tratamientos.all()
     
     return render_template('consultas/show.html', 
                          consulta=consulta,
-                         tratamientos=tratamientos)
+                         tratamientos=tratamientos,
+                         archivada=archivada)
 
 
 @consulta_bp.route('/<int:id>/atender', methods=['GET', 'POST'])
@@ -198,6 +213,67 @@ def cancelar(id):
 @consulta_bp.route('/api/by-mascota/<int:id>')
 @login_required
 def api_by_mascota(id):
-    """API: Obtener historial de una mascota"""
-    consultas = Consulta.get_by_mascota(id)
+    """API: Obtener historial de una mascota (?completo=1 incluye las archivadas)"""
+    consultas = Consulta.get_by_mascota(id, completo=request.args.get('completo') == '1')
     return jsonify([c.to_dict() for c in consultas])
+
+
+@consulta_bp.route('/api/horarios-libres')
+@login_required
+def api_horarios_libres():
+    """API: Próximos horarios libres de un veterinario (o de cualquiera)"""
+    id_veterinario = request.args.get('veterinario', type=int)
+    id_servicio = request.args.get('servicio', type=int)
+    cantidad = min(request.args.get('n', 5, type=int), 50)
+    desde = request.args.get('desde', '')
+    
+    try:
+        desde = max(datetime.strptime(desde, '%Y-%m-%d'), datetime.now()) if desde else datetime.now()
+    except ValueError:
+        return jsonify({'error': 'Fecha inválida'}), 400
+    
+    if id_veterinario:
+        veterinarios = [Veterinario.query.get_or_404(id_veterinario)]
+    else:
+        veterinarios = Veterinario.get_activos()
+    nombres = {v.id_veterinario: v.nombre for v in veterinarios}
+    
+    duracion = agenda.duracion_servicio(id_servicio)
+    libres = agenda.proximos_libres(list(nombres), duracion, desde, cantidad)
+    
+    return jsonify({
+        'duracion_minutos': duracion,
+        'horarios': [{
+            'veterinario_id': id_vet,
+            'veterinario': nombres[id_vet],
+            'fecha': inicio.strftime('%Y-%m-%d'),
+            'hora': inicio.strftime('%H:%M'),
+            'hora_fin': fin.strftime('%H:%M')
+        } for id_vet, inicio, fin in libres]
+    })
+
+
+@consulta_bp.route('/api/disponibilidad')
+@login_required
+def api_disponibilidad():
+    """API: Verificar si un veterinario está libre en una fecha y hora"""
+    id_veterinario = request.args.get('veterinario', type=int)
+    id_servicio = request.args.get('servicio', type=int)
+    
+    try:
+        inicio = datetime.strptime(
+            f"{request.args.get('fecha', '')} {request.args.get('hora', '')}", '%Y-%m-%d %H:%M')
+    except ValueError:
+        return jsonify({'error': 'Fecha u hora inválida'}), 400
+    if not id_veterinario:
+        return jsonify({'error': 'Debe indicar el veterinario'}), 400
+    
+    duracion = agenda.duracion_servicio(id_servicio)
+    ocupado = agenda.verificar_disponibilidad(id_veterinario, inicio, duracion)
+    
+    return jsonify({
+        'disponible': ocupado is None,
+        'hora_fin': (inicio + timedelta(minutes=duracion)).strftime('%H:%M'),
+        'ocupado_desde': ocupado[0].strftime('%H:%M') if ocupado else None,
+        'ocupado_hasta': ocupado[1].strftime('%H:%M') if ocupado else None
+    })
@@ -0,0 +1,251 @@
+"""
+Controlador de Exportación
+Descarga de reportes y listados en CSV (streaming)
+"""
+from flask import Blueprint, request
+from flask_login import login_required
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from app import db
+from app.services.exportacion import respuesta_csv, respuesta_filas_csv
+from app.services import caja
+from app.services import cobranza
+from app.models.archivo import con_archivo
+from app.models.consulta import Consulta
+from app.models.mascota import Mascota
+from app.models.especie import Especie
+from app.models.propietario import Propietario
+from app.models.veterinario import Veterinario
+from app.models.factura import Factura, DetalleFactura
+from app.models.calendario_vacunacion import CalendarioVacunacion
+from app.models.vacuna import Vacuna
+from app.models.fechas import en_rango, leer_rango
+from datetime import datetime, date, timedelta
+
+exportar_bp = Blueprint('exportar', __name__)
+
+
+def _rango_fechas(dias_defecto):
+    """
+    Lee fecha_inicio/fecha_fin como en los reportes; retorna [inicio, fin) y
+    las fechas en texto (tomadas del rango ya validado, no de la petición)
+    """
+    fecha_inicio = request.args.get('fecha_inicio', '') or \
+        (date.today() - timedelta(days=dias_defecto)).strftime('%Y-%m-%d')
+    fecha_fin = request.args.get('fecha_fin', '') or date.today().strftime('%Y-%m-%d')
+
+    f_inicio, f_fin = leer_rango(fecha_inicio, fecha_fin, dias_defecto)
+    return f_inicio, f_fin, f_inicio.strftime('%Y-%m-%d'), (f_fin - timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+@exportar_bp.route('/consultas.csv')
+@login_required
+def consultas():
+    """Exportar consultas (mismos filtros que el reporte de consultas por período)"""
+    estado = request.args.get('estado', '')
+    f_inicio, f_fin, fecha_inicio, fecha_fin = _rango_fechas(30)
+
+    # Consultas en uso y archivadas
+    C = con_archivo(Consulta, **({'estado': estado} if estado else {}))
+    consulta = select(
+        C.id_consulta,
+        C.fecha_hora,
+        Mascota.nombre,
+        Especie.nombre,
+        Propietario.nombre,
+        Propietario.documento,
+        Veterinario.nombre,
+        C.motivo,
+        C.diagnostico,
+        C.estado,
+        C.costo
+    ).join(Mascota, Mascota.id_mascota == C.id_mascota)\
+     .join(Especie, Especie.id_especie == Mascota.id_especie)\
+     .join(Propietario, Propietario.id_propietario == Mascota.id_propietario)\
+     .join(Veterinario, Veterinario.id_veterinario == C.id_veterinario)\
+     .where(en_rango(C.fecha_hora, f_inicio, f_fin))\
+     .order_by(C.fecha_hora.desc())
+
+    return respuesta_csv(
+        f'consultas_{fecha_inicio}_{fecha_fin}.csv',
+        ['ID', 'Fecha y hora', 'Mascota', 'Especie', 'Propietario', 'Documento',
+         'Veterinario', 'Motivo', 'Diagnóstico', 'Estado', 'Costo'],
+        consulta
+    )
+
+
+@exportar_bp.route('/facturas.csv')
+@login_required
+def facturas():
+    """Exportar facturas con sus detalles (mismos filtros que el listado de facturación)"""
+    busqueda = request.args.get('q', '')
+    estado = request.args.get('estado', '')
+    fecha_desde = request.args.get('fecha_desde', '')
+    fecha_hasta = request.args.get('fecha_hasta', '')
+
+    MascotaFactura = aliased(Mascota)
+
+    consulta = select(
+        Factura.numero_factura,
+        Factura.fecha_emision,
+        Propietario.nombre,
+        Propietario.documento,
+        MascotaFactura.nombre,
+        Factura.estado,
+        Factura.metodo_pago,
+        Factura.subtotal,
+        Factura.descuento,
+        Factura.igv,
+        Factura.total,
+        Factura.monto_pagado,
+        DetalleFactura.descripcion,
+        DetalleFactura.cantidad,
+        DetalleFactura.precio_unitario,
+        DetalleFactura.descuento,
+        DetalleFactura.subtotal
+    ).join(Propietario, Propietario.id_propietario == Factura.id_propietario)\
+     .outerjoin(MascotaFactura, MascotaFactura.id_mascota == Factura.id_mascota)\
+     .outerjoin(DetalleFactura, DetalleFactura.id_factura == Factura.id_factura)\
+     .where(*Factura.criterios_filtro(busqueda, estado, fecha_desde, fecha_hasta))\
+     .order_by(Factura.fecha_emision.desc(), Factura.id_factura, DetalleFactura.id_detalle)
+
+    return respuesta_csv(
+        'facturas.csv',
+        ['Número', 'Fecha emisión', 'Propietario', 'Documento', 'Mascota', 'Estado',
+         'Método de pago', 'Subtotal', 'Descuento', 'IGV', 'Total', 'Monto pagado',
+         'Detalle', 'Cantidad', 'Precio unitario', 'Descuento detalle', 'Subtotal detalle'],
+        consulta
+    )
+
+
+@exportar_bp.route('/cierre-caja.csv')
+@login_required
+def cierre_caja():
+    """Exportar el cierre de caja (mismos filtros que el reporte; por defecto, hoy)"""
+    f_inicio, f_fin, fecha_inicio, fecha_fin = _rango_fechas(0)
+    datos = caja.reporte(f_inicio.date(), (f_fin - timedelta(days=1)).date())
+
+    return respuesta_filas_csv(
+        f'cierre_caja_{fecha_inicio}_{fecha_fin}.csv',
+        ['Fecha', 'Estado', 'Agrupación', 'Clave', 'Pagos', 'Total'],
+        caja.filas_csv(datos)
+    )
+
+
+@exportar_bp.route('/antiguedad-saldos.csv')
+@login_required
+def antiguedad_saldos():
+    """Exportar la antigüedad de saldos por propietario (opcionalmente solo un tramo)"""
+    tramo = request.args.get('tramo', '')
+    minimo = request.args.get('minimo', 0, type=float)
+    if tramo not in [t[0] for t in cobranza.TRAMOS]:
+        tramo = None
+
+    return respuesta_csv(
+        f'antiguedad_saldos_{date.today().isoformat()}.csv',
+        ['ID', 'Propietario', 'Documento', 'Teléfono'] +
+        [f'{etiqueta} días' for _, etiqueta, *_ in cobranza.TRAMOS] +
+        ['Total', 'Facturas', 'Factura más antigua'],
+        cobranza.consulta_resumen(minimo=minimo, tramo=tramo)
+    )
+
+
+@exportar_bp.route('/antiguedad-saldos-detalle.csv')
+@login_required
+def antiguedad_saldos_detalle():
+    """Exportar las facturas con saldo (de un propietario y/o de un tramo)"""
+    id_propietario = request.args.get('id_propietario', type=int)
+    tramo = request.args.get('tramo', '')
+    if tramo not in [t[0] for t in cobranza.TRAMOS]:
+        tramo = None
+
+    return respuesta_csv(
+        f'facturas_con_saldo_{date.today().isoformat()}.csv',
+        ['ID', 'Número', 'Fecha emisión', 'ID propietario', 'Propietario',
+         'Total', 'Monto pagado', 'Saldo', 'Estado'],
+        cobranza.consulta_detalle(id_propietario, tramo=tramo)
+    )
+
+
+@exportar_bp.route('/vacunacion.csv')
+@login_required
+def vacunacion():
+    """Exportar historial de vacunación (opcionalmente de una mascota)"""
+    mascota_id = request.args.get('mascota', type=int)
+    estado = request.args.get('estado', '')
+
+    # Vacunaciones en uso y archivadas
+    filtros = {}
+    if mascota_id:
+        filtros['id_mascota'] = mascota_id
+    if estado:
+        filtros['estado'] = estado
+    V = con_archivo(CalendarioVacunacion, **filtros)
+
+    consulta = select(
+        V.id_calendario,
+        Mascota.nombre,
+        Propietario.nombre,
+        Vacuna.nombre,
+        V.dosis_numero,
+        V.fecha_programada,
+        V.fecha_aplicacion,
+        V.fecha_proxima,
+        V.estado,
+        V.lote_vacuna,
+        Veterinario.nombre
+    ).join(Mascota, Mascota.id_mascota == V.id_mascota)\
+     .join(Propietario, Propietario.id_propietario == Mascota.id_propietario)\
+     .join(Vacuna, Vacuna.id_vacuna == V.id_vacuna)\
+     .outerjoin(Veterinario, Veterinario.id_veterinario == V.id_veterinario)\
+     .order_by(V.fecha_programada.desc())
+
+    nombre = f'vacunacion_mascota_{mascota_id}.csv' if mascota_id else 'vacunacion.csv'
+    return respuesta_csv(
+        nombre,
+        ['ID', 'Mascota', 'Propietario', 'Vacuna', 'Dosis', 'Fecha programada',
+         'Fecha aplicación', 'Próxima dosis', 'Estado', 'Lote', 'Veterinario'],
+        consulta
+    )
+
+
+@exportar_bp.route('/propietarios.csv')
+@login_required
+def propietarios():
+    """Exportar propietarios activos con sus mascotas (misma búsqueda que el listado)"""
+    busqueda = request.args.get('q', '')
+
+    consulta = select(
+        Propietario.id_propietario,
+        Propietario.nombre,
+        Propietario.documento,
+        Propietario.telefono,
+        Propietario.email,
+        Propietario.direccion,
+        Mascota.id_mascota,
+        Mascota.nombre,
+        Especie.nombre,
+        Mascota.raza,
+        Mascota.sexo,
+        Mascota.fecha_nacimiento
+    ).outerjoin(Mascota, db.and_(Mascota.id_propietario == Propietario.id_propietario,
+                                 Mascota.activo == True))\
+     .outerjoin(Especie, Especie.id_especie == Mascota.id_especie)\
+     .where(Propietario.activo == True)
+
+    if busqueda:
+        busqueda_like = f'%{busqueda}%'
+        consulta = consulta.where(db.or_(
+            Propietario.nombre.ilike(busqueda_like),
+            Propietario.documento.ilike(busqueda_like),
+            Propietario.telefono.ilike(busqueda_like)
+        ))
+
+    consulta = consulta.order_by(Propietario.nombre, Propietario.id_propietario, Mascota.nombre)
+
+    return respuesta_csv(
+        'propietarios_mascotas.csv',
+        ['ID propietario', 'Propietario', 'Documento', 'Teléfono', 'Email', 'Dirección',
+         'ID mascota', 'Mascota', 'Especie', 'Raza', 'Sexo', 'Fecha nacimiento'],
+        consulta
+    )
@@ -5,63 +5,59 @@ Gestión completa de facturas y cobros
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from app import db
-from app.models.factura import Factura, DetalleFactura
+from app.services.replica import usar_replica
+from app.models.factura import Factura, DetalleFactura, Pago
+from app.models.fechas import leer_rango
+from app.services.facturas import registrar_pago, PagoRechazado
 from app.models.servicio import Servicio
 from app.models.propietario import Propietario
 from app.models.mascota import Mascota
 from app.models.consulta import Consulta
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 facturacion_bp = Blueprint('facturacion', __name__)
 
 
 @facturacion_bp.route('/')
 @login_required
+@usar_replica
 def index():
     """Lista de facturas con filtros"""
     busqueda = request.args.get('q', '')
     estado = request.args.get('estado', '')
     fecha_desde = request.args.get('fecha_desde', '')
     fecha_hasta = request.args.get('fecha_hasta', '')
+    orden = request.args.get('orden', '')
 
-    query = Factura.query
+    criterios = Factura.criterios_filtro(busqueda, estado, fecha_desde, fecha_hasta)
 
+    query = Factura.query
     if busqueda:
-        busqueda_like = f"%{busqueda}%"
-        query = query.join(Propietario).filter(
-            db.or_(
-                Factura.numero_factura.ilike(busqueda_like),
-                Propietario.nombre.ilike(busqueda_like),
-                Propietario.documento.ilike(busqueda_like)
-            )
-        )
-
-    if estado:
-        query = query.filter_by(estado=estado)
-
-    if fecha_desde:
-        try:
-            fecha_desde_dt = datetime.strptime(fecha_desde, '%Y-%m-%d')
-            query = query.filter(Factura.fecha_emision >= fecha_desde_dt)
-        except ValueError:
-            pass
-
-    if fecha_hasta:
-        try:
-            fecha_hasta_dt = datetime.strptime(fecha_hasta, '%Y-%m-%d')
-            fecha_hasta_dt = fecha_hasta_dt.replace(hour=23, minute=59, second=59)
-            query = query.filter(Factura.fecha_emision <= fecha_hasta_dt)
-        except ValueError:
-            pass
+        query = query.join(Propietario)
+    query = query.filter(*criterios)
+
+    if orden == 'saldo':
+        facturas = query.order_by(Factura.saldo_pendiente.desc(), Factura.fecha_emision.desc()).all()
+    else:
+        facturas = query.order_by(Factura.fecha_emision.desc()).all()
+
+    # Estadísticas rápidas (una consulta agrupada por estado)
+    resumen = db.session.query(
+        Factura.estado, db.func.count(Factura.id_factura),
+        db.func.sum(Factura.saldo_pendiente), db.func.sum(Factura.monto_pagado)
+    )
+    if busqueda:
+        resumen = resumen.join(Propietario)
+    por_estado = {fila[0]: fila[1:] for fila in resumen.filter(*criterios).group_by(Factura.estado)}
 
-    facturas = query.order_by(Factura.fecha_emision.desc()).all()
+    def dato(estado, posicion):
+        return por_estado.get(estado, (0, 0, 0))[posicion] or 0
 
-    # Estadísticas rápidas
     stats = {
-        'total_pendiente': sum(float(f.saldo_pendiente) for f in facturas if f.estado in ['Pendiente', 'Pago Parcial']),
-        'total_pagado': sum(float(f.monto_pagado or 0) for f in facturas if f.estado == 'Pagada'),
-        'num_pendientes': len([f for f in facturas if f.estado == 'Pendiente']),
-        'num_pagadas': len([f for f in facturas if f.estado == 'Pagada'])
+        'total_pendiente': float(dato(Factura.ESTADO_PENDIENTE, 1)) + float(dato(Factura.ESTADO_PARCIAL, 1)),
+        'total_pagado': float(dato(Factura.ESTADO_PAGADA, 2)),
+        'num_pendientes': dato(Factura.ESTADO_PENDIENTE, 0),
+        'num_pagadas': dato(Factura.ESTADO_PAGADA, 0)
     }
 
     return render_template('facturacion/index.html',
@@ -70,6 +66,7 @@ def index():
                            estado_filtro=estado,
                            fecha_desde=fecha_desde,
                            fecha_hasta=fecha_hasta,
+                           orden=orden,
                            estados=Factura.ESTADOS,
                            stats=stats)
 
@@ -129,7 +126,8 @@ def show(id):
     """Ver detalle de una factura"""
     factura = Factura.query.get_or_404(id)
     detalles = factura.detalles.all()
-    return render_template('facturacion/show.html', factura=factura, detalles=detalles)
+    pagos = factura.pagos.all()
+    return render_template('facturacion/show.html', factura=factura, detalles=detalles, pagos=pagos)
 
 
 @facturacion_bp.route('/<int:id>/edit', methods=['GET', 'POST'])
@@ -242,7 +240,7 @@ def agregar_item(id):
 
     try:
         db.session.add(detalle)
-        factura.calcular_totales()
+        factura.agregar_detalle(detalle)
         db.session.commit()
         flash(f'Item "{descripcion}" agregado.', 'success')
     except Exception as e:
@@ -270,7 +268,7 @@ def quitar_item(id, id_detalle):
     try:
         descripcion = detalle.descripcion
         db.session.delete(detalle)
-        factura.calcular_totales()
+        factura.quitar_detalle(detalle)
         db.session.commit()
         flash(f'Item "{descripcion}" eliminado.', 'success')
     except Exception as e:
@@ -307,30 +305,23 @@ def pagar(id):
             flash('Monto inválido.', 'danger')
             return redirect(url_for('facturacion.pagar', id=id))
 
-        # Calcular nuevo monto pagado
-        monto_pagado_actual = float(factura.monto_pagado or 0)
-        nuevo_monto_pagado = monto_pagado_actual + monto
-        total = float(factura.total or 0)
-
-        factura.monto_pagado = nuevo_monto_pagado
-        factura.metodo_pago = metodo_pago
-        factura.fecha_pago = datetime.now()
-
-        # Determinar estado
-        if nuevo_monto_pagado >= total:
-            factura.estado = Factura.ESTADO_PAGADA
-            factura.monto_pagado = total  # No exceder el total
-            flash(f'Factura {factura.numero_factura} pagada completamente.', 'success')
-        else:
-            factura.estado = Factura.ESTADO_PARCIAL
-            flash(f'Pago parcial registrado. Saldo pendiente: S/ {factura.saldo_pendiente:.2f}', 'info')
-
+        # Inserta el pago y descuenta el saldo sin pisar pagos simultáneos
         try:
-            db.session.commit()
+            registrar_pago(id, monto, metodo_pago, current_user.id_usuario)
+        except PagoRechazado as e:
+            db.session.rollback()
+            flash(str(e), 'warning')
             return redirect(url_for('facturacion.show', id=id))
         except Exception as e:
             db.session.rollback()
             flash(f'Error al registrar pago: {str(e)}', 'danger')
+        else:
+            db.session.refresh(factura)
+            if factura.estado == Factura.ESTADO_PAGADA:
+                flash(f'Factura {factura.numero_factura} pagada completamente.', 'success')
+            else:
+                flash(f'Pago parcial registrado. Saldo pendiente: S/ {factura.saldo_pendiente:.2f}', 'info')
+            return redirect(url_for('facturacion.show', id=id))
 
     return render_template('facturacion/pagar.html',
                            factura=factura,
@@ -349,6 +340,7 @@ def anular(id):
 
     try:
         factura.estado = Factura.ESTADO_ANULADA
+        factura.actualizar_saldo()
         db.session.commit()
         flash(f'Factura {factura.numero_factura} anulada.', 'warning')
     except Exception as e:
@@ -472,3 +464,36 @@ def api_pendientes():
     """API para obtener facturas pendientes"""
     facturas = Factura.get_pendientes()
     return jsonify([f.to_dict() for f in facturas])
+
+
+@facturacion_bp.route('/api/deudores')
+@login_required
+@usar_replica
+def api_deudores():
+    """API para obtener los propietarios con deuda mayor a ?minimo="""
+    minimo = request.args.get('minimo', 0, type=float)
+    deudores = Factura.deudores(minimo)
+    nombres = dict(db.session.query(Propietario.id_propietario, Propietario.nombre).filter(
+        Propietario.id_propietario.in_([d.id_propietario for d in deudores])
+    )) if deudores else {}
+    return jsonify([{
+        'propietario_id': d.id_propietario,
+        'propietario': nombres.get(d.id_propietario),
+        'deuda': float(d.deuda),
+        'num_facturas': d.num_facturas
+    } for d in deudores])
+
+
+@facturacion_bp.route('/api/caja')
+@login_required
+@usar_replica
+def api_caja():
+    """API para obtener los totales de caja por día y método de pago"""
+    inicio, fin = leer_rango(request.args.get('fecha_inicio'), request.args.get('fecha_fin'), 0)
+    filas = Pago.resumen_diario(inicio, fin - timedelta(days=1))
+    return jsonify([{
+        'fecha': f.fecha.strftime('%Y-%m-%d'),
+        'metodo_pago': f.metodo_pago,
+        'num_pagos': f.num_pagos,
+        'total': float(f.total or 0)
+    } for f in filas])
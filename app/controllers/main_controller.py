@@ -2,9 +2,11 @@
 Controlador Principal
 Maneja las rutas principales del sistema
 """
-from flask import Blueprint, render_template, redirect, url_for
+from flask import Blueprint, render_template, redirect, url_for, jsonify, request, Response, current_app
 from flask_login import login_required, current_user
+from app import db
 from app.models import Consulta, CalendarioVacunacion, Mascota, Propietario
+from app.services.tiempo_real import canal
 
 main_bp = Blueprint('main', __name__)
 
@@ -45,7 +47,39 @@ def dashboard():
                          vacunas_vencidas=vacunas_vencidas)
 
 
+@main_bp.route('/eventos')
+@login_required
+def eventos():
+    """Flujo de eventos (SSE) para las pantallas en vivo"""
+    if canal.conexiones >= current_app.config.get('REALTIME_MAX_CLIENTS', 25):
+        # 204 indica al navegador que no reconecte; la página recarga periódicamente
+        return '', 204
+    
+    ultimo_id = request.headers.get('Last-Event-ID', type=int)
+    
+    # El flujo no usa la base de datos: liberar la conexión de la petición
+    db.session.remove()
+    
+    return Response(canal.flujo(ultimo_id), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
 @main_bp.route('/about')
 def about():
     """Página Acerca de"""
     return render_template('about.html')
+
+
+@main_bp.route('/health')
+def health():
+    """Verificación de estado para el balanceador / orquestador"""
+    try:
+        db.session.execute(db.text('SELECT 1'))
+        return jsonify({'status': 'ok', 'database': 'ok'})
+    except Exception:
+        db.session.rollback()
+        # El detalle (servidor, controlador) solo va al log: el endpoint es público
+        current_app.logger.exception('Health check: la base de datos no responde')
+        return jsonify({'status': 'error'}), 503
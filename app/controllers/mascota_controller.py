@@ -5,6 +5,8 @@ CRUD completo para la gestión de mascotas
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required
 from app import db
+from app.services.replica import usar_replica
+from app.services import historial_clinico
 from app.models.mascota import Mascota
 from app.models.propietario import Propietario
 from app.models.especie import Especie
@@ -15,6 +17,7 @@ mascota_bp = Blueprint('mascotas', __name__)
 
 @mascota_bp.route('/')
 @login_required
+@usar_replica
 def index():
     """Lista todas las mascotas"""
     busqueda = request.args.get('q', '')
@@ -123,13 +126,29 @@ def create():
 def show(id):
     """Ver detalle de una mascota"""
     mascota = Mascota.query.get_or_404(id)
-    consultas = mascota.consultas.order_by(db.desc('fecha_hora')).limit(10).all()
-    vacunaciones = mascota.vacunaciones.order_by(db.desc('fecha_programada')).limit(10).all()
     
     return render_template('mascotas/show.html', 
                          mascota=mascota,
-                         consultas=consultas,
-                         vacunaciones=vacunaciones)
+                         historial=historial_clinico.ventana(id))
+
+
+@mascota_bp.route('/<int:id>/historial')
+@login_required
+@usar_replica
+def historial(id):
+    """API: Línea de tiempo clínica por ventanas (?antes=<cursor>&n=20&tipos=consulta,factura&html=1)"""
+    tipos = [t for t in request.args.get('tipos', '').split(',') if t in historial_clinico.TIPOS]
+    try:
+        datos = historial_clinico.ventana(id,
+                                          antes=request.args.get('antes') or None,
+                                          limite=request.args.get('n', historial_clinico.LIMITE, type=int),
+                                          tipos=tipos or historial_clinico.TIPOS)
+    except historial_clinico.CursorInvalido:
+        return jsonify({'error': 'Cursor inválido'}), 400
+    
+    if request.args.get('html'):
+        datos['html'] = render_template('mascotas/_historial_eventos.html', eventos=datos['eventos'])
+    return jsonify(datos)
 
 
 @mascota_bp.route('/<int:id>/edit', methods=['GET', 'POST'])
@@ -2,16 +2,22 @@
 Controlador de Propietarios
 CRUD completo para la gestión de propietarios
 """
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+import io
+from flask import Blueprint, render_template, redirect, url_for, flash, request, Response, abort
 from flask_login import login_required
 from app import db
+from app.services.replica import usar_replica
 from app.models.propietario import Propietario
+from app.models.mascota import Mascota
+from app.services.tareas import cola
+from app.services import importacion
 
 propietario_bp = Blueprint('propietarios', __name__)
 
 
 @propietario_bp.route('/')
 @login_required
+@usar_replica
 def index():
     """Lista todos los propietarios"""
     busqueda = request.args.get('q', '')
@@ -150,11 +156,10 @@ def delete(id):
     try:
         # Eliminación lógica
         propietario.activo = False
-        # También desactivar sus mascotas
-        for mascota in propietario.mascotas:
-            mascota.activo = False
-        
         db.session.commit()
+        
+        # Sus mascotas se desactivan en segundo plano
+        cola.encolar('propietarios.desactivar_mascotas', id_propietario=id)
         flash(f'Propietario "{propietario.nombre}" eliminado.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -163,6 +168,77 @@ def delete(id):
     return redirect(url_for('propietarios.index'))
 
 
+# =====================================================
+# Importación masiva (CSV)
+# =====================================================
+
+@propietario_bp.route('/importar', methods=['GET', 'POST'])
+@login_required
+def importar():
+    """Importar propietarios o mascotas desde un archivo CSV"""
+    if request.method == 'POST':
+        tipo = request.form.get('tipo', '')
+        archivo = request.files.get('archivo')
+
+        if tipo not in importacion.TIPOS:
+            flash('Seleccione qué desea importar.', 'danger')
+        elif not archivo or not archivo.filename:
+            flash('Seleccione un archivo CSV.', 'danger')
+        else:
+            # Se guarda en la base de datos y se procesa en segundo plano
+            # (la tarea puede ejecutarse en otro servidor)
+            id_archivo = importacion.guardar_archivo(tipo, archivo.filename, archivo.read())
+            id_tarea = cola.encolar('importacion.csv', id_archivo=id_archivo)
+            return redirect(url_for('propietarios.importar_resultado', id_tarea=id_tarea))
+
+    return render_template('propietarios/importar.html')
+
+
+@propietario_bp.route('/importar/<id_tarea>')
+@login_required
+def importar_resultado(id_tarea):
+    """Progreso y resultado de una importación"""
+    tarea = cola.estado(id_tarea)
+    if tarea is None or tarea['tipo'] != 'importacion.csv':
+        abort(404)
+
+    return render_template('propietarios/importar.html',
+                         tarea=tarea,
+                         resultado=tarea.get('resultado'))
+
+
+@propietario_bp.route('/importar/<id_tarea>/errores.csv')
+@login_required
+def importar_errores(id_tarea):
+    """Descargar el reporte de errores de una importación"""
+    tarea = cola.estado(id_tarea)
+    if tarea is None or tarea['tipo'] != 'importacion.csv' or not tarea.get('resultado'):
+        abort(404)
+
+    salida = io.StringIO()
+    salida.write('\ufeff')
+    importacion.escribir_errores(tarea['resultado']['errores'], salida)
+
+    return Response(
+        salida.getvalue(),
+        mimetype='text/csv; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename="errores_importacion_{id_tarea}.csv"'}
+    )
+
+
+# =====================================================
+# Tareas en segundo plano
+# =====================================================
+
+@cola.tarea('propietarios.desactivar_mascotas', max_concurrencia=2)
+def desactivar_mascotas(id_propietario):
+    """Desactiva todas las mascotas de un propietario con un único UPDATE"""
+    total = Mascota.query.filter_by(id_propietario=id_propietario, activo=True)\
+        .update({Mascota.activo: False}, synchronize_session=False)
+    db.session.commit()
+    return {'mascotas_desactivadas': total}
+
+
 # API JSON para AJAX
 @propietario_bp.route('/api/search')
 @login_required
@@ -2,22 +2,74 @@
 Controlador de Reportes
 Generación de reportes y estadísticas
 """
-from flask import Blueprint, render_template, request
-from flask_login import login_required
+from flask import Blueprint, render_template, request, current_app, jsonify, flash, redirect, url_for
+from flask_login import login_required, current_user
 from app import db
+from app.services.replica import usar_replica, lectura_replica
+from app.services.tareas import cola
+from app.services import reportes_async
+from app.services import caja
+from app.services import cobranza
+from app.services import productividad
+from app.services import instantaneas
+from app.services.pronostico import pronostico
+from app.models.archivo import con_archivo
 from app.models.consulta import Consulta
+from app.models.fechas import en_rango, leer_rango
 from app.models.mascota import Mascota
+from app.models.propietario import Propietario
 from app.models.especie import Especie
 from app.models.tratamiento import Tratamiento
-from app.models.veterinario import Veterinario
 from app.models.calendario_vacunacion import CalendarioVacunacion
 from app.models.vacuna import Vacuna
+from collections import Counter
 from datetime import datetime, date, timedelta
 from sqlalchemy import func
 
 reportes_bp = Blueprint('reportes', __name__)
 
 
+# =====================================================
+# Utilidades
+# =====================================================
+
+def _rango_fechas(fecha_inicio, fecha_fin, dias_defecto):
+    """Convierte las fechas del filtro en un rango [inicio, fin)"""
+    return leer_rango(fecha_inicio, fecha_fin, dias_defecto)
+
+
+def _fuente():
+    """Fuente de los reportes históricos: ?fuente= o REPORTS_SOURCE ('bd' o 'instantanea')"""
+    fuente = request.args.get('fuente') or current_app.config.get('REPORTS_SOURCE', 'bd')
+    return fuente if fuente in ('bd', 'instantanea') else 'bd'
+
+
+def _por_nombre(cuenta, nombres):
+    """Suma un Counter {id: total} por nombre (como GROUP BY nombre): [[nombre, total], ...]"""
+    por_nombre = Counter()
+    for clave, total in cuenta.items():
+        por_nombre[nombres.get(clave, '-')] += total
+    return [[nombre, total] for nombre, total in por_nombre.most_common()]
+
+
+def _obtener_reporte(tipo, parametros):
+    """
+    Calcula un reporte en la petición o en segundo plano; en ambos casos el
+    resultado se comparte por la caché de reportes. Se usa el modo asíncrono con ?modo=async o cuando el rango supera
+    REPORTS_ASYNC_MIN_DAYS días (?modo=sync lo desactiva).
+    Retorna (datos, id_tarea); datos es None mientras se genera.
+    """
+    modo = request.args.get('modo', '')
+    f_inicio, f_fin = _rango_fechas(parametros['fecha_inicio'], parametros['fecha_fin'], 0)
+    asincrono = modo == 'async' or (
+        modo != 'sync' and (f_fin - f_inicio).days > current_app.config.get('REPORTS_ASYNC_MIN_DAYS', 90)
+    )
+    
+    if not asincrono:
+        return reportes_async.calcular(tipo, parametros), None
+    return reportes_async.solicitar(tipo, parametros)
+
+
 @reportes_bp.route('/')
 @login_required
 def index():
@@ -27,6 +79,7 @@ def index():
 
 @reportes_bp.route('/consultas-periodo')
 @login_required
+@usar_replica
 def consultas_periodo():
     """Reporte de consultas por período"""
     fecha_inicio = request.args.get('fecha_inicio', '')
@@ -38,17 +91,13 @@ def consultas_periodo():
     if not fecha_fin:
         fecha_fin = date.today().strftime('%Y-%m-%d')
     
-    try:
-        f_inicio = datetime.strptime(fecha_inicio, '%Y-%m-%d')
-        f_fin = datetime.strptime(fecha_fin, '%Y-%m-%d') + timedelta(days=1)
-    except ValueError:
-        f_inicio = datetime.now() - timedelta(days=30)
-        f_fin = datetime.now()
+    f_inicio, f_fin = _rango_fechas(fecha_inicio, fecha_fin, 30)
     
-    consultas = Consulta.query.filter(
-        Consulta.fecha_hora >= f_inicio,
-        Consulta.fecha_hora < f_fin
-    ).order_by(Consulta.fecha_hora.desc()).all()
+    # Incluye las consultas archivadas del período
+    C = con_archivo(Consulta)
+    consultas = db.session.query(C).filter(
+        en_rango(C.fecha_hora, f_inicio, f_fin)
+    ).order_by(C.fecha_hora.desc()).all()
     
     # Estadísticas
     total = len(consultas)
@@ -56,14 +105,13 @@ def consultas_periodo():
     canceladas = sum(1 for c in consultas if c.estado == 'Cancelada')
     ingresos = sum(float(c.costo or 0) for c in consultas if c.estado == 'Completada')
     
-    # Por día
+    # Por día (columna calculada `fecha`, copiada también al archivo)
     consultas_por_dia = db.session.query(
-        func.cast(Consulta.fecha_hora, db.Date).label('fecha'),
-        func.count(Consulta.id_consulta).label('total')
+        C.fecha,
+        func.count(C.id_consulta).label('total')
     ).filter(
-        Consulta.fecha_hora >= f_inicio,
-        Consulta.fecha_hora < f_fin
-    ).group_by(func.cast(Consulta.fecha_hora, db.Date)).all()
+        en_rango(C.fecha, f_inicio.date(), f_fin.date())
+    ).group_by(C.fecha).order_by(C.fecha).all()
     
     return render_template('reportes/consultas_periodo.html',
                          consultas=consultas,
@@ -78,6 +126,7 @@ def consultas_periodo():
 
 @reportes_bp.route('/especies-atendidas')
 @login_required
+@usar_replica
 def especies_atendidas():
     """Reporte de especies más atendidas"""
     fecha_inicio = request.args.get('fecha_inicio', '')
@@ -89,60 +138,95 @@ def especies_atendidas():
     if not fecha_fin:
         fecha_fin = date.today().strftime('%Y-%m-%d')
     
-    try:
-        f_inicio = datetime.strptime(fecha_inicio, '%Y-%m-%d')
-        f_fin = datetime.strptime(fecha_fin, '%Y-%m-%d') + timedelta(days=1)
-    except ValueError:
-        f_inicio = datetime.now() - timedelta(days=365)
-        f_fin = datetime.now()
-    
-    # Consultas por especie
-    resultado = db.session.query(
-        Especie.nombre,
-        func.count(Consulta.id_consulta).label('total_consultas')
-    ).join(Mascota, Mascota.id_especie == Especie.id_especie)\
-     .join(Consulta, Consulta.id_mascota == Mascota.id_mascota)\
-     .filter(
-        Consulta.fecha_hora >= f_inicio,
-        Consulta.fecha_hora < f_fin
-    ).group_by(Especie.nombre)\
-     .order_by(func.count(Consulta.id_consulta).desc()).all()
-    
-    # Total de mascotas por especie
-    mascotas_por_especie = db.session.query(
-        Especie.nombre,
-        func.count(Mascota.id_mascota).label('total')
-    ).join(Mascota, Mascota.id_especie == Especie.id_especie)\
-     .filter(Mascota.activo == True)\
-     .group_by(Especie.nombre)\
-     .order_by(func.count(Mascota.id_mascota).desc()).all()
+    datos, id_tarea = _obtener_reporte(
+        'reportes.especies_atendidas',
+        {'fecha_inicio': fecha_inicio, 'fecha_fin': fecha_fin, 'fuente': _fuente()}
+    )
+    if datos is None:
+        return render_template('reportes/generando.html',
+                             titulo='Especies Atendidas',
+                             id_tarea=id_tarea)
     
     return render_template('reportes/especies_atendidas.html',
-                         resultado=resultado,
-                         mascotas_por_especie=mascotas_por_especie,
+                         resultado=datos['resultado'],
+                         mascotas_por_especie=datos['mascotas_por_especie'],
+                         instantanea=datos.get('instantanea'),
                          fecha_inicio=fecha_inicio,
                          fecha_fin=fecha_fin)
 
 
+@cola.tarea('reportes.especies_atendidas', max_concurrencia=2)
+def calcular_especies_atendidas(fecha_inicio, fecha_fin, fuente='bd'):
+    """Calcula el reporte de especies atendidas (resultado serializable a JSON)"""
+    f_inicio, f_fin = _rango_fechas(fecha_inicio, fecha_fin, 365)
+    instantanea = None
+    
+    with lectura_replica(consistencia='eventual'):
+        # Consultas por especie
+        if fuente == 'instantanea' and instantaneas.cubre('consultas', f_inicio, f_fin):
+            resultado = _por_nombre(instantaneas.contar('consultas', 'id_especie', f_inicio, f_fin),
+                                    dict(db.session.query(Especie.id_especie, Especie.nombre)))
+            instantanea = instantaneas.generado('consultas', f_inicio, f_fin)
+        else:
+            C = con_archivo(Consulta)
+            resultado = db.session.query(
+                Especie.nombre,
+                func.count(C.id_consulta).label('total_consultas')
+            ).join(Mascota, Mascota.id_especie == Especie.id_especie)\
+             .join(C, C.id_mascota == Mascota.id_mascota)\
+             .filter(
+                en_rango(C.fecha_hora, f_inicio, f_fin)
+            ).group_by(Especie.nombre)\
+             .order_by(func.count(C.id_consulta).desc()).all()
+        
+        # Total de mascotas por especie
+        mascotas_por_especie = db.session.query(
+            Especie.nombre,
+            func.count(Mascota.id_mascota).label('total')
+        ).join(Mascota, Mascota.id_especie == Especie.id_especie)\
+         .filter(Mascota.activo == True)\
+         .group_by(Especie.nombre)\
+         .order_by(func.count(Mascota.id_mascota).desc()).all()
+    
+    return {
+        'resultado': [[r[0], r[1]] for r in resultado],
+        'mascotas_por_especie': [[m[0], m[1]] for m in mascotas_por_especie],
+        'instantanea': instantanea
+    }
+
+
 @reportes_bp.route('/tratamientos-frecuentes')
 @login_required
+@usar_replica
 def tratamientos_frecuentes():
     """Reporte de tratamientos más frecuentes"""
+    if _fuente() == 'instantanea' and instantaneas.particiones('tratamientos'):
+        por_descripcion = instantaneas.contar('tratamientos', 'descripcion').most_common(20)
+        medicamentos = instantaneas.contar('tratamientos', 'medicamento')
+        medicamentos.pop(None, None)
+        return render_template('reportes/tratamientos_frecuentes.html',
+                             por_descripcion=por_descripcion,
+                             por_medicamento=medicamentos.most_common(20),
+                             instantanea=instantaneas.generado('tratamientos'))
+
+    # Tratamientos en uso y archivados
+    T = con_archivo(Tratamiento)
+    
     # Por descripción
     por_descripcion = db.session.query(
-        Tratamiento.descripcion,
-        func.count(Tratamiento.id_tratamiento).label('total')
-    ).group_by(Tratamiento.descripcion)\
-     .order_by(func.count(Tratamiento.id_tratamiento).desc())\
+        T.descripcion,
+        func.count(T.id_tratamiento).label('total')
+    ).group_by(T.descripcion)\
+     .order_by(func.count(T.id_tratamiento).desc())\
      .limit(20).all()
     
     # Por medicamento
     por_medicamento = db.session.query(
-        Tratamiento.medicamento,
-        func.count(Tratamiento.id_tratamiento).label('total')
-    ).filter(Tratamiento.medicamento != None)\
-     .group_by(Tratamiento.medicamento)\
-     .order_by(func.count(Tratamiento.id_tratamiento).desc())\
+        T.medicamento,
+        func.count(T.id_tratamiento).label('total')
+    ).filter(T.medicamento != None)\
+     .group_by(T.medicamento)\
+     .order_by(func.count(T.id_tratamiento).desc())\
      .limit(20).all()
     
     return render_template('reportes/tratamientos_frecuentes.html',
@@ -152,6 +236,7 @@ def tratamientos_frecuentes():
 
 @reportes_bp.route('/productividad-veterinarios')
 @login_required
+@usar_replica
 def productividad_veterinarios():
     """Reporte de productividad por veterinario"""
     fecha_inicio = request.args.get('fecha_inicio', '')
@@ -164,50 +249,135 @@ def productividad_veterinarios():
     if not fecha_fin:
         fecha_fin = date.today().strftime('%Y-%m-%d')
 
-    try:
-        f_inicio = datetime.strptime(fecha_inicio, '%Y-%m-%d')
-        f_fin = datetime.strptime(fecha_fin, '%Y-%m-%d') + timedelta(days=1)
-    except ValueError:
-        f_inicio = datetime.now() - timedelta(days=30)
-        f_fin = datetime.now()
-
-    # Construir la consulta base
-    query = db.session.query(
-        Veterinario.nombre,
-        func.count(Consulta.id_consulta).label('total_consultas'),
-        func.sum(Consulta.costo).label('total_ingresos')
-    ).join(Consulta, Consulta.id_veterinario == Veterinario.id_veterinario)\
-     .filter(
-        Consulta.fecha_hora >= f_inicio,
-        Consulta.fecha_hora < f_fin
+    datos, id_tarea = _obtener_reporte(
+        'reportes.productividad_veterinarios',
+        {'fecha_inicio': fecha_inicio, 'fecha_fin': fecha_fin, 'estado': estado_filtro, 'fuente': _fuente()}
     )
+    if datos is None:
+        return render_template('reportes/generando.html',
+                             titulo='Productividad de Veterinarios',
+                             id_tarea=id_tarea)
 
-    # Aplicar filtro de estado solo si se especifica uno
-    if estado_filtro and estado_filtro != 'Todos':
-        query = query.filter(Consulta.estado == estado_filtro)
+    return render_template('reportes/productividad_veterinarios.html',
+                         datos=datos,
+                         fecha_inicio=fecha_inicio,
+                         fecha_fin=fecha_fin,
+                         estado_filtro=estado_filtro,
+                         estados=Consulta.ESTADOS,
+                         instantanea=datos.get('instantanea'))
 
-    resultado = query.group_by(Veterinario.nombre)\
-        .order_by(func.count(Consulta.id_consulta).desc()).all()
 
-    # Obtener estados disponibles para el filtro
-    estados = Consulta.ESTADOS
+@cola.tarea('reportes.productividad_veterinarios', max_concurrencia=2)
+def calcular_productividad_veterinarios(fecha_inicio, fecha_fin, estado='', fuente='bd'):
+    """Calcula el reporte de productividad (resultado serializable a JSON)"""
+    f_inicio, f_fin = _rango_fechas(fecha_inicio, fecha_fin, 30)
+    if estado == 'Todos':
+        estado = ''
 
-    # Calcular totales manejando valores NULL
-    total_consultas = sum(r[1] or 0 for r in resultado)
-    total_ingresos = sum(float(r[2] or 0) for r in resultado)
+    with lectura_replica(consistencia='eventual'):
+        if fuente == 'instantanea' and instantaneas.cubre('consultas', f_inicio, f_fin):
+            filtro = {'estado': estado} if estado else {}
+            lotes = instantaneas.lotes('consultas', productividad.COLUMNAS, f_inicio, f_fin, **filtro)
+            return dict(productividad.calcular(f_inicio, f_fin, estado, lotes=lotes),
+                        instantanea=instantaneas.generado('consultas', f_inicio, f_fin))
+        return productividad.calcular(f_inicio, f_fin, estado)
 
-    return render_template('reportes/productividad_veterinarios.html',
-                         resultado=resultado,
+
+@reportes_bp.route('/cierre-caja')
+@login_required
+@usar_replica
+def cierre_caja():
+    """Cierre de caja: pagos por método, usuario, hora y estado de la factura"""
+    hoy = date.today().strftime('%Y-%m-%d')
+    fecha_inicio = request.args.get('fecha_inicio', '') or hoy
+    fecha_fin = request.args.get('fecha_fin', '') or fecha_inicio
+
+    f_inicio, f_fin = _rango_fechas(fecha_inicio, fecha_fin, 0)
+    datos = caja.reporte(f_inicio.date(), (f_fin - timedelta(days=1)).date())
+
+    return render_template('reportes/cierre_caja.html',
+                         datos=datos,
+                         hoy=hoy,
                          fecha_inicio=fecha_inicio,
-                         fecha_fin=fecha_fin,
-                         estado_filtro=estado_filtro,
-                         estados=estados,
-                         total_consultas=total_consultas,
-                         total_ingresos=total_ingresos)
+                         fecha_fin=fecha_fin)
+
+
+@reportes_bp.route('/cierre-caja/cerrar', methods=['POST'])
+@login_required
+def cerrar_caja():
+    """Cerrar la caja de un día (guarda sus totales)"""
+    fecha = request.form.get('fecha', '')
+    volver = redirect(url_for('reportes.cierre_caja',
+                              fecha_inicio=request.form.get('fecha_inicio', fecha),
+                              fecha_fin=request.form.get('fecha_fin', fecha)))
+    try:
+        dia = datetime.strptime(fecha, '%Y-%m-%d').date()
+    except ValueError:
+        flash('Fecha inválida.', 'danger')
+        return volver
+
+    try:
+        cierre = caja.cerrar(dia, current_user.id_usuario)
+        flash(f'Caja del {dia.strftime("%d/%m/%Y")} cerrada: {cierre.num_pagos} pagos, '
+              f'S/ {float(cierre.total):.2f}.', 'success')
+    except caja.CierreInvalido as e:
+        flash(str(e), 'warning')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error al cerrar la caja: {str(e)}', 'danger')
+
+    return volver
+
+
+@reportes_bp.route('/antiguedad-saldos')
+@login_required
+@usar_replica
+def antiguedad_saldos():
+    """Antigüedad de saldos por propietario (cuentas por cobrar)"""
+    tramo = request.args.get('tramo', '')
+    minimo = request.args.get('minimo', 0, type=float)
+    actualizar = request.args.get('actualizar') == '1'
+
+    datos = cobranza.resumen(actualizar=actualizar)
+
+    deudores = datos['deudores']
+    if tramo in dict((t['clave'], t) for t in datos['tramos']):
+        deudores = [d for d in deudores if d[tramo] > 0]
+    else:
+        tramo = ''
+    if minimo:
+        deudores = [d for d in deudores if d['total'] > minimo]
+
+    limite = 500
+    return render_template('reportes/antiguedad_saldos.html',
+                         datos=datos,
+                         deudores=deudores[:limite],
+                         num_deudores=len(deudores),
+                         limite=limite,
+                         tramo=tramo,
+                         minimo=minimo)
+
+
+@reportes_bp.route('/antiguedad-saldos/<int:id_propietario>')
+@login_required
+@usar_replica
+def antiguedad_saldos_detalle(id_propietario):
+    """Facturas con saldo de un propietario, con su tramo de antigüedad"""
+    propietario = Propietario.query.get_or_404(id_propietario)
+    hoy = date.today()
+    facturas = [
+        dict(fila._mapping, tramo=cobranza.tramo_de(fila.fecha_emision, hoy), dias=(hoy - fila.fecha_emision.date()).days)
+        for fila in db.session.execute(cobranza.consulta_detalle(id_propietario, hoy))
+    ]
+    return render_template('reportes/antiguedad_saldos_detalle.html',
+                         propietario=propietario,
+                         facturas=facturas,
+                         total=sum(float(f['saldo_pendiente']) for f in facturas))
 
 
 @reportes_bp.route('/vacunacion')
 @login_required
+@usar_replica
 def vacunacion():
     """Reporte de vacunación"""
     # Próximas vacunas (7 días)
@@ -226,16 +396,44 @@ def vacunacion():
     ).count()
     
     # Por vacuna
-    por_vacuna = db.session.query(
-        Vacuna.nombre,
-        func.count(CalendarioVacunacion.id_calendario).label('total')
-    ).join(CalendarioVacunacion)\
-     .filter(CalendarioVacunacion.estado == 'Aplicada')\
-     .group_by(Vacuna.nombre)\
-     .order_by(func.count(CalendarioVacunacion.id_calendario).desc()).all()
+    instantanea = None
+    if _fuente() == 'instantanea' and instantaneas.particiones('calendario_vacunacion'):
+        por_vacuna = _por_nombre(
+            instantaneas.contar('calendario_vacunacion', 'id_vacuna', estado='Aplicada'),
+            dict(db.session.query(Vacuna.id_vacuna, Vacuna.nombre))
+        )
+        instantanea = instantaneas.generado('calendario_vacunacion')
+    else:
+        # Incluye las dosis archivadas
+        V = con_archivo(CalendarioVacunacion, estado='Aplicada')
+        por_vacuna = db.session.query(
+            Vacuna.nombre,
+            func.count(V.id_calendario).label('total')
+        ).join(V, V.id_vacuna == Vacuna.id_vacuna)\
+         .group_by(Vacuna.nombre)\
+         .order_by(func.count(V.id_calendario).desc()).all()
     
     return render_template('reportes/vacunacion.html',
                          proximas=proximas,
                          vencidas=vencidas,
                          aplicadas_mes=aplicadas_mes,
-                         por_vacuna=por_vacuna)
+                         por_vacuna=por_vacuna,
+                         instantanea=instantanea)
+
+
+@reportes_bp.route('/pronostico-vacunas')
+@login_required
+def pronostico_vacunas():
+    """Reporte de dosis necesarias por semana y vacuna"""
+    dias = min(request.args.get('dias', current_app.config.get('FORECAST_HORIZON_DAYS', 90), type=int), 365)
+    return render_template('reportes/pronostico_vacunas.html',
+                         datos=pronostico.obtener(dias),
+                         dias=dias)
+
+
+@reportes_bp.route('/api/pronostico-vacunas')
+@login_required
+def api_pronostico_vacunas():
+    """API: Pronóstico de dosis por semana y vacuna"""
+    dias = min(request.args.get('dias', current_app.config.get('FORECAST_HORIZON_DAYS', 90), type=int), 365)
+    return jsonify(pronostico.obtener(dias))
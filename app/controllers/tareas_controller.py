@@ -0,0 +1,19 @@
+"""
+Controlador de Tareas
+Consulta del estado de las tareas en segundo plano
+"""
+from flask import Blueprint, jsonify
+from flask_login import login_required
+from app.services.tareas import cola
+
+tareas_bp = Blueprint('tareas', __name__)
+
+
+@tareas_bp.route('/<id_tarea>')
+@login_required
+def estado(id_tarea):
+    """API: Estado de una tarea (para sondeo desde el navegador)"""
+    estado_tarea = cola.estado(id_tarea)
+    if estado_tarea is None:
+        return jsonify({'error': 'Tarea no encontrada'}), 404
+    return jsonify(estado_tarea)
@@ -3,12 +3,17 @@ Controlador de Vacunación
 Gestión del calendario de vacunación
 """
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
-from flask_login import login_required
+from flask_login import login_required, current_user
 from app import db
+from app.services.replica import usar_replica
+from app.services.tareas import cola
+from app.services import campanas
+from app.services import calendario as calendario_servicio
 from app.models.calendario_vacunacion import CalendarioVacunacion
 from app.models.vacuna import Vacuna
 from app.models.mascota import Mascota
 from app.models.veterinario import Veterinario
+from app.models.especie import Especie
 from datetime import datetime, date, timedelta
 
 vacunacion_bp = Blueprint('vacunacion', __name__)
@@ -16,6 +21,7 @@ vacunacion_bp = Blueprint('vacunacion', __name__)
 
 @vacunacion_bp.route('/')
 @login_required
+@usar_replica
 def index():
     """Dashboard de vacunación"""
     proximas = CalendarioVacunacion.get_proximas(7)
@@ -31,26 +37,38 @@ def index():
 @vacunacion_bp.route('/calendario')
 @login_required
 def calendario():
-    """Vista de calendario"""
-    mes = request.args.get('mes', type=int, default=datetime.now().month)
-    año = request.args.get('año', type=int, default=datetime.now().year)
+    """Vista de calendario (mes, semana o agenda)"""
+    return render_template('vacunacion/calendario.html', datos=_datos_calendario())
+
+
+@vacunacion_bp.route('/api/calendario')
+@login_required
+def api_calendario():
+    """API: Calendario agrupado por día"""
+    return jsonify(_datos_calendario())
+
+
+def _datos_calendario():
+    """Lee la vista y la fecha de la petición (?vista=mes|semana|agenda&mes=&año=&fecha=)"""
+    vista = request.args.get('vista', 'mes')
+    if vista not in calendario_servicio.VISTAS:
+        vista = 'mes'
     
-    # Obtener vacunaciones del mes
-    fecha_inicio = date(año, mes, 1)
-    if mes == 12:
-        fecha_fin = date(año + 1, 1, 1) - timedelta(days=1)
-    else:
-        fecha_fin = date(año, mes + 1, 1) - timedelta(days=1)
+    try:
+        fecha = datetime.strptime(request.args.get('fecha', ''), '%Y-%m-%d').date()
+    except ValueError:
+        fecha = date.today()
     
-    vacunaciones = CalendarioVacunacion.query.filter(
-        CalendarioVacunacion.fecha_programada >= fecha_inicio,
-        CalendarioVacunacion.fecha_programada <= fecha_fin
-    ).all()
+    if vista == 'semana':
+        return calendario_servicio.semana(fecha)
+    if vista == 'agenda':
+        return calendario_servicio.agenda(fecha, min(request.args.get('dias', 0, type=int), 92) or None)
     
-    return render_template('vacunacion/calendario.html',
-                         vacunaciones=vacunaciones,
-                         mes=mes,
-                         año=año)
+    mes = request.args.get('mes', type=int, default=fecha.month)
+    año = request.args.get('año', type=int, default=fecha.year)
+    if not 1 <= mes <= 12:
+        mes = fecha.month
+    return calendario_servicio.mes(año, mes)
 
 
 @vacunacion_bp.route('/programar', methods=['GET', 'POST'])
@@ -120,6 +138,46 @@ def programar():
                          mascota_id=mascota_id)
 
 
+@vacunacion_bp.route('/campana', methods=['GET', 'POST'])
+@login_required
+def campana():
+    """Programar una vacuna para todas las mascotas elegibles"""
+    elegibles = None
+    
+    if request.method == 'POST':
+        id_vacuna = request.form.get('id_vacuna', type=int)
+        id_especie = request.form.get('id_especie', type=int)
+        fecha = request.form.get('fecha_programada', '')
+        observaciones = request.form.get('observaciones', '').strip()
+        
+        vacuna = Vacuna.query.get(id_vacuna) if id_vacuna else None
+        try:
+            fecha_programada = datetime.strptime(fecha, '%Y-%m-%d').date()
+        except ValueError:
+            fecha_programada = None
+        
+        if not vacuna:
+            flash('Debe seleccionar una vacuna.', 'danger')
+        elif not fecha_programada:
+            flash('La fecha es requerida.', 'danger')
+        elif request.form.get('accion') == 'programar':
+            try:
+                programadas = campanas.programar(vacuna, fecha_programada, id_especie,
+                                                 observaciones or None, current_user.id_usuario)
+                flash(f'Campaña programada: {programadas} vacunaciones de {vacuna.nombre}.', 'success')
+                return redirect(url_for('vacunacion.index'))
+            except Exception as e:
+                db.session.rollback()
+                flash(f'Error: {str(e)}', 'danger')
+        else:
+            elegibles = campanas.contar(vacuna, fecha_programada, id_especie)
+    
+    return render_template('vacunacion/campana.html',
+                         vacunas=Vacuna.get_activas(),
+                         especies=Especie.get_activas(),
+                         elegibles=elegibles)
+
+
 @vacunacion_bp.route('/<int:id>/aplicar', methods=['GET', 'POST'])
 @login_required
 def aplicar(id):
@@ -141,18 +199,10 @@ def aplicar(id):
         try:
             db.session.commit()
             
-            # Programar siguiente dosis si aplica
+            # Programar siguiente dosis si aplica (en segundo plano)
             if programar_siguiente and calendario.fecha_proxima:
-                nueva = CalendarioVacunacion(
-                    id_mascota=calendario.id_mascota,
-                    id_vacuna=calendario.id_vacuna,
-                    fecha_programada=calendario.fecha_proxima,
-                    dosis_numero=calendario.dosis_numero + 1,
-                    estado=CalendarioVacunacion.ESTADO_PENDIENTE
-                )
-                db.session.add(nueva)
-                db.session.commit()
-                flash('Siguiente dosis programada automáticamente.', 'info')
+                cola.encolar('vacunacion.programar_siguiente_dosis', id_calendario=id)
+                flash('La siguiente dosis se programará automáticamente.', 'info')
             
             flash('Vacuna aplicada exitosamente.', 'success')
             return redirect(url_for('vacunacion.index'))
@@ -166,6 +216,33 @@ def aplicar(id):
                          veterinarios=veterinarios)
 
 
+@cola.tarea('vacunacion.programar_siguiente_dosis', max_concurrencia=4)
+def programar_siguiente_dosis(id_calendario):
+    """Crea la siguiente dosis de una vacunación aplicada (idempotente)"""
+    calendario = CalendarioVacunacion.query.get(id_calendario)
+    if not calendario or not calendario.fecha_proxima:
+        return {'programada': False}
+    
+    existente = CalendarioVacunacion.query.filter_by(
+        id_mascota=calendario.id_mascota,
+        id_vacuna=calendario.id_vacuna,
+        dosis_numero=calendario.dosis_numero + 1
+    ).first()
+    if existente:
+        return {'programada': False, 'id_calendario': existente.id_calendario}
+    
+    nueva = CalendarioVacunacion(
+        id_mascota=calendario.id_mascota,
+        id_vacuna=calendario.id_vacuna,
+        fecha_programada=calendario.fecha_proxima,
+        dosis_numero=calendario.dosis_numero + 1,
+        estado=CalendarioVacunacion.ESTADO_PENDIENTE
+    )
+    db.session.add(nueva)
+    db.session.commit()
+    return {'programada': True, 'id_calendario': nueva.id_calendario}
+
+
 @vacunacion_bp.route('/<int:id>/cancelar', methods=['POST'])
 @login_required
 def cancelar(id):
@@ -182,7 +259,7 @@ def cancelar(id):
 def historial(mascota_id):
     """Historial de vacunación de una mascota"""
     mascota = Mascota.query.get_or_404(mascota_id)
-    vacunaciones = CalendarioVacunacion.get_by_mascota(mascota_id)
+    vacunaciones = CalendarioVacunacion.get_by_mascota(mascota_id, completo=True)
     
     return render_template('vacunacion/historial.html',
                          mascota=mascota,
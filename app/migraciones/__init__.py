@@ -0,0 +1,5 @@
+"""
+Migraciones de esquema
+Un script por versión: vNNN_descripcion.py con una función `actualizar(op)`
+(ver app/services/migraciones.py). Se aplican con: flask migraciones aplicar
+"""
@@ -0,0 +1,24 @@
+"""
+Tabla de tareas en segundo plano (necesaria con TASKS_PERSISTENT)
+"""
+import sqlalchemy as sa
+
+
+def actualizar(op):
+    tareas = sa.Table(
+        'tareas', sa.MetaData(),
+        sa.Column('id_tarea', sa.String(32), primary_key=True),
+        sa.Column('tipo', sa.String(100), nullable=False),
+        sa.Column('parametros', sa.UnicodeText),
+        sa.Column('estado', sa.String(20), nullable=False, server_default='Pendiente'),
+        sa.Column('intentos', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('resultado', sa.UnicodeText),
+        sa.Column('error', sa.UnicodeText),
+        sa.Column('fecha_creacion', sa.DateTime, nullable=False, server_default=sa.func.current_timestamp()),
+        sa.Column('fecha_inicio', sa.DateTime),
+        sa.Column('fecha_fin', sa.DateTime),
+        sa.CheckConstraint("estado IN ('Pendiente', 'En Curso', 'Completada', 'Fallida')",
+                           name='CK_tareas_estado'),
+        sa.Index('idx_tareas_estado', 'estado', 'fecha_creacion')
+    )
+    op.crear_tabla(tareas)
@@ -0,0 +1,12 @@
+"""
+Servicio de la consulta (su duración se usa en la agenda de veterinarios)
+"""
+import sqlalchemy as sa
+
+
+def actualizar(op):
+    op.agregar_columna('consultas', sa.Column('id_servicio', sa.Integer, nullable=True))
+    op.agregar_clave_foranea('FK_consultas_servicios', 'consultas', ['id_servicio'],
+                             'servicios', ['id_servicio'])
+    op.crear_indice('idx_consultas_veterinario_fecha', 'consultas', ['id_veterinario', 'fecha_hora'],
+                    incluir=['id_servicio', 'estado'])
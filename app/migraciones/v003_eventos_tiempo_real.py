@@ -0,0 +1,15 @@
+"""
+Relevo de eventos en tiempo real entre procesos (necesaria con REALTIME_DB_RELAY)
+"""
+import sqlalchemy as sa
+
+
+def actualizar(op):
+    eventos = sa.Table(
+        'eventos_tiempo_real', sa.MetaData(),
+        sa.Column('id_evento', sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column('tipo', sa.String(50), nullable=False),
+        sa.Column('datos', sa.UnicodeText, nullable=False),
+        sa.Column('fecha_creacion', sa.DateTime, nullable=False, server_default=sa.func.current_timestamp())
+    )
+    op.crear_tabla(eventos)
@@ -0,0 +1,34 @@
+"""
+Bandeja de salida de recordatorios de vacunación
+"""
+import sqlalchemy as sa
+
+
+def actualizar(op):
+    metadata = sa.MetaData()
+    sa.Table('calendario_vacunacion', metadata, sa.Column('id_calendario', sa.Integer, primary_key=True))
+    recordatorios = sa.Table(
+        'recordatorios', metadata,
+        sa.Column('id_recordatorio', sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column('id_calendario', sa.Integer, nullable=False),
+        sa.Column('canal', sa.String(10), nullable=False),
+        sa.Column('destino', sa.String(100), nullable=False),
+        sa.Column('asunto', sa.Unicode(200), nullable=False),
+        sa.Column('mensaje', sa.UnicodeText, nullable=False),
+        sa.Column('estado', sa.String(20), nullable=False, server_default='Pendiente'),
+        sa.Column('intentos', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('error', sa.UnicodeText),
+        sa.Column('reclamado_por', sa.String(32)),
+        sa.Column('fecha_creacion', sa.DateTime, nullable=False, server_default=sa.func.current_timestamp()),
+        sa.Column('proximo_intento', sa.DateTime, nullable=False, server_default=sa.func.current_timestamp()),
+        sa.Column('fecha_envio', sa.DateTime),
+        sa.UniqueConstraint('id_calendario', name='UQ_recordatorios_calendario'),
+        sa.ForeignKeyConstraint(['id_calendario'], ['calendario_vacunacion.id_calendario'],
+                                name='FK_recordatorios_calendario'),
+        sa.Index('idx_recordatorios_estado', 'estado', 'proximo_intento')
+    )
+    op.crear_tabla(recordatorios)
+
+    # Búsqueda de vacunaciones que requieren recordatorio
+    op.crear_indice('idx_calendario_recordatorio', 'calendario_vacunacion',
+                    ['estado', 'recordatorio_enviado', 'fecha_programada'])
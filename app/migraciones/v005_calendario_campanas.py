@@ -0,0 +1,8 @@
+"""
+Dosis de una vacuna por mascota (campañas de vacunación)
+"""
+
+
+def actualizar(op):
+    op.crear_indice('idx_calendario_mascota_vacuna', 'calendario_vacunacion', ['id_mascota', 'id_vacuna', 'estado'],
+                    incluir=['fecha_programada', 'fecha_aplicacion'])
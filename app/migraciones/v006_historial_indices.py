@@ -0,0 +1,9 @@
+"""
+Índices del historial clínico de cada mascota
+"""
+
+
+def actualizar(op):
+    op.crear_indice('idx_consultas_mascota_fecha', 'consultas', ['id_mascota', 'fecha_hora'])
+    op.crear_indice('idx_tratamientos_consulta', 'tratamientos', ['id_consulta'])
+    op.crear_indice('idx_facturas_mascota_fecha', 'facturas', ['id_mascota', 'fecha_emision'])
@@ -0,0 +1,37 @@
+"""
+Índices compuestos y de cobertura de las consultas de los modelos
+(se verifican con: flask indices verificar)
+"""
+
+
+def actualizar(op):
+    # Consultas
+    op.crear_indice('idx_consultas_estado_fecha', 'consultas', ['estado', 'fecha_hora'],
+                    incluir=['id_mascota', 'id_veterinario'])
+    op.crear_indice('idx_consultas_fecha', 'consultas', ['fecha_hora'],
+                    incluir=['estado', 'id_mascota', 'id_veterinario', 'costo'])
+    op.crear_indice('idx_consultas_mascota_fecha', 'consultas', ['id_mascota', 'fecha_hora'])
+    # Reemplazados por los compuestos
+    op.eliminar_indice('idx_consultas_estado', 'consultas')
+    op.eliminar_indice('idx_consultas_mascota', 'consultas')
+
+    # Calendario de vacunación
+    op.crear_indice('idx_calendario_estado_fecha', 'calendario_vacunacion', ['estado', 'fecha_programada'],
+                    incluir=['id_mascota', 'id_vacuna'])
+    op.crear_indice('idx_calendario_mascota_fecha', 'calendario_vacunacion', ['id_mascota', 'fecha_programada'])
+    op.crear_indice('idx_calendario_fecha', 'calendario_vacunacion', ['fecha_programada'], incluir=['estado'])
+    op.eliminar_indice('idx_calendario_estado', 'calendario_vacunacion')
+    op.eliminar_indice('idx_calendario_mascota', 'calendario_vacunacion')
+
+    # Mascotas
+    op.crear_indice('idx_mascotas_activo_nombre', 'mascotas', ['activo', 'nombre'])
+    op.crear_indice('idx_mascotas_propietario', 'mascotas', ['id_propietario', 'activo', 'nombre'])
+
+    # Facturas
+    op.crear_indice('idx_facturas_estado_fecha', 'facturas', ['estado', 'fecha_emision'],
+                    incluir=['id_propietario', 'total'])
+    op.crear_indice('IX_facturas_propietario', 'facturas', ['id_propietario', 'fecha_emision'])
+    op.crear_indice('IX_facturas_fecha', 'facturas', ['fecha_emision'], incluir=['estado', 'total'])
+    op.crear_indice('idx_facturas_consulta', 'facturas', ['id_consulta'])
+    op.eliminar_indice('IX_facturas_estado', 'facturas')
+    op.crear_indice('IX_detalles_factura', 'detalles_factura', ['id_factura'])
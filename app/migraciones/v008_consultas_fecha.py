@@ -0,0 +1,12 @@
+"""
+Día de la consulta como columna calculada persistida (para agrupar por día)
+"""
+from app import db
+from app.models.fechas import fecha_de
+
+
+def actualizar(op):
+    op.agregar_columna('consultas', db.Column(
+        'fecha', db.Date, db.Computed(fecha_de(db.literal_column('fecha_hora')), persisted=True)
+    ))
+    op.crear_indice('idx_consultas_dia', 'consultas', ['fecha'], incluir=['estado'])
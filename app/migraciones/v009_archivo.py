@@ -0,0 +1,65 @@
+"""
+Tablas de archivo de consultas, tratamientos y vacunaciones cerradas
+"""
+import sqlalchemy as sa
+
+
+def actualizar(op):
+    metadata = sa.MetaData()
+    consultas = sa.Table(
+        'consultas_archivo', metadata,
+        sa.Column('id_consulta', sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column('id_mascota', sa.Integer, nullable=False),
+        sa.Column('id_veterinario', sa.Integer, nullable=False),
+        sa.Column('id_servicio', sa.Integer),
+        sa.Column('fecha_hora', sa.DateTime, nullable=False),
+        sa.Column('motivo', sa.String(200), nullable=False),
+        sa.Column('diagnostico', sa.Text),
+        sa.Column('peso_actual', sa.Numeric(5, 2)),
+        sa.Column('temperatura', sa.Numeric(4, 1)),
+        sa.Column('estado', sa.String(20), nullable=False),
+        sa.Column('observaciones', sa.Text),
+        sa.Column('costo', sa.Numeric(10, 2)),
+        sa.Column('fecha_creacion', sa.DateTime),
+        sa.Column('fecha', sa.Date),
+        sa.Column('id_usuario_registro', sa.Integer),
+        sa.Index('idx_consultas_archivo_mascota', 'id_mascota', 'fecha_hora')
+    )
+    tratamientos = sa.Table(
+        'tratamientos_archivo', metadata,
+        sa.Column('id_tratamiento', sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column('id_consulta', sa.Integer, nullable=False),
+        sa.Column('descripcion', sa.String(200), nullable=False),
+        sa.Column('medicamento', sa.String(100)),
+        sa.Column('dosis', sa.String(100)),
+        sa.Column('duracion_dias', sa.Integer),
+        sa.Column('indicaciones', sa.Text),
+        sa.Column('costo', sa.Numeric(10, 2)),
+        sa.Column('fecha_inicio', sa.Date),
+        sa.Column('fecha_fin', sa.Date),
+        sa.Column('estado', sa.String(20)),
+        sa.Index('idx_tratamientos_archivo_consulta', 'id_consulta')
+    )
+    calendario = sa.Table(
+        'calendario_vacunacion_archivo', metadata,
+        sa.Column('id_calendario', sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column('id_mascota', sa.Integer, nullable=False),
+        sa.Column('id_vacuna', sa.Integer, nullable=False),
+        sa.Column('fecha_programada', sa.Date, nullable=False),
+        sa.Column('fecha_aplicacion', sa.Date),
+        sa.Column('fecha_proxima', sa.Date),
+        sa.Column('dosis_numero', sa.Integer),
+        sa.Column('estado', sa.String(20), nullable=False),
+        sa.Column('recordatorio_enviado', sa.Boolean, nullable=False),
+        sa.Column('observaciones', sa.String(200)),
+        sa.Column('lote_vacuna', sa.String(50)),
+        sa.Column('id_veterinario', sa.Integer),
+        sa.Column('id_usuario_registro', sa.Integer),
+        sa.Column('fecha_registro', sa.DateTime),
+        sa.Index('idx_calendario_archivo_mascota', 'id_mascota', 'fecha_programada')
+    )
+    op.crear_tabla(consultas)
+    op.crear_tabla(tratamientos)
+    op.crear_tabla(calendario)
+    # facturas.id_consulta puede apuntar a una consulta archivada
+    op.eliminar_clave_foranea('facturas', ['id_consulta'])
@@ -0,0 +1,36 @@
+"""
+Número de items y saldo pendiente persistidos en facturas
+"""
+import sqlalchemy as sa
+
+
+def actualizar(op):
+    op.agregar_columna('facturas', sa.Column('num_items', sa.Integer, nullable=False, server_default='0'))
+    op.agregar_columna('facturas', sa.Column('saldo_pendiente', sa.Numeric(10, 2), nullable=False,
+                                             server_default='0'))
+    op.crear_indice('idx_facturas_saldo', 'facturas', ['saldo_pendiente'], incluir=['id_propietario'],
+                    donde='saldo_pendiente > 0')
+    op.crear_indice('idx_facturas_deudores', 'facturas', ['id_propietario', 'saldo_pendiente'],
+                    donde='saldo_pendiente > 0')
+
+    metadata = sa.MetaData()
+    facturas = sa.Table(
+        'facturas', metadata,
+        sa.Column('id_factura', sa.Integer, primary_key=True),
+        sa.Column('estado', sa.String(20)),
+        sa.Column('total', sa.Numeric(10, 2)),
+        sa.Column('monto_pagado', sa.Numeric(10, 2)),
+        sa.Column('num_items', sa.Integer),
+        sa.Column('saldo_pendiente', sa.Numeric(10, 2))
+    )
+    detalles = sa.Table('detalles_factura', metadata,
+                        sa.Column('id_detalle', sa.Integer, primary_key=True),
+                        sa.Column('id_factura', sa.Integer))
+    op.rellenar('facturas_resumen', facturas, {
+        'num_items': sa.select(sa.func.count()).where(detalles.c.id_factura == facturas.c.id_factura)
+                       .scalar_subquery(),
+        'saldo_pendiente': sa.case(
+            (facturas.c.estado == 'Anulada', 0),
+            else_=sa.func.coalesce(facturas.c.total, 0) - sa.func.coalesce(facturas.c.monto_pagado, 0)
+        )
+    })
@@ -0,0 +1,45 @@
+"""
+Libro de pagos de facturas
+"""
+import sqlalchemy as sa
+
+from app.models.fechas import fecha_de
+
+
+def actualizar(op):
+    metadata = sa.MetaData()
+    facturas = sa.Table(
+        'facturas', metadata,
+        sa.Column('id_factura', sa.Integer, primary_key=True),
+        sa.Column('fecha_emision', sa.DateTime),
+        sa.Column('monto_pagado', sa.Numeric(10, 2)),
+        sa.Column('metodo_pago', sa.String(30)),
+        sa.Column('fecha_pago', sa.DateTime),
+        sa.Column('id_usuario_registro', sa.Integer)
+    )
+    sa.Table('usuarios', metadata, sa.Column('id_usuario', sa.Integer, primary_key=True))
+    pagos = sa.Table(
+        'pagos', metadata,
+        sa.Column('id_pago', sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column('id_factura', sa.Integer, sa.ForeignKey('facturas.id_factura'), nullable=False),
+        sa.Column('monto', sa.Numeric(10, 2), nullable=False),
+        sa.Column('metodo_pago', sa.String(30), nullable=False),
+        sa.Column('fecha_pago', sa.DateTime, nullable=False),
+        sa.Column('fecha', sa.Date, sa.Computed(fecha_de(sa.literal_column('fecha_pago')), persisted=True)),
+        sa.Column('id_usuario_registro', sa.Integer, sa.ForeignKey('usuarios.id_usuario')),
+        sa.Index('idx_pagos_factura', 'id_factura', 'fecha_pago'),
+        sa.Index('idx_pagos_dia', 'fecha', 'metodo_pago', mssql_include=['monto'])
+    )
+    op.crear_tabla(pagos)
+
+    # Los pagos anteriores quedan como un único pago por factura (último método y fecha)
+    sin_pagos = ~sa.exists().where(pagos.c.id_factura == facturas.c.id_factura)
+    op.conexion.execute(pagos.insert().from_select(
+        ['id_factura', 'monto', 'metodo_pago', 'fecha_pago', 'id_usuario_registro'],
+        sa.select(
+            facturas.c.id_factura, facturas.c.monto_pagado,
+            sa.func.coalesce(facturas.c.metodo_pago, 'Otro'),
+            sa.func.coalesce(facturas.c.fecha_pago, facturas.c.fecha_emision),
+            facturas.c.id_usuario_registro
+        ).where(facturas.c.monto_pagado > 0, sin_pagos)
+    ))
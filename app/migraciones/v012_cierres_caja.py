@@ -0,0 +1,22 @@
+"""
+Cierres de caja por día
+"""
+import sqlalchemy as sa
+
+
+def actualizar(op):
+    metadata = sa.MetaData()
+    sa.Table('usuarios', metadata, sa.Column('id_usuario', sa.Integer, primary_key=True))
+    cierres = sa.Table(
+        'cierres_caja', metadata,
+        sa.Column('fecha', sa.Date, primary_key=True),
+        sa.Column('num_pagos', sa.Integer, nullable=False),
+        sa.Column('total', sa.Numeric(12, 2), nullable=False),
+        sa.Column('datos', sa.Text, nullable=False),
+        sa.Column('id_usuario', sa.Integer, sa.ForeignKey('usuarios.id_usuario')),
+        sa.Column('fecha_cierre', sa.DateTime, nullable=False)
+    )
+    op.crear_tabla(cierres)
+    # Los resúmenes por usuario, hora y estado también se leen del índice
+    op.crear_indice('idx_pagos_dia', 'pagos', ['fecha', 'metodo_pago'],
+                    incluir=['monto', 'fecha_pago', 'id_usuario_registro', 'id_factura'])
@@ -0,0 +1,8 @@
+"""
+Fecha de emisión en el índice de deudores (antigüedad de saldos)
+"""
+
+
+def actualizar(op):
+    op.crear_indice('idx_facturas_deudores', 'facturas', ['id_propietario', 'saldo_pendiente'],
+                    incluir=['fecha_emision'], donde='saldo_pendiente > 0')
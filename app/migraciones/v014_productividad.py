@@ -0,0 +1,8 @@
+"""
+Servicio y día en el índice por fecha de consultas (productividad de veterinarios)
+"""
+
+
+def actualizar(op):
+    op.crear_indice('idx_consultas_fecha', 'consultas', ['fecha_hora'],
+                    incluir=['estado', 'id_mascota', 'id_veterinario', 'costo', 'id_servicio', 'fecha'])
@@ -0,0 +1,8 @@
+"""
+Índices por fecha de las tablas de archivo (exportación de instantáneas)
+"""
+
+
+def actualizar(op):
+    op.crear_indice('idx_consultas_archivo_fecha', 'consultas_archivo', ['fecha_hora'])
+    op.crear_indice('idx_calendario_archivo_fecha', 'calendario_vacunacion_archivo', ['fecha_programada'])
@@ -0,0 +1,16 @@
+"""
+Archivos CSV subidos para importación, pendientes de procesar
+"""
+import sqlalchemy as sa
+
+
+def actualizar(op):
+    archivos = sa.Table(
+        'archivos_importacion', sa.MetaData(),
+        sa.Column('id_archivo', sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column('tipo', sa.String(20), nullable=False),
+        sa.Column('nombre', sa.String(200)),
+        sa.Column('contenido', sa.LargeBinary, nullable=False),
+        sa.Column('fecha_creacion', sa.DateTime, nullable=False)
+    )
+    op.crear_tabla(archivos)
@@ -0,0 +1,14 @@
+"""
+Versiones de las cachés en memoria, para invalidarlas en todos los procesos
+"""
+import sqlalchemy as sa
+
+
+def actualizar(op):
+    versiones = sa.Table(
+        'versiones_cache', sa.MetaData(),
+        sa.Column('nombre', sa.String(50), primary_key=True),
+        sa.Column('version', sa.BigInteger, nullable=False),
+        sa.Column('fecha_actualizacion', sa.DateTime, nullable=False)
+    )
+    op.crear_tabla(versiones)
@@ -12,7 +12,15 @@ from app.models.vacuna import Vacuna
 from app.models.calendario_vacunacion import CalendarioVacunacion
 from app.models.usuario import Usuario
 from app.models.servicio import Servicio
-from app.models.factura import Factura, DetalleFactura
+from app.models.factura import Factura, DetalleFactura, Pago
+from app.models.cierre_caja import CierreCaja
+from app.models.tarea import Tarea
+from app.models.evento import EventoTiempoReal
+from app.models.recordatorio import Recordatorio
+from app.models.importacion import ArchivoImportacion
+from app.models.version_cache import VersionCache
+from app.models.migracion import MigracionAplicada, ProgresoBackfill
+from app.models import archivo  # Tablas de archivo (consultas, tratamientos, vacunaciones)
 
 # Exportar todos los modelos
 __all__ = [
@@ -28,5 +36,14 @@ __all__ = [
     'Usuario',
     'Servicio',
     'Factura',
-    'DetalleFactura'
+    'DetalleFactura',
+    'Pago',
+    'CierreCaja',
+    'Tarea',
+    'EventoTiempoReal',
+    'Recordatorio',
+    'ArchivoImportacion',
+    'VersionCache',
+    'MigracionAplicada',
+    'ProgresoBackfill'
 ]
@@ -0,0 +1,73 @@
+"""
+Tablas de archivo
+Consultas (con sus tratamientos) y vacunaciones cerradas más antiguas que
+ARCHIVE_AFTER_DAYS, movidas fuera de las tablas de uso diario
+(ver app/services/archivo.py).
+
+Tienen las mismas columnas que la tabla de origen, sin claves foráneas, y
+se leen junto con ella con `con_archivo` cuando se pide el historial completo.
+"""
+from app import db
+from app.models.calendario_vacunacion import CalendarioVacunacion
+from app.models.consulta import Consulta
+from app.models.tratamiento import Tratamiento
+
+
+def _tabla_archivo(modelo, nombre, *indices):
+    """Copia de las columnas de `modelo` (las calculadas quedan como columnas normales)"""
+    columnas = [
+        db.Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False, nullable=c.nullable)
+        for c in modelo.__table__.columns
+    ]
+    return db.Table(nombre, *columnas, *indices)
+
+
+consultas_archivo = _tabla_archivo(
+    Consulta, 'consultas_archivo',
+    db.Index('idx_consultas_archivo_mascota', 'id_mascota', 'fecha_hora'),
+    # Exportación por mes de las instantáneas (ver app/services/instantaneas.py)
+    db.Index('idx_consultas_archivo_fecha', 'fecha_hora')
+)
+
+tratamientos_archivo = _tabla_archivo(
+    Tratamiento, 'tratamientos_archivo',
+    db.Index('idx_tratamientos_archivo_consulta', 'id_consulta')
+)
+
+calendario_vacunacion_archivo = _tabla_archivo(
+    CalendarioVacunacion, 'calendario_vacunacion_archivo',
+    db.Index('idx_calendario_archivo_mascota', 'id_mascota', 'fecha_programada'),
+    db.Index('idx_calendario_archivo_fecha', 'fecha_programada')
+)
+
+# Tabla de origen -> tabla de archivo
+ARCHIVOS = {
+    'consultas': consultas_archivo,
+    'tratamientos': tratamientos_archivo,
+    'calendario_vacunacion': calendario_vacunacion_archivo
+}
+
+
+def tablas(modelo):
+    """Tabla del modelo y su archivo, con las mismas columnas en el mismo orden"""
+    origen = modelo.__table__
+    return origen, ARCHIVOS[origen.name]
+
+
+def seleccionar(tabla, origen):
+    """SELECT de `tabla` con las columnas de `origen` en su orden"""
+    return db.select(*[tabla.c[c.name] for c in origen.columns])
+
+
+def con_archivo(modelo, **filtros):
+    """
+    Entidad de solo lectura de `modelo` sobre la unión de su tabla y su
+    archivo; los filtros de igualdad se aplican en cada parte de la unión.
+    Uso: C = con_archivo(Consulta, id_mascota=1); db.session.query(C)...
+    """
+    origen, archivo = tablas(modelo)
+    partes = [
+        seleccionar(tabla, origen).where(*[tabla.c[columna] == valor for columna, valor in filtros.items()])
+        for tabla in (origen, archivo)
+    ]
+    return db.aliased(modelo, db.union_all(*partes).subquery(), adapt_on_names=True)
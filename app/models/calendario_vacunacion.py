@@ -11,6 +11,20 @@ class CalendarioVacunacion(db.Model):
     """Modelo para la tabla de calendario de vacunación"""
     
     __tablename__ = 'calendario_vacunacion'
+    __table_args__ = (
+        # Vacunaciones que requieren recordatorio (ver app/services/recordatorios.py)
+        db.Index('idx_calendario_recordatorio', 'estado', 'recordatorio_enviado', 'fecha_programada'),
+        # Dosis de una vacuna por mascota (ver app/services/campanas.py)
+        db.Index('idx_calendario_mascota_vacuna', 'id_mascota', 'id_vacuna', 'estado',
+                 mssql_include=['fecha_programada', 'fecha_aplicacion']),
+        # get_pendientes, get_proximas, get_vencidas
+        db.Index('idx_calendario_estado_fecha', 'estado', 'fecha_programada',
+                 mssql_include=['id_mascota', 'id_vacuna']),
+        # get_by_mascota, historial de la mascota
+        db.Index('idx_calendario_mascota_fecha', 'id_mascota', 'fecha_programada'),
+        # Vista de calendario por rango de fechas
+        db.Index('idx_calendario_fecha', 'fecha_programada', mssql_include=['estado']),
+    )
     
     # Estados
     ESTADO_PENDIENTE = 'Pendiente'
@@ -64,6 +78,17 @@ class CalendarioVacunacion(db.Model):
             return delta.days
         return None
     
+    @staticmethod
+    def criterios_recordatorio(dias=7):
+        """Condiciones SQL equivalentes a `requiere_recordatorio` (usan idx_calendario_recordatorio)"""
+        hoy = date.today()
+        return [
+            CalendarioVacunacion.estado == CalendarioVacunacion.ESTADO_PENDIENTE,
+            CalendarioVacunacion.recordatorio_enviado == False,
+            CalendarioVacunacion.fecha_programada >= hoy,
+            CalendarioVacunacion.fecha_programada <= hoy + timedelta(days=dias)
+        ]
+    
     @property
     def requiere_recordatorio(self):
         """Verifica si debe enviarse un recordatorio (7 días antes)"""
@@ -142,10 +167,17 @@ class CalendarioVacunacion(db.Model):
         ).order_by(CalendarioVacunacion.fecha_programada.asc()).all()
     
     @staticmethod
-    def get_by_mascota(id_mascota):
-        """Obtiene el historial de vacunación de una mascota"""
-        return CalendarioVacunacion.query.filter_by(id_mascota=id_mascota)\
-            .order_by(CalendarioVacunacion.fecha_programada.desc()).all()
+    def get_by_mascota(id_mascota, completo=False):
+        """
+        Obtiene el historial de vacunación de una mascota
+        (con completo=True incluye las archivadas, de solo lectura)
+        """
+        if not completo:
+            return CalendarioVacunacion.query.filter_by(id_mascota=id_mascota)\
+                .order_by(CalendarioVacunacion.fecha_programada.desc()).all()
+        from app.models.archivo import con_archivo
+        C = con_archivo(CalendarioVacunacion, id_mascota=id_mascota)
+        return db.session.query(C).order_by(C.fecha_programada.desc()).all()
     
     @staticmethod
     def get_by_usuario(id_usuario):
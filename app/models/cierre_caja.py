@@ -0,0 +1,34 @@
+"""
+Modelo: CierreCaja
+Cierre de caja de un día: totales de los pagos del día guardados al cerrar
+(no se modifican; ver app/services/caja.py)
+"""
+import json
+
+from app import db
+from datetime import datetime
+
+
+class CierreCaja(db.Model):
+    """Modelo para la tabla de cierres de caja"""
+
+    __tablename__ = 'cierres_caja'
+
+    # Columnas
+    fecha = db.Column(db.Date, primary_key=True)
+    num_pagos = db.Column(db.Integer, default=0, nullable=False)
+    total = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+    datos = db.Column(db.Text, nullable=False)  # JSON con los totales por método, usuario, hora y estado
+    id_usuario = db.Column(db.Integer, db.ForeignKey('usuarios.id_usuario'))
+    fecha_cierre = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+    # Relaciones
+    usuario = db.relationship('Usuario')
+
+    def __repr__(self):
+        return f'<CierreCaja {self.fecha}>'
+
+    @property
+    def resumen(self):
+        """Totales guardados al cerrar"""
+        return json.loads(self.datos)
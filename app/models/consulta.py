@@ -4,6 +4,7 @@ Representa las consultas médicas veterinarias
 Con trazabilidad de usuario que registra
 """
 from app import db
+from app.models.fechas import en_dia, en_rango, fecha_de, rango_dias
 from datetime import datetime
 
 
@@ -11,6 +12,21 @@ class Consulta(db.Model):
     """Modelo para la tabla de consultas"""
     
     __tablename__ = 'consultas'
+    __table_args__ = (
+        # Agenda de cada veterinario (ver app/services/agenda.py)
+        db.Index('idx_consultas_veterinario_fecha', 'id_veterinario', 'fecha_hora',
+                 mssql_include=['id_servicio', 'estado']),
+        # Historial de cada mascota (ver app/services/historial_clinico.py)
+        db.Index('idx_consultas_mascota_fecha', 'id_mascota', 'fecha_hora'),
+        # get_programadas y filtros por estado del listado
+        db.Index('idx_consultas_estado_fecha', 'estado', 'fecha_hora',
+                 mssql_include=['id_mascota', 'id_veterinario']),
+        # get_by_periodo, get_hoy, reportes por rango (ver app/services/productividad.py)
+        db.Index('idx_consultas_fecha', 'fecha_hora',
+                 mssql_include=['estado', 'id_mascota', 'id_veterinario', 'costo', 'id_servicio', 'fecha']),
+        # Agrupaciones por día (columna calculada `fecha`)
+        db.Index('idx_consultas_dia', 'fecha', mssql_include=['estado']),
+    )
     
     # Estados posibles de una consulta
     ESTADO_PROGRAMADA = 'Programada'
@@ -24,6 +40,7 @@ class Consulta(db.Model):
     id_consulta = db.Column(db.Integer, primary_key=True, autoincrement=True)
     id_mascota = db.Column(db.Integer, db.ForeignKey('mascotas.id_mascota'), nullable=False)
     id_veterinario = db.Column(db.Integer, db.ForeignKey('veterinarios.id_veterinario'), nullable=False)
+    id_servicio = db.Column(db.Integer, db.ForeignKey('servicios.id_servicio'), nullable=True)  # Define la duración
     fecha_hora = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     motivo = db.Column(db.String(200), nullable=False)
     diagnostico = db.Column(db.Text)
@@ -33,6 +50,8 @@ class Consulta(db.Model):
     observaciones = db.Column(db.Text)
     costo = db.Column(db.Numeric(10, 2))
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    # Día de fecha_hora, calculado y persistido por la base de datos (para agrupar por día)
+    fecha = db.Column(db.Date, db.Computed(fecha_de(db.literal_column('fecha_hora')), persisted=True))
     
     # ============================================
     # TRAZABILIDAD - Usuario que registró la consulta
@@ -40,6 +59,7 @@ class Consulta(db.Model):
     id_usuario_registro = db.Column(db.Integer, db.ForeignKey('usuarios.id_usuario'), nullable=True)
     
     # Relaciones
+    servicio = db.relationship('Servicio')
     tratamientos = db.relationship('Tratamiento', backref='consulta', lazy='dynamic',
                                    cascade='all, delete-orphan')
     
@@ -73,6 +93,8 @@ class Consulta(db.Model):
             'propietario': self.mascota.propietario.nombre if self.mascota and self.mascota.propietario else None,
             'veterinario': self.veterinario.nombre if self.veterinario else None,
             'veterinario_id': self.id_veterinario,
+            'servicio': self.servicio.nombre if self.servicio else None,
+            'servicio_id': self.id_servicio,
             'fecha_hora': self.fecha_hora.strftime('%Y-%m-%d %H:%M') if self.fecha_hora else None,
             'fecha_formateada': self.fecha_formateada,
             'motivo': self.motivo,
@@ -98,25 +120,37 @@ class Consulta(db.Model):
     @staticmethod
     def get_hoy():
         """Obtiene las consultas de hoy"""
-        hoy = datetime.now().date()
         return Consulta.query.filter(
-            db.func.cast(Consulta.fecha_hora, db.Date) == hoy
+            en_dia(Consulta.fecha_hora, datetime.now())
         ).order_by(Consulta.fecha_hora.asc()).all()
     
     @staticmethod
-    def get_by_mascota(id_mascota):
-        """Obtiene el historial de consultas de una mascota"""
-        return Consulta.query.filter_by(id_mascota=id_mascota)\
-            .order_by(Consulta.fecha_hora.desc()).all()
+    def get_by_mascota(id_mascota, completo=False):
+        """
+        Obtiene el historial de consultas de una mascota
+        (con completo=True incluye las archivadas, de solo lectura)
+        """
+        if not completo:
+            return Consulta.query.filter_by(id_mascota=id_mascota)\
+                .order_by(Consulta.fecha_hora.desc()).all()
+        from app.models.archivo import con_archivo
+        C = con_archivo(Consulta, id_mascota=id_mascota)
+        return db.session.query(C).order_by(C.fecha_hora.desc()).all()
+    
+    @staticmethod
+    def get_archivada(id_consulta):
+        """Obtiene una consulta archivada (de solo lectura) o None"""
+        from app.models.archivo import consultas_archivo, seleccionar
+        return db.session.query(Consulta).from_statement(
+            seleccionar(consultas_archivo, Consulta.__table__)
+            .where(consultas_archivo.c.id_consulta == id_consulta)
+        ).first()
     
     @staticmethod
     def get_by_periodo(fecha_inicio, fecha_fin):
-        """Obtiene consultas en un período"""
+        """Obtiene consultas en un período (días desde..hasta, ambos incluidos)"""
         return Consulta.query.filter(
-            db.and_(
-                Consulta.fecha_hora >= fecha_inicio,
-                Consulta.fecha_hora <= fecha_fin
-            )
+            en_rango(Consulta.fecha_hora, *rango_dias(fecha_inicio, fecha_fin))
         ).order_by(Consulta.fecha_hora.desc()).all()
     
     @staticmethod
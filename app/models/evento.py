@@ -0,0 +1,21 @@
+"""
+Modelo: EventoTiempoReal
+Eventos publicados para las pantallas en vivo (relevo entre procesos)
+"""
+from app import db
+from datetime import datetime
+
+
+class EventoTiempoReal(db.Model):
+    """Modelo para la tabla de eventos en tiempo real"""
+    
+    __tablename__ = 'eventos_tiempo_real'
+    
+    # Columnas
+    id_evento = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    datos = db.Column(db.Text, nullable=False)  # JSON
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<EventoTiempoReal {self.id_evento} - {self.tipo}>'
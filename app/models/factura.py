@@ -3,13 +3,44 @@ Modelo: Factura
 Representa las facturas emitidas por la veterinaria
 """
 from app import db
+from app.models.fechas import en_rango, fecha_de, rango_dia, rango_dias
 from datetime import datetime
+from decimal import Decimal
+
+CENTIMO = Decimal('0.01')
+IGV = Decimal('0.18')  # Impuesto (18% en Perú)
+
+
+def _decimal(valor):
+    """Importe como Decimal redondeado al céntimo (None -> 0)"""
+    return Decimal(str(valor or 0)).quantize(CENTIMO)
 
 
 class Factura(db.Model):
     """Modelo para la tabla de facturas"""
 
     __tablename__ = 'facturas'
+    __table_args__ = (
+        # Historial de cada mascota (ver app/services/historial_clinico.py)
+        db.Index('idx_facturas_mascota_fecha', 'id_mascota', 'fecha_emision'),
+        # get_pendientes y filtro por estado del listado
+        db.Index('idx_facturas_estado_fecha', 'estado', 'fecha_emision',
+                 mssql_include=['id_propietario', 'total']),
+        # get_by_propietario
+        db.Index('IX_facturas_propietario', 'id_propietario', 'fecha_emision'),
+        # get_by_periodo, reportes de ingresos
+        db.Index('IX_facturas_fecha', 'fecha_emision', mssql_include=['estado', 'total']),
+        # Consultas sin facturar (Consulta.factura == None)
+        db.Index('idx_facturas_consulta', 'id_consulta'),
+        # get_con_saldo y deudores: índices filtrados, solo con las facturas por
+        # cobrar (las consultas deben usar la misma condición, sin parámetro)
+        db.Index('idx_facturas_saldo', 'saldo_pendiente',
+                 sqlite_where=db.text('saldo_pendiente > 0'), mssql_where=db.text('saldo_pendiente > 0'),
+                 mssql_include=['id_propietario']),
+        db.Index('idx_facturas_deudores', 'id_propietario', 'saldo_pendiente',
+                 sqlite_where=db.text('saldo_pendiente > 0'), mssql_where=db.text('saldo_pendiente > 0'),
+                 mssql_include=['fecha_emision']),  # Antigüedad de saldos (app/services/cobranza.py)
+    )
 
     # Estados de factura
     ESTADO_PENDIENTE = 'Pendiente'
@@ -33,7 +64,8 @@ class Factura(db.Model):
     numero_factura = db.Column(db.String(20), unique=True, nullable=False)
     id_propietario = db.Column(db.Integer, db.ForeignKey('propietarios.id_propietario'), nullable=False)
     id_mascota = db.Column(db.Integer, db.ForeignKey('mascotas.id_mascota'), nullable=True)
-    id_consulta = db.Column(db.Integer, db.ForeignKey('consultas.id_consulta'), nullable=True)
+    # Sin clave foránea: la consulta puede estar archivada (ver app/models/archivo.py)
+    id_consulta = db.Column(db.Integer, nullable=True)
 
     fecha_emision = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     fecha_vencimiento = db.Column(db.Date)
@@ -44,10 +76,16 @@ class Factura(db.Model):
     total = db.Column(db.Numeric(10, 2), default=0)
 
     estado = db.Column(db.String(20), default=ESTADO_PENDIENTE, nullable=False)
+    # Último pago; el detalle de cada pago está en la tabla pagos
     metodo_pago = db.Column(db.String(30))
     fecha_pago = db.Column(db.DateTime)
     monto_pagado = db.Column(db.Numeric(10, 2), default=0)
 
+    # Resumen persistido: lo mantienen agregar_detalle/quitar_detalle,
+    # calcular_totales y actualizar_saldo (ver app/services/facturas.py)
+    num_items = db.Column(db.Integer, default=0, nullable=False)
+    saldo_pendiente = db.Column(db.Numeric(10, 2), default=0, nullable=False)  # 0 si Pagada o Anulada
+
     observaciones = db.Column(db.Text)
 
     # Trazabilidad
@@ -57,7 +95,8 @@ class Factura(db.Model):
     # Relaciones
     propietario = db.relationship('Propietario', backref=db.backref('facturas', lazy='dynamic'))
     mascota = db.relationship('Mascota', backref=db.backref('facturas', lazy='dynamic'))
-    consulta = db.relationship('Consulta', backref=db.backref('factura', uselist=False))
+    consulta = db.relationship('Consulta', primaryjoin='foreign(Factura.id_consulta) == Consulta.id_consulta',
+                               backref=db.backref('factura', uselist=False))
     usuario_registro = db.relationship('Usuario', backref=db.backref('facturas_registradas', lazy='dynamic'))
     detalles = db.relationship('DetalleFactura', backref='factura', lazy='dynamic', cascade='all, delete-orphan')
 
@@ -82,20 +121,54 @@ class Factura(db.Model):
         }
         return colores.get(self.estado, 'secondary')
 
-    @property
-    def saldo_pendiente(self):
-        """Calcula el saldo pendiente de pago"""
-        monto_pagado = float(self.monto_pagado) if self.monto_pagado else 0
-        total = float(self.total) if self.total else 0
-        return total - monto_pagado
+    def actualizar_saldo(self):
+        """Recalcula el saldo pendiente persistido (cero en facturas anuladas)"""
+        if self.estado == self.ESTADO_ANULADA:
+            self.saldo_pendiente = 0
+        else:
+            self.saldo_pendiente = _decimal(self.total) - _decimal(self.monto_pagado)
+
+    def _calcular_total(self, aplicar_igv=True):
+        subtotal = _decimal(self.subtotal)
+        self.igv = _decimal(subtotal * IGV) if aplicar_igv else 0
+        self.total = subtotal + _decimal(self.igv) - _decimal(self.descuento)
+        self.actualizar_saldo()
+
+    def bloquear(self):
+        """
+        Relee la factura bloqueando su fila hasta el commit (UPDLOCK en SQL
+        Server). Los totales se calculan así sobre los valores vigentes: un
+        pago o un item confirmado por otro usuario después de cargar la
+        factura no se pisa, y los que lleguen después esperan.
+        """
+        db.session.execute(
+            db.select(Factura).where(Factura.id_factura == self.id_factura)
+            .with_hint(Factura, 'WITH (UPDLOCK, ROWLOCK)', 'mssql')
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        ).scalar_one()
 
     def calcular_totales(self, aplicar_igv=True):
-        """Calcula subtotal, IGV y total basado en los detalles"""
-        subtotal = sum(float(d.subtotal) for d in self.detalles)
-        self.subtotal = subtotal
-        self.igv = subtotal * 0.18 if aplicar_igv else 0
-        descuento = float(self.descuento) if self.descuento else 0
-        self.total = subtotal + float(self.igv) - descuento
+        """Calcula subtotal, IGV, total, número de items y saldo basado en los detalles"""
+        self.bloquear()
+        detalles = self.detalles.all()
+        self.subtotal = sum((_decimal(d.subtotal) for d in detalles), Decimal(0))
+        self.num_items = len(detalles)
+        self._calcular_total(aplicar_igv)
+
+    def agregar_detalle(self, detalle):
+        """Suma un item nuevo a los totales sin releer los detalles"""
+        self.bloquear()
+        self.num_items = (self.num_items or 0) + 1
+        self.subtotal = _decimal(self.subtotal) + _decimal(detalle.subtotal)
+        self._calcular_total()
+
+    def quitar_detalle(self, detalle):
+        """Resta un item eliminado de los totales sin releer los detalles"""
+        self.bloquear()
+        self.num_items = max((self.num_items or 0) - 1, 0)
+        self.subtotal = _decimal(self.subtotal) - _decimal(detalle.subtotal)
+        self._calcular_total()
 
     def to_dict(self):
         """Convierte el objeto a diccionario"""
@@ -116,8 +189,8 @@ class Factura(db.Model):
             'estado_color': self.estado_color,
             'metodo_pago': self.metodo_pago,
             'monto_pagado': float(self.monto_pagado) if self.monto_pagado else 0,
-            'saldo_pendiente': self.saldo_pendiente,
-            'num_items': self.detalles.count(),
+            'saldo_pendiente': float(self.saldo_pendiente) if self.saldo_pendiente else 0,
+            'num_items': self.num_items,
             'registrado_por': self.usuario_registro.nombre_completo if self.usuario_registro else None
         }
 
@@ -128,6 +201,31 @@ class Factura(db.Model):
             Factura.estado.in_([Factura.ESTADO_PENDIENTE, Factura.ESTADO_PARCIAL])
         ).order_by(Factura.fecha_emision.desc()).all()
 
+    @staticmethod
+    def con_saldo():
+        """Condición de los índices filtrados de saldo (literal, para que se puedan usar)"""
+        return Factura.saldo_pendiente > db.literal_column('0')
+
+    @staticmethod
+    def get_con_saldo(limite=None):
+        """Obtiene las facturas con saldo pendiente, de mayor a menor saldo"""
+        query = Factura.query.filter(Factura.con_saldo())\
+            .order_by(Factura.saldo_pendiente.desc())
+        return query.limit(limite).all() if limite else query.all()
+
+    @staticmethod
+    def deudores(minimo=0):
+        """
+        Propietarios con deuda mayor a `minimo`, de mayor a menor deuda.
+        Retorna filas (id_propietario, deuda, num_facturas).
+        """
+        deuda = db.func.sum(Factura.saldo_pendiente)
+        return db.session.query(
+            Factura.id_propietario, deuda.label('deuda'), db.func.count().label('num_facturas')
+        ).filter(
+            Factura.con_saldo()
+        ).group_by(Factura.id_propietario).having(deuda > minimo).order_by(deuda.desc()).all()
+
     @staticmethod
     def get_by_propietario(id_propietario):
         """Obtiene facturas de un propietario"""
@@ -136,14 +234,48 @@ class Factura(db.Model):
 
     @staticmethod
     def get_by_periodo(fecha_inicio, fecha_fin):
-        """Obtiene facturas en un período"""
+        """Obtiene facturas en un período (días desde..hasta, ambos incluidos)"""
         return Factura.query.filter(
-            db.and_(
-                Factura.fecha_emision >= fecha_inicio,
-                Factura.fecha_emision <= fecha_fin
-            )
+            en_rango(Factura.fecha_emision, *rango_dias(fecha_inicio, fecha_fin))
         ).order_by(Factura.fecha_emision.desc()).all()
 
+    @staticmethod
+    def criterios_filtro(busqueda='', estado='', fecha_desde='', fecha_hasta=''):
+        """
+        Criterios del listado de facturas (fechas en formato YYYY-MM-DD).
+        Si hay búsqueda, la consulta debe unir la tabla de propietarios.
+        """
+        from app.models.propietario import Propietario
+
+        criterios = []
+
+        if busqueda:
+            busqueda_like = f"%{busqueda}%"
+            criterios.append(db.or_(
+                Factura.numero_factura.ilike(busqueda_like),
+                Propietario.nombre.ilike(busqueda_like),
+                Propietario.documento.ilike(busqueda_like)
+            ))
+
+        if estado:
+            criterios.append(Factura.estado == estado)
+
+        if fecha_desde:
+            try:
+                criterios.append(Factura.fecha_emision >= datetime.strptime(fecha_desde, '%Y-%m-%d'))
+            except ValueError:
+                pass
+
+        if fecha_hasta:
+            try:
+                # Hasta el inicio del día siguiente (incluye todo el día)
+                fin = rango_dia(datetime.strptime(fecha_hasta, '%Y-%m-%d'))[1]
+                criterios.append(Factura.fecha_emision < fin)
+            except ValueError:
+                pass
+
+        return criterios
+
     @staticmethod
     def generar_numero():
         """Genera un número de factura único"""
@@ -170,6 +302,9 @@ class DetalleFactura(db.Model):
     """Modelo para los detalles/items de una factura"""
 
     __tablename__ = 'detalles_factura'
+    __table_args__ = (
+        db.Index('IX_detalles_factura', 'id_factura'),
+    )
 
     id_detalle = db.Column(db.Integer, primary_key=True, autoincrement=True)
     id_factura = db.Column(db.Integer, db.ForeignKey('facturas.id_factura'), nullable=False)
@@ -186,10 +321,8 @@ class DetalleFactura(db.Model):
 
     def calcular_subtotal(self):
         """Calcula el subtotal del detalle"""
-        precio = float(self.precio_unitario) if self.precio_unitario else 0
         cantidad = self.cantidad if self.cantidad else 1
-        descuento = float(self.descuento) if self.descuento else 0
-        self.subtotal = (precio * cantidad) - descuento
+        self.subtotal = _decimal(self.precio_unitario) * cantidad - _decimal(self.descuento)
 
     def to_dict(self):
         """Convierte el objeto a diccionario"""
@@ -203,3 +336,70 @@ class DetalleFactura(db.Model):
             'descuento': float(self.descuento) if self.descuento else 0,
             'subtotal': float(self.subtotal) if self.subtotal else 0
         }
+
+
+class Pago(db.Model):
+    """
+    Modelo para los pagos de una factura.
+    Solo se insertan (ver app/services/facturas.py): la suma de los pagos de
+    una factura es su monto_pagado.
+    """
+
+    __tablename__ = 'pagos'
+    __table_args__ = (
+        # Pagos de cada factura
+        db.Index('idx_pagos_factura', 'id_factura', 'fecha_pago'),
+        # Resúmenes de caja por día y método de pago (ver app/services/caja.py)
+        db.Index('idx_pagos_dia', 'fecha', 'metodo_pago',
+                 mssql_include=['monto', 'fecha_pago', 'id_usuario_registro', 'id_factura']),
+    )
+
+    id_pago = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    id_factura = db.Column(db.Integer, db.ForeignKey('facturas.id_factura'), nullable=False)
+    monto = db.Column(db.Numeric(10, 2), nullable=False)
+    metodo_pago = db.Column(db.String(30), nullable=False)
+    fecha_pago = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    # Día del pago (columna calculada persistida, para agrupar por día)
+    fecha = db.Column(db.Date, db.Computed(fecha_de(db.literal_column('fecha_pago')), persisted=True))
+
+    # Trazabilidad
+    id_usuario_registro = db.Column(db.Integer, db.ForeignKey('usuarios.id_usuario'))
+
+    # Relaciones
+    factura = db.relationship('Factura', backref=db.backref('pagos', lazy='dynamic', order_by='Pago.fecha_pago'))
+    usuario_registro = db.relationship('Usuario')
+
+    def __repr__(self):
+        return f'<Pago {self.id_pago} - {self.monto}>'
+
+    @property
+    def fecha_formateada(self):
+        """Retorna la fecha en formato legible"""
+        if self.fecha_pago:
+            return self.fecha_pago.strftime('%d/%m/%Y %H:%M')
+        return None
+
+    def to_dict(self):
+        """Convierte el objeto a diccionario"""
+        return {
+            'id': self.id_pago,
+            'factura_id': self.id_factura,
+            'monto': float(self.monto) if self.monto else 0,
+            'metodo_pago': self.metodo_pago,
+            'fecha_pago': self.fecha_pago.strftime('%Y-%m-%d %H:%M') if self.fecha_pago else None,
+            'registrado_por': self.usuario_registro.nombre_completo if self.usuario_registro else None
+        }
+
+    @staticmethod
+    def resumen_diario(fecha_inicio, fecha_fin):
+        """
+        Totales de caja por día y método de pago (días desde..hasta, ambos incluidos).
+        Retorna filas (fecha, metodo_pago, num_pagos, total).
+        """
+        inicio, fin = rango_dias(fecha_inicio, fecha_fin)
+        return db.session.query(
+            Pago.fecha, Pago.metodo_pago,
+            db.func.count(Pago.id_pago).label('num_pagos'), db.func.sum(Pago.monto).label('total')
+        ).filter(
+            en_rango(Pago.fecha, inicio.date(), fin.date())
+        ).group_by(Pago.fecha, Pago.metodo_pago).order_by(Pago.fecha, Pago.metodo_pago).all()
@@ -0,0 +1,73 @@
+"""
+Rangos de fechas para las consultas de los modelos
+Los filtros por día se expresan como rangos semiabiertos [inicio, fin) sobre
+la columna sin transformar, para que el motor use sus índices
+(CAST(columna AS DATE) = fecha obliga a recorrer la tabla).
+"""
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from app import db
+
+
+def inicio_dia(fecha):
+    """Medianoche del día de `fecha` (date o datetime)"""
+    if isinstance(fecha, datetime):
+        fecha = fecha.date()
+    return datetime.combine(fecha, time.min)
+
+
+def rango_dia(fecha):
+    """Rango [inicio, fin) del día"""
+    inicio = inicio_dia(fecha)
+    return inicio, inicio + timedelta(days=1)
+
+
+def rango_dias(desde, hasta):
+    """Rango [inicio, fin) que cubre los días desde..hasta (ambos incluidos)"""
+    return inicio_dia(desde), inicio_dia(hasta) + timedelta(days=1)
+
+
+def leer_rango(fecha_inicio, fecha_fin, dias_defecto=30):
+    """
+    Convierte las fechas de un filtro (YYYY-MM-DD, ambas incluidas) en un
+    rango [inicio, fin). Si no son válidas, los últimos `dias_defecto` días.
+    """
+    try:
+        return rango_dias(datetime.strptime(fecha_inicio, '%Y-%m-%d'),
+                          datetime.strptime(fecha_fin, '%Y-%m-%d'))
+    except (TypeError, ValueError):
+        return rango_dias(date.today() - timedelta(days=dias_defecto), date.today())
+
+
+def en_rango(columna, inicio, fin):
+    """Condición inicio <= columna < fin"""
+    return db.and_(columna >= inicio, columna < fin)
+
+
+def en_dia(columna, fecha):
+    """Condición "la columna cae en el día `fecha`" (usa el índice de la columna)"""
+    return en_rango(columna, *rango_dia(fecha))
+
+
+# ============================================
+# COLUMNAS CALCULADAS
+# ============================================
+
+class fecha_de(FunctionElement):
+    """Parte de fecha de una expresión DATETIME, para columnas calculadas"""
+    type = db.Date()
+    inherit_cache = True
+
+
+@compiles(fecha_de)
+def _fecha_de(elemento, compilador, **kw):
+    return 'CAST(%s AS DATE)' % compilador.process(elemento.clauses, **kw)
+
+
+@compiles(fecha_de, 'sqlite')
+def _fecha_de_sqlite(elemento, compilador, **kw):
+    # En SQLite CAST(... AS DATE) da un número; date() conserva 'YYYY-MM-DD'
+    return 'date(%s)' % compilador.process(elemento.clauses, **kw)
@@ -0,0 +1,23 @@
+"""
+Modelo: ArchivoImportacion
+Archivo CSV subido para una importación masiva, guardado en la base de
+datos hasta que la tarea lo procesa (la tarea puede correr en otro servidor)
+"""
+from app import db
+from datetime import datetime
+
+
+class ArchivoImportacion(db.Model):
+    """Modelo para la tabla de archivos de importación pendientes"""
+
+    __tablename__ = 'archivos_importacion'
+
+    # Columnas
+    id_archivo = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    tipo = db.Column(db.String(20), nullable=False)  # 'propietarios' o 'mascotas'
+    nombre = db.Column(db.String(200))
+    contenido = db.Column(db.LargeBinary, nullable=False)
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<ArchivoImportacion {self.id_archivo} - {self.tipo}>'
@@ -10,6 +10,12 @@ class Mascota(db.Model):
     """Modelo para la tabla de mascotas"""
     
     __tablename__ = 'mascotas'
+    __table_args__ = (
+        # get_activas, buscar
+        db.Index('idx_mascotas_activo_nombre', 'activo', 'nombre'),
+        # get_by_propietario
+        db.Index('idx_mascotas_propietario', 'id_propietario', 'activo', 'nombre'),
+    )
     
     # Columnas
     id_mascota = db.Column(db.Integer, primary_key=True, autoincrement=True)
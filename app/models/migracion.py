@@ -0,0 +1,51 @@
+"""
+Modelo: Migracion
+Control de las migraciones de esquema aplicadas y del avance de los
+rellenos de datos por lotes (ver app/services/migraciones.py)
+"""
+from app import db
+from datetime import datetime
+
+
+class MigracionAplicada(db.Model):
+    """Modelo para la tabla de migraciones aplicadas"""
+
+    __tablename__ = 'schema_migraciones'
+
+    # Columnas
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    nombre = db.Column(db.String(100), nullable=False)
+    fecha_aplicacion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    duracion_ms = db.Column(db.Integer)
+
+    def __repr__(self):
+        return f'<MigracionAplicada {self.version:03d} - {self.nombre}>'
+
+
+class ProgresoBackfill(db.Model):
+    """Modelo para la tabla de avance de los rellenos por lotes"""
+
+    __tablename__ = 'backfills'
+
+    # Columnas
+    nombre = db.Column(db.String(100), primary_key=True)
+    ultimo_id = db.Column(db.BigInteger, default=0, nullable=False)  # Última clave procesada
+    filas = db.Column(db.BigInteger, default=0, nullable=False)
+    completado = db.Column(db.Boolean, default=False, nullable=False)
+    fecha_inicio = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<ProgresoBackfill {self.nombre} - {self.ultimo_id}>'
+
+    def to_dict(self):
+        """Convierte el objeto a diccionario"""
+        return {
+            'nombre': self.nombre,
+            'ultimo_id': self.ultimo_id,
+            'filas': self.filas,
+            'completado': self.completado,
+            'fecha_inicio': self.fecha_inicio.strftime('%Y-%m-%d %H:%M:%S') if self.fecha_inicio else None,
+            'fecha_actualizacion': self.fecha_actualizacion.strftime('%Y-%m-%d %H:%M:%S')
+                if self.fecha_actualizacion else None
+        }
@@ -0,0 +1,72 @@
+"""
+Modelo: Recordatorio
+Bandeja de salida de recordatorios de vacunación (outbox)
+"""
+from app import db
+from datetime import datetime
+
+
+class Recordatorio(db.Model):
+    """Modelo para la tabla de recordatorios"""
+    
+    __tablename__ = 'recordatorios'
+    
+    # Estados posibles de un recordatorio
+    ESTADO_PENDIENTE = 'Pendiente'
+    ESTADO_ENVIANDO = 'Enviando'
+    ESTADO_ENVIADO = 'Enviado'
+    ESTADO_FALLIDO = 'Fallido'
+    
+    ESTADOS = [ESTADO_PENDIENTE, ESTADO_ENVIANDO, ESTADO_ENVIADO, ESTADO_FALLIDO]
+    
+    # Canales de envío
+    CANAL_EMAIL = 'email'
+    CANAL_SMS = 'sms'
+    
+    # Columnas
+    id_recordatorio = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    id_calendario = db.Column(db.Integer, db.ForeignKey('calendario_vacunacion.id_calendario'),
+                              nullable=False, unique=True)  # Un recordatorio por vacunación
+    canal = db.Column(db.String(10), nullable=False)
+    destino = db.Column(db.String(100), nullable=False)
+    asunto = db.Column(db.String(200), nullable=False)
+    mensaje = db.Column(db.Text, nullable=False)
+    estado = db.Column(db.String(20), default=ESTADO_PENDIENTE, nullable=False)
+    intentos = db.Column(db.Integer, default=0, nullable=False)
+    error = db.Column(db.Text)
+    reclamado_por = db.Column(db.String(32))  # Despachador que lo está enviando
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    proximo_intento = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    fecha_envio = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('idx_recordatorios_estado', 'estado', 'proximo_intento'),
+    )
+    
+    # Relaciones
+    calendario = db.relationship('CalendarioVacunacion')
+    
+    def __repr__(self):
+        return f'<Recordatorio {self.id_recordatorio} - {self.estado}>'
+    
+    def to_dict(self):
+        """Convierte el objeto a diccionario"""
+        return {
+            'id': self.id_recordatorio,
+            'calendario_id': self.id_calendario,
+            'canal': self.canal,
+            'destino': self.destino,
+            'asunto': self.asunto,
+            'mensaje': self.mensaje,
+            'estado': self.estado,
+            'intentos': self.intentos,
+            'error': self.error,
+            'fecha_creacion': self.fecha_creacion.strftime('%Y-%m-%d %H:%M') if self.fecha_creacion else None,
+            'fecha_envio': self.fecha_envio.strftime('%Y-%m-%d %H:%M') if self.fecha_envio else None
+        }
+    
+    @staticmethod
+    def contar_por_estado():
+        """Cantidad de recordatorios en cada estado"""
+        return dict(db.session.query(Recordatorio.estado, db.func.count(Recordatorio.id_recordatorio))
+                    .group_by(Recordatorio.estado).all())
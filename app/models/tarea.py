@@ -0,0 +1,62 @@
+"""
+Modelo: Tarea
+Representa un trabajo en segundo plano persistido (cola de tareas)
+"""
+from app import db
+from datetime import datetime
+import json
+
+
+class Tarea(db.Model):
+    """Modelo para la tabla de tareas en segundo plano"""
+    
+    __tablename__ = 'tareas'
+    
+    # Estados posibles de una tarea
+    ESTADO_PENDIENTE = 'Pendiente'
+    ESTADO_EN_CURSO = 'En Curso'
+    ESTADO_COMPLETADA = 'Completada'
+    ESTADO_FALLIDA = 'Fallida'
+    
+    ESTADOS = [ESTADO_PENDIENTE, ESTADO_EN_CURSO, ESTADO_COMPLETADA, ESTADO_FALLIDA]
+    
+    # Columnas
+    id_tarea = db.Column(db.String(32), primary_key=True)
+    tipo = db.Column(db.String(100), nullable=False)
+    parametros = db.Column(db.Text)  # JSON
+    estado = db.Column(db.String(20), default=ESTADO_PENDIENTE, nullable=False)
+    intentos = db.Column(db.Integer, default=0, nullable=False)
+    resultado = db.Column(db.Text)  # JSON
+    error = db.Column(db.Text)
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    fecha_inicio = db.Column(db.DateTime)
+    fecha_fin = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('idx_tareas_estado', 'estado', 'fecha_creacion'),
+    )
+    
+    def __repr__(self):
+        return f'<Tarea {self.id_tarea} - {self.tipo}>'
+    
+    def to_dict(self):
+        """Convierte el objeto a diccionario"""
+        return {
+            'id': self.id_tarea,
+            'tipo': self.tipo,
+            'parametros': json.loads(self.parametros) if self.parametros else {},
+            'estado': self.estado,
+            'intentos': self.intentos,
+            'resultado': json.loads(self.resultado) if self.resultado else None,
+            'error': self.error,
+            'fecha_creacion': self.fecha_creacion.strftime('%Y-%m-%d %H:%M:%S') if self.fecha_creacion else None,
+            'fecha_inicio': self.fecha_inicio.strftime('%Y-%m-%d %H:%M:%S') if self.fecha_inicio else None,
+            'fecha_fin': self.fecha_fin.strftime('%Y-%m-%d %H:%M:%S') if self.fecha_fin else None
+        }
+    
+    @staticmethod
+    def get_recuperables():
+        """Obtiene tareas que no llegaron a terminar (pendientes o interrumpidas)"""
+        return Tarea.query.filter(
+            Tarea.estado.in_([Tarea.ESTADO_PENDIENTE, Tarea.ESTADO_EN_CURSO])
+        ).order_by(Tarea.fecha_creacion.asc()).all()
@@ -10,6 +10,9 @@ class Tratamiento(db.Model):
     """Modelo para la tabla de tratamientos"""
     
     __tablename__ = 'tratamientos'
+    __table_args__ = (
+        db.Index('idx_tratamientos_consulta', 'id_consulta'),
+    )
     
     # Columnas
     id_tratamiento = db.Column(db.Integer, primary_key=True, autoincrement=True)
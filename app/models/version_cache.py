@@ -0,0 +1,22 @@
+"""
+Modelo: VersionCache
+Versión de los datos que cada proceso guarda en caché: quien modifica esos
+datos incrementa la versión y las cachés de todos los procesos dejan de
+usar las entradas calculadas con la anterior (ver app/services/cache.py)
+"""
+from app import db
+from datetime import datetime
+
+
+class VersionCache(db.Model):
+    """Modelo para la tabla de versiones de las cachés compartidas"""
+
+    __tablename__ = 'versiones_cache'
+
+    # Columnas
+    nombre = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, default=0, nullable=False)
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<VersionCache {self.nombre} - {self.version}>'
@@ -0,0 +1,5 @@
+"""
+VetCare Pro - Servicios de infraestructura
+"""
+# Este archivo está vacío intencionalmente
+# Los servicios se importan directamente desde cada módulo
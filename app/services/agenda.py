@@ -0,0 +1,181 @@
+"""
+Servicio de Agenda
+Horarios ocupados y libres de cada veterinario.
+
+La agenda de un veterinario se construye a partir de sus consultas no
+canceladas (duración = Servicio.duracion_minutos o CONSULTA_DURACION_MINUTOS)
+como una lista ordenada de bloques sin solapes, de modo que comprobar si un
+horario está libre es una búsqueda binaria: O(log n). Se cargan también
+las consultas del día anterior, que pueden terminar pasada la medianoche.
+
+Las citas nuevas se guardan con `reservar`, que repite la comprobación con
+la fila del veterinario bloqueada hasta el commit.
+"""
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+
+
+class Agenda:
+    """Bloques ocupados [inicio, fin) de un veterinario, ordenados y fusionados"""
+
+    def __init__(self, intervalos=()):
+        self.inicios = []
+        self.fines = []
+        for inicio, fin in sorted(intervalos):
+            if self.fines and inicio < self.fines[-1]:
+                # Consultas ya cruzadas: se fusionan en un solo bloque
+                self.fines[-1] = max(self.fines[-1], fin)
+            else:
+                self.inicios.append(inicio)
+                self.fines.append(fin)
+
+    def __len__(self):
+        return len(self.inicios)
+
+    def conflicto(self, inicio, fin):
+        """Retorna el bloque (inicio, fin) que se cruza con [inicio, fin), o None"""
+        i = bisect_right(self.inicios, inicio)
+        if i > 0 and self.fines[i - 1] > inicio:
+            return self.inicios[i - 1], self.fines[i - 1]
+        if i < len(self.inicios) and self.inicios[i] < fin:
+            return self.inicios[i], self.fines[i]
+        return None
+
+    def libre(self, inicio, fin):
+        """Indica si el horario [inicio, fin) está libre"""
+        return self.conflicto(inicio, fin) is None
+
+
+# ============================================
+# CARGA DE AGENDAS
+# ============================================
+
+def duracion_servicio(id_servicio=None):
+    """Duración en minutos de un servicio (o la duración por defecto)"""
+    from app.models.servicio import Servicio
+
+    defecto = current_app.config.get('CONSULTA_DURACION_MINUTOS', 30)
+    if not id_servicio:
+        return defecto
+    duracion = db.session.query(Servicio.duracion_minutos)\
+        .filter(Servicio.id_servicio == id_servicio).scalar()
+    return duracion or defecto
+
+
+def cargar_agendas(ids_veterinario, desde, hasta):
+    """Construye con una sola consulta las agendas de varios veterinarios entre dos fechas"""
+    from app.models.consulta import Consulta
+    from app.models.servicio import Servicio
+
+    defecto = current_app.config.get('CONSULTA_DURACION_MINUTOS', 30)
+    filas = db.session.query(
+        Consulta.id_veterinario,
+        Consulta.fecha_hora,
+        Servicio.duracion_minutos
+    ).outerjoin(Servicio, Servicio.id_servicio == Consulta.id_servicio)\
+     .filter(
+        Consulta.id_veterinario.in_(ids_veterinario),
+        Consulta.estado != Consulta.ESTADO_CANCELADA,
+        Consulta.fecha_hora >= desde,
+        Consulta.fecha_hora < hasta
+    ).all()
+
+    intervalos = {id_veterinario: [] for id_veterinario in ids_veterinario}
+    for id_veterinario, inicio, duracion in filas:
+        intervalos[id_veterinario].append((inicio, inicio + timedelta(minutes=duracion or defecto)))
+    return {id_veterinario: Agenda(bloques) for id_veterinario, bloques in intervalos.items()}
+
+
+def _inicio_dia(fecha_hora):
+    return datetime.combine(fecha_hora.date(), datetime.min.time())
+
+
+def _hora(texto):
+    return datetime.strptime(texto, '%H:%M').time()
+
+
+# ============================================
+# CONSULTAS SOBRE LA AGENDA
+# ============================================
+
+def verificar_disponibilidad(id_veterinario, inicio, duracion):
+    """Retorna el bloque ocupado que impide la cita, o None si el horario está libre"""
+    fin = inicio + timedelta(minutes=duracion)
+    dia = _inicio_dia(inicio)
+    agenda = cargar_agendas([id_veterinario], dia - timedelta(days=1),
+                            max(fin, dia + timedelta(days=1)))[id_veterinario]
+    return agenda.conflicto(inicio, fin)
+
+
+def reservar(consulta, duracion):
+    """
+    Guarda `consulta` si el horario de su veterinario sigue libre.
+    La fila del veterinario se bloquea (UPDLOCK en SQL Server) antes de
+    comprobar la agenda y hasta el commit, así que dos reservas simultáneas
+    del mismo veterinario se resuelven una después de la otra.
+    Retorna el bloque ocupado (sin guardar nada) o None si se guardó.
+    """
+    from app.models.veterinario import Veterinario
+
+    # SQL Server no usa FOR UPDATE: el bloqueo se pide con la sugerencia UPDLOCK
+    db.session.execute(
+        db.select(Veterinario.id_veterinario)
+        .where(Veterinario.id_veterinario == consulta.id_veterinario)
+        .with_hint(Veterinario, 'WITH (UPDLOCK, ROWLOCK)', 'mssql')
+        .with_for_update()
+    ).scalar()
+    ocupado = verificar_disponibilidad(consulta.id_veterinario, consulta.fecha_hora, duracion)
+    if ocupado:
+        db.session.rollback()
+        return ocupado
+    db.session.add(consulta)
+    db.session.commit()
+    return None
+
+
+def proximos_libres(ids_veterinario, duracion, desde=None, cantidad=5):
+    """
+    Próximos `cantidad` horarios libres de `duracion` minutos a partir de
+    `desde`, dentro del horario de atención. Con varios veterinarios se
+    propone, para cada hora, el primero que esté libre.
+    Retorna una lista de (id_veterinario, inicio, fin).
+    """
+    config = current_app.config
+    paso = timedelta(minutes=config.get('AGENDA_INTERVALO_MINUTOS', 15))
+    largo = timedelta(minutes=duracion)
+    apertura = _hora(config.get('AGENDA_HORA_INICIO', '08:00'))
+    cierre = _hora(config.get('AGENDA_HORA_FIN', '18:00'))
+    dias_laborables = config.get('AGENDA_DIAS_LABORABLES', (0, 1, 2, 3, 4, 5))
+    dias = config.get('AGENDA_DIAS_BUSQUEDA', 14)
+
+    desde = desde or datetime.now()
+    primer_dia = _inicio_dia(desde)
+    agendas = cargar_agendas(ids_veterinario, primer_dia - timedelta(days=1),
+                             primer_dia + timedelta(days=dias + 1))
+
+    libres = []
+    for n in range(dias + 1):
+        dia = (primer_dia + timedelta(days=n)).date()
+        if dia.weekday() not in dias_laborables:
+            continue
+
+        hora = datetime.combine(dia, apertura)
+        if hora < desde:
+            # Primer múltiplo del intervalo a partir de `desde`
+            hora += ((desde - hora) + paso - timedelta(microseconds=1)) // paso * paso
+        fin_dia = datetime.combine(dia, cierre)
+
+        while hora + largo <= fin_dia:
+            for id_veterinario in ids_veterinario:
+                if agendas[id_veterinario].libre(hora, hora + largo):
+                    libres.append((id_veterinario, hora, hora + largo))
+                    break
+            if len(libres) >= cantidad:
+                return libres
+            hora += paso
+
+    return libres
@@ -0,0 +1,129 @@
+"""
+Servicio de Archivo
+Mueve a las tablas de archivo (app/models/archivo.py) los registros cerrados
+más antiguos que ARCHIVE_AFTER_DAYS, por lotes con una transacción corta por
+lote (copia + borrado):
+    - consultas Completadas o Canceladas, junto con sus tratamientos,
+    - vacunaciones Canceladas, y Aplicadas que ya tienen una dosis aplicada
+      posterior de la misma vacuna: la última dosis de cada mascota queda en
+      la tabla, porque de ella salen las próximas dosis, las campañas y el
+      pronóstico.
+
+Las vacunaciones con un recordatorio sin enviar se omiten; los recordatorios
+ya enviados o fallidos de las vacunaciones archivadas se eliminan (son la
+bandeja de salida, no historial).
+"""
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.models.archivo import tablas, seleccionar
+from app.models.calendario_vacunacion import CalendarioVacunacion
+from app.models.consulta import Consulta
+from app.models.recordatorio import Recordatorio
+from app.models.tratamiento import Tratamiento
+from app.services.tareas import cola
+
+
+def _mover(conexion, modelo, columna, ids):
+    """Copia al archivo las filas de `modelo` con `columna` en ids y las borra"""
+    origen, archivo = tablas(modelo)
+    filtro = origen.c[columna].in_(ids)
+    conexion.execute(archivo.insert().from_select(
+        [c.name for c in origen.columns], seleccionar(origen, origen).where(filtro)
+    ))
+    return conexion.execute(origen.delete().where(filtro)).rowcount
+
+
+def _consultas(limite):
+    C = Consulta.__table__
+    return db.select(C.c.id_consulta).where(
+        C.c.estado.in_([Consulta.ESTADO_COMPLETADA, Consulta.ESTADO_CANCELADA]),
+        C.c.fecha_hora < limite
+    )
+
+
+def _vacunaciones(limite):
+    C = CalendarioVacunacion.__table__
+    posterior = C.alias('posterior')
+    R = Recordatorio.__table__
+
+    reemplazada = db.exists().where(
+        posterior.c.id_mascota == C.c.id_mascota,
+        posterior.c.id_vacuna == C.c.id_vacuna,
+        posterior.c.dosis_numero > C.c.dosis_numero,
+        posterior.c.estado == CalendarioVacunacion.ESTADO_APLICADA
+    )
+    por_enviar = db.exists().where(
+        R.c.id_calendario == C.c.id_calendario,
+        R.c.estado.in_([Recordatorio.ESTADO_PENDIENTE, Recordatorio.ESTADO_ENVIANDO])
+    )
+    return db.select(C.c.id_calendario).where(
+        C.c.fecha_programada < limite.date(),
+        db.or_(
+            C.c.estado == CalendarioVacunacion.ESTADO_CANCELADA,
+            db.and_(C.c.estado == CalendarioVacunacion.ESTADO_APLICADA, reemplazada)
+        ),
+        ~por_enviar
+    )
+
+
+def archivar(dias=None, tamaño_lote=None, pausa=None):
+    """
+    Archiva los registros cerrados con más de `dias` de antigüedad.
+    Retorna {'consultas', 'tratamientos', 'vacunaciones'} movidos.
+    """
+    config = current_app.config
+    dias = dias or config.get('ARCHIVE_AFTER_DAYS', 730)
+    tamaño_lote = tamaño_lote or config.get('ARCHIVE_BATCH_SIZE', 1000)
+    pausa = config.get('ARCHIVE_PAUSE', 0.1) if pausa is None else pausa
+    limite = datetime.combine(datetime.now().date() - timedelta(days=dias), datetime.min.time())
+
+    movidos = {'consultas': 0, 'tratamientos': 0, 'vacunaciones': 0}
+
+    def por_lotes(seleccion, mover):
+        while True:
+            with db.engine.begin() as conexion:
+                ids = [fila[0] for fila in conexion.execute(seleccion.limit(tamaño_lote))]
+                if not ids:
+                    return
+                mover(conexion, ids)
+            if pausa:
+                time.sleep(pausa)
+
+    def mover_consultas(conexion, ids):
+        movidos['tratamientos'] += _mover(conexion, Tratamiento, 'id_consulta', ids)
+        movidos['consultas'] += _mover(conexion, Consulta, 'id_consulta', ids)
+
+    def mover_vacunaciones(conexion, ids):
+        R = Recordatorio.__table__
+        conexion.execute(R.delete().where(R.c.id_calendario.in_(ids)))
+        movidos['vacunaciones'] += _mover(conexion, CalendarioVacunacion, 'id_calendario', ids)
+
+    por_lotes(_consultas(limite), mover_consultas)
+    por_lotes(_vacunaciones(limite), mover_vacunaciones)
+
+    if movidos['vacunaciones']:
+        from app.services import calendario
+        calendario.invalidar()  # Los meses en caché ya no tienen esas filas
+    return movidos
+
+
+def contar():
+    """Filas en uso y archivadas por tabla"""
+    resultado = {}
+    for modelo in (Consulta, Tratamiento, CalendarioVacunacion):
+        origen, archivo = tablas(modelo)
+        resultado[origen.name] = {
+            'en_uso': db.session.scalar(db.select(db.func.count()).select_from(origen)),
+            'archivadas': db.session.scalar(db.select(db.func.count()).select_from(archivo))
+        }
+    return resultado
+
+
+@cola.tarea('archivo.archivar', max_concurrencia=1, reintentos=0)
+def tarea_archivar(dias=None):
+    """Archiva los registros cerrados antiguos (tarea en segundo plano)"""
+    return archivar(dias)
@@ -0,0 +1,91 @@
+"""
+Servicio de Arranque
+Medición de tiempos de inicio y carga diferida de blueprints
+"""
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+
+
+class RegistroArranque:
+    """Acumula el tiempo consumido por cada fase del arranque"""
+
+    def __init__(self):
+        self.fases = []
+
+    @contextmanager
+    def fase(self, nombre):
+        """Mide el tiempo de un bloque y lo registra con el nombre indicado"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.fases.append((nombre, time.perf_counter() - inicio))
+
+    @property
+    def total(self):
+        """Tiempo total registrado en segundos"""
+        return sum(segundos for _, segundos in self.fases)
+
+    def resumen(self):
+        """Retorna el desglose de tiempos en milisegundos"""
+        return {
+            'fases': [{'fase': nombre, 'ms': round(segundos * 1000, 2)}
+                      for nombre, segundos in self.fases],
+            'total_ms': round(self.total * 1000, 2)
+        }
+
+    def texto(self):
+        """Retorna el desglose en formato legible para consola"""
+        lineas = [f"  {nombre:<40} {segundos * 1000:8.1f} ms" for nombre, segundos in self.fases]
+        lineas.append(f"  {'TOTAL':<40} {self.total * 1000:8.1f} ms")
+        return '\n'.join(lineas)
+
+
+def registrar_blueprint(app, modulo, atributo, url_prefix=None, registro=None):
+    """Importa el módulo del controlador y registra su blueprint"""
+    def _registrar():
+        blueprint = getattr(importlib.import_module(modulo), atributo)
+        app.register_blueprint(blueprint, url_prefix=url_prefix)
+
+    if registro is None:
+        _registrar()
+    else:
+        with registro.fase(f'blueprint {atributo}'):
+            _registrar()
+
+
+class CargaDiferidaBlueprints:
+    """
+    Middleware WSGI que difiere la importación de los controladores
+    (y con ellos de los modelos) hasta la primera petición.
+
+    Flask no permite registrar rutas después de atender la primera petición
+    y las plantillas enlazan con url_for a todos los módulos, por lo que la
+    carga se hace completa y una sola vez, antes de despachar esa petición.
+    """
+
+    def __init__(self, app, blueprints, registro=None):
+        self.app = app
+        self.wsgi_app = app.wsgi_app
+        self.blueprints = list(blueprints)
+        self.registro = registro
+        self.cargado = False
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        if not self.cargado:
+            self.cargar()
+        return self.wsgi_app(environ, start_response)
+
+    def cargar(self):
+        """Registra todos los blueprints pendientes (idempotente)"""
+        with self._lock:
+            if self.cargado:
+                return
+            for modulo, atributo, url_prefix in self.blueprints:
+                registrar_blueprint(self.app, modulo, atributo, url_prefix, self.registro)
+            self.cargado = True
+            if self.registro is not None:
+                self.app.logger.info('Blueprints cargados bajo demanda:\n%s', self.registro.texto())
@@ -0,0 +1,124 @@
+"""
+Servicio de Caché
+Caché en memoria con expiración (TTL) y desalojo por tamaño (LRU).
+
+Cada proceso tiene su propia caché. Para descartar en todos los procesos lo
+calculado sobre unos datos, la clave incluye `version(nombre)` (una fila de
+la tabla versiones_cache) y quien modifica esos datos llama a
+`incrementar_version(nombre)`: las entradas anteriores dejan de leerse y
+salen por LRU o por TTL.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+
+class CacheResultados:
+    """
+    Caché LRU limitada por bytes aproximados (tamaño del JSON de cada valor).
+    Cada entrada expira a los `ttl` segundos; ttl=None no expira.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=600):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes_usados = 0
+        self._datos = OrderedDict()  # clave -> (valor, tamaño, expira)
+        self._lock = threading.Lock()
+
+    def get(self, clave, default=None):
+        """Retorna el valor almacenado o `default` si no existe o expiró"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return default
+            valor, tamaño, expira = entrada
+            if expira is not None and expira < time.monotonic():
+                self._quitar(clave)
+                return default
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor, ttl=-1):
+        """Guarda un valor (ttl=-1 usa el TTL por defecto; None no expira)"""
+        if ttl == -1:
+            ttl = self.ttl
+        tamaño = len(json.dumps(valor, default=str))
+        if tamaño > self.max_bytes:
+            return False
+        expira = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            if clave in self._datos:
+                self._quitar(clave)
+            self._datos[clave] = (valor, tamaño, expira)
+            self.bytes_usados += tamaño
+            while self.bytes_usados > self.max_bytes:
+                self._quitar(next(iter(self._datos)))
+        return True
+
+    def delete(self, clave):
+        """Elimina una entrada si existe"""
+        with self._lock:
+            if clave in self._datos:
+                self._quitar(clave)
+
+    def clear(self):
+        """Vacía la caché"""
+        with self._lock:
+            self._datos.clear()
+            self.bytes_usados = 0
+
+    def __contains__(self, clave):
+        return self.get(clave, _AUSENTE) is not _AUSENTE
+
+    def __len__(self):
+        return len(self._datos)
+
+    def _quitar(self, clave):
+        _, tamaño, _ = self._datos.pop(clave)
+        self.bytes_usados -= tamaño
+
+
+_AUSENTE = object()
+
+
+# ============================================
+# VERSIONES COMPARTIDAS ENTRE PROCESOS
+# ============================================
+
+def version(nombre):
+    """Versión actual de los datos `nombre` (0 si nunca cambiaron)"""
+    from app import db
+    from app.models.version_cache import VersionCache
+
+    return db.session.query(VersionCache.version)\
+        .filter(VersionCache.nombre == nombre).scalar() or 0
+
+
+def versiones(prefijo):
+    """Versiones de los datos cuyo nombre empieza por `prefijo`: nombre -> versión (una consulta)"""
+    from app import db
+    from app.models.version_cache import VersionCache
+
+    return dict(db.session.query(VersionCache.nombre, VersionCache.version)
+                .filter(VersionCache.nombre.like(f'{prefijo}%')))
+
+
+def incrementar_version(nombre):
+    """Cambia la versión de `nombre` y confirma (UPDATE de una fila)"""
+    from sqlalchemy.exc import IntegrityError
+    from app import db
+    from app.models.version_cache import VersionCache
+
+    cambios = {VersionCache.version: VersionCache.version + 1,
+               VersionCache.fecha_actualizacion: datetime.utcnow()}
+    if not VersionCache.query.filter_by(nombre=nombre).update(cambios, synchronize_session=False):
+        try:
+            with db.session.begin_nested():
+                db.session.add(VersionCache(nombre=nombre, version=1))
+        except IntegrityError:
+            # Otro proceso creó la fila al mismo tiempo
+            VersionCache.query.filter_by(nombre=nombre).update(cambios, synchronize_session=False)
+    db.session.commit()
@@ -0,0 +1,215 @@
+"""
+Servicio de Caja
+Cierre de caja por día a partir del libro de pagos (tabla pagos): totales
+por método de pago, por usuario que registró el pago, por hora y por estado
+actual de la factura.
+
+Los días abiertos del rango se calculan juntos, con una consulta agrupada
+por día para cada dimensión sobre el índice idx_pagos_dia. Al cerrar un día
+sus totales se guardan en cierres_caja y ya no se recalculan; los pagos
+de ese día que el cierre no incluyó se informan aparte (posteriores),
+comparando los totales actuales del día con los guardados.
+"""
+import json
+from datetime import date, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.cierre_caja import CierreCaja
+from app.models.factura import Factura, Pago
+from app.models.fechas import en_rango
+from app.models.usuario import Usuario
+from app.services.cache import CacheResultados
+
+DIMENSIONES = ('metodo', 'usuario', 'hora', 'estado')
+
+# Resúmenes de días cerrados (no cambian): fecha ISO -> resumen
+cache_cierres = CacheResultados(max_bytes=4 * 1024 * 1024, ttl=None)
+
+
+class CierreInvalido(ValueError):
+    """El día no se puede cerrar (el mensaje es apto para mostrar)"""
+
+
+def _vacio():
+    resumen = {'num_pagos': 0, 'total': 0.0}
+    for dimension in DIMENSIONES:
+        resumen[f'por_{dimension}'] = []
+    return resumen
+
+
+# ============================================
+# CÁLCULO
+# ============================================
+
+def _calcular(desde, hasta, excluir=()):
+    """Resúmenes de los días desde..hasta (ambos incluidos) salvo `excluir`: fecha -> resumen"""
+    filtro = [en_rango(Pago.fecha, desde, hasta + timedelta(days=1))]
+    if excluir:
+        filtro.append(Pago.fecha.notin_(list(excluir)))
+    num_pagos = db.func.count(Pago.id_pago)
+    total = db.func.sum(Pago.monto)
+    hora = db.extract('hour', Pago.fecha_pago)
+
+    consultas = {
+        'metodo': db.session.query(Pago.fecha, Pago.metodo_pago, num_pagos, total)
+            .filter(*filtro).group_by(Pago.fecha, Pago.metodo_pago),
+        'usuario': db.session.query(Pago.fecha, Usuario.nombre_completo, num_pagos, total)
+            .outerjoin(Usuario, Usuario.id_usuario == Pago.id_usuario_registro)
+            .filter(*filtro).group_by(Pago.fecha, Pago.id_usuario_registro, Usuario.nombre_completo),
+        'hora': db.session.query(Pago.fecha, hora, num_pagos, total)
+            .filter(*filtro).group_by(Pago.fecha, hora),
+        'estado': db.session.query(Pago.fecha, Factura.estado, num_pagos, total)
+            .join(Factura, Factura.id_factura == Pago.id_factura)
+            .filter(*filtro).group_by(Pago.fecha, Factura.estado),
+    }
+
+    dias = {}
+    for dimension, consulta in consultas.items():
+        for fila in consulta:
+            resumen = dias.setdefault(fila[0], _vacio())
+            clave = fila[1]
+            if dimension == 'usuario' and clave is None:
+                clave = 'Sin usuario'
+            elif dimension == 'hora':
+                clave = f'{int(clave):02d}:00'
+            resumen[f'por_{dimension}'].append(
+                {'clave': clave, 'num_pagos': fila[2], 'total': float(fila[3] or 0)}
+            )
+            if dimension == 'metodo':
+                resumen['num_pagos'] += fila[2]
+                resumen['total'] += float(fila[3] or 0)
+
+    for resumen in dias.values():
+        resumen['total'] = round(resumen['total'], 2)
+        for dimension in DIMENSIONES:
+            resumen[f'por_{dimension}'].sort(key=lambda e: e['clave'])
+    return dias
+
+
+def _cerrados(desde, hasta):
+    """Cierres del rango: fecha -> (fila con fecha_cierre y usuario, resumen guardado)"""
+    cierres = db.session.query(
+        CierreCaja.fecha, CierreCaja.fecha_cierre, Usuario.nombre_completo
+    ).outerjoin(Usuario, Usuario.id_usuario == CierreCaja.id_usuario)\
+     .filter(CierreCaja.fecha >= desde, CierreCaja.fecha <= hasta).all()
+
+    resumenes = {c.fecha: cache_cierres.get(c.fecha.isoformat()) for c in cierres}
+    faltantes = [fecha for fecha, resumen in resumenes.items() if resumen is None]
+    if faltantes:
+        for fecha, datos in db.session.query(CierreCaja.fecha, CierreCaja.datos)\
+                .filter(CierreCaja.fecha.in_(faltantes)):
+            resumenes[fecha] = json.loads(datos)
+            cache_cierres.set(fecha.isoformat(), resumenes[fecha])
+
+    return {c.fecha: (c, resumenes[c.fecha]) for c in cierres}
+
+
+def _posteriores(cerrados):
+    """
+    Pagos de los días cerrados que no entraron en el cierre: fecha -> (num_pagos, total).
+    El libro de pagos solo crece, así que es lo que suma hoy el día menos lo
+    guardado al cerrar. No depende del orden de id_pago: un pago insertado
+    antes del cierre pero confirmado después también aparece.
+    """
+    filas = db.session.query(
+        Pago.fecha, db.func.count(Pago.id_pago), db.func.sum(Pago.monto)
+    ).filter(Pago.fecha.in_(list(cerrados))).group_by(Pago.fecha)
+
+    posteriores = {}
+    for fecha, num, total in filas:
+        _, resumen = cerrados[fecha]
+        num -= resumen['num_pagos']
+        total = round(float(total or 0) - resumen['total'], 2)
+        if num or total:
+            posteriores[fecha] = (num, total)
+    return posteriores
+
+
+def _sumar(resumenes):
+    """Une los resúmenes de varios días"""
+    totales = _vacio()
+    for resumen in resumenes:
+        totales['num_pagos'] += resumen['num_pagos']
+        totales['total'] += resumen['total']
+        for dimension in DIMENSIONES:
+            acumulado = {e['clave']: e for e in totales[f'por_{dimension}']}
+            for entrada in resumen[f'por_{dimension}']:
+                suma = acumulado.setdefault(entrada['clave'], {'clave': entrada['clave'], 'num_pagos': 0, 'total': 0.0})
+                suma['num_pagos'] += entrada['num_pagos']
+                suma['total'] = round(suma['total'] + entrada['total'], 2)
+            totales[f'por_{dimension}'] = sorted(acumulado.values(), key=lambda e: e['clave'])
+    totales['total'] = round(totales['total'], 2)
+    return totales
+
+
+# ============================================
+# REPORTE Y CIERRE
+# ============================================
+
+def reporte(desde, hasta):
+    """
+    Cierre de caja de los días desde..hasta (ambos incluidos).
+    Retorna {'dias': [resumen de cada día con 'fecha', 'cerrado', ...], 'totales'}.
+    """
+    cerrados = _cerrados(desde, hasta)
+    abiertos = _calcular(desde, hasta, excluir=cerrados.keys())
+    posteriores = _posteriores(cerrados) if cerrados else {}
+
+    dias = []
+    fecha = desde
+    while fecha <= hasta:
+        if fecha in cerrados:
+            cierre, resumen = cerrados[fecha]
+            num, total = posteriores.get(fecha, (0, 0.0))
+            dia = dict(resumen, cerrado=True, cerrado_por=cierre.nombre_completo,
+                       fecha_cierre=cierre.fecha_cierre.strftime('%d/%m/%Y %H:%M'),
+                       posteriores={'num_pagos': num, 'total': total})
+        else:
+            dia = dict(abiertos.get(fecha) or _vacio(), cerrado=False)
+        dia['fecha'] = fecha.isoformat()
+        dias.append(dia)
+        fecha += timedelta(days=1)
+
+    return {
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'dias': dias,
+        'totales': _sumar(dias)
+    }
+
+
+def cerrar(fecha, id_usuario=None):
+    """Cierra la caja del día guardando sus totales; retorna el CierreCaja"""
+    if fecha > date.today():
+        raise CierreInvalido('No se puede cerrar la caja de un día futuro.')
+    if db.session.get(CierreCaja, fecha) is not None:
+        raise CierreInvalido(f'La caja del {fecha.strftime("%d/%m/%Y")} ya está cerrada.')
+
+    resumen = _calcular(fecha, fecha).get(fecha) or _vacio()
+    cierre = CierreCaja(
+        fecha=fecha,
+        num_pagos=resumen['num_pagos'],
+        total=resumen['total'],
+        datos=json.dumps(resumen),
+        id_usuario=id_usuario
+    )
+    db.session.add(cierre)
+    try:
+        db.session.commit()
+    except IntegrityError:  # Otro usuario la cerró al mismo tiempo
+        db.session.rollback()
+        raise CierreInvalido(f'La caja del {fecha.strftime("%d/%m/%Y")} ya está cerrada.')
+    cache_cierres.set(fecha.isoformat(), resumen)
+    return cierre
+
+
+def filas_csv(datos):
+    """Filas (fecha, estado, dimensión, clave, pagos, total) del reporte para exportar"""
+    for dia in datos['dias']:
+        estado = 'Cerrado' if dia['cerrado'] else 'Abierto'
+        yield dia['fecha'], estado, 'total', '', dia['num_pagos'], dia['total']
+        for dimension in DIMENSIONES:
+            for entrada in dia[f'por_{dimension}']:
+                yield dia['fecha'], estado, dimension, entrada['clave'], entrada['num_pagos'], entrada['total']
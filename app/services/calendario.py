@@ -0,0 +1,201 @@
+"""
+Servicio de Calendario de Vacunación
+Vistas de mes, semana y agenda agrupadas por día.
+
+Cada vista sale de dos consultas sobre el rango:
+    - conteos por día y estado (GROUP BY),
+    - entradas a mostrar: columnas proyectadas con mascota y vacuna en el
+      mismo JOIN, limitadas por día con ROW_NUMBER() (los días con más
+      entradas solo envían los conteos y el número de ocultas).
+
+Los rangos ya cerrados (anteriores a hoy) se guardan en caché. La clave
+incluye la versión compartida del calendario (tabla versiones_cache), que
+cambia cuando se modifica alguna vacunación de un día pasado: así la caché
+se descarta en todos los procesos, no solo en el que hizo el cambio.
+"""
+import calendar
+from datetime import date, timedelta
+
+from flask import current_app
+
+from app import db
+from app.models.calendario_vacunacion import CalendarioVacunacion
+from app.models.mascota import Mascota
+from app.models.vacuna import Vacuna
+from app.services import cache
+from app.services.cache import CacheResultados
+from app.services.eventos import bus
+
+VISTAS = ('mes', 'semana', 'agenda')
+
+# Rangos cerrados ya calculados (por proceso): 'vista:desde:hasta:limite:version' -> datos
+cache_calendario = CacheResultados(max_bytes=8 * 1024 * 1024)
+VERSION_CALENDARIO = 'calendario.vacunacion'
+
+
+# ============================================
+# CONSULTAS
+# ============================================
+
+def _dias(desde, hasta, limite):
+    """Días del rango [desde, hasta] con conteos y hasta `limite` entradas cada uno"""
+    C = CalendarioVacunacion
+    dias = {}
+    fecha = desde
+    while fecha <= hasta:
+        dias[fecha] = {'fecha': fecha.isoformat(), 'dia': fecha.day, 'total': 0,
+                       'por_estado': {}, 'entradas': [], 'ocultas': 0}
+        fecha += timedelta(days=1)
+
+    conteos = db.session.query(
+        C.fecha_programada, C.estado, db.func.count(C.id_calendario)
+    ).filter(
+        C.fecha_programada >= desde,
+        C.fecha_programada <= hasta
+    ).group_by(C.fecha_programada, C.estado)
+    for fecha, estado, cantidad in conteos:
+        dia = dias[fecha]
+        dia['por_estado'][estado] = cantidad
+        dia['total'] += cantidad
+
+    numero = db.func.row_number().over(
+        partition_by=C.fecha_programada,
+        order_by=(db.case((C.estado == C.ESTADO_PENDIENTE, 0), else_=1), Mascota.nombre, C.id_calendario)
+    ).label('numero')
+    entradas = db.session.query(
+        C.id_calendario, C.fecha_programada, C.estado, C.dosis_numero,
+        Mascota.id_mascota, Mascota.nombre.label('mascota'), Vacuna.nombre.label('vacuna'),
+        numero
+    ).join(Mascota, C.id_mascota == Mascota.id_mascota)\
+     .join(Vacuna, C.id_vacuna == Vacuna.id_vacuna)\
+     .filter(
+        C.fecha_programada >= desde,
+        C.fecha_programada <= hasta
+    ).subquery()
+
+    filas = db.session.query(entradas).filter(entradas.c.numero <= limite)\
+        .order_by(entradas.c.fecha_programada, entradas.c.numero)
+    for fila in filas:
+        dias[fila.fecha_programada]['entradas'].append({
+            'id': fila.id_calendario,
+            'estado': fila.estado,
+            'dosis': fila.dosis_numero,
+            'mascota_id': fila.id_mascota,
+            'mascota': fila.mascota,
+            'vacuna': fila.vacuna
+        })
+
+    for dia in dias.values():
+        dia['ocultas'] = dia['total'] - len(dia['entradas'])
+    return list(dias.values())
+
+
+def _resumen(dias):
+    por_estado = {}
+    for dia in dias:
+        for estado, cantidad in dia['por_estado'].items():
+            por_estado[estado] = por_estado.get(estado, 0) + cantidad
+    return por_estado
+
+
+def _rango(vista, desde, hasta, limite):
+    """Días del rango, desde la caché si el rango ya cerró"""
+    if hasta >= date.today():
+        return _dias(desde, hasta, limite)
+
+    clave = f'{vista}:{desde}:{hasta}:{limite}:{cache.version(VERSION_CALENDARIO)}'
+    dias = cache_calendario.get(clave)
+    if dias is None:
+        dias = _dias(desde, hasta, limite)
+        cache_calendario.set(clave, dias, ttl=current_app.config.get('CALENDAR_CACHE_TTL', 3600))
+    return dias
+
+
+# ============================================
+# VISTAS
+# ============================================
+
+def mes(año, mes):
+    """Cuadrícula del mes (semanas de lunes a domingo)"""
+    semanas = calendar.Calendar(firstweekday=0).monthdatescalendar(año, mes)
+    limite = current_app.config.get('CALENDAR_MONTH_ENTRIES_PER_DAY', 4)
+    dias = _rango('mes', semanas[0][0], semanas[-1][-1], limite)
+
+    del_mes = [d for d in dias if int(d['fecha'][5:7]) == mes]
+    primero = date(año, mes, 1)
+    return {
+        'vista': 'mes',
+        'año': año,
+        'mes': mes,
+        'desde': semanas[0][0].isoformat(),
+        'hasta': semanas[-1][-1].isoformat(),
+        'anterior': (primero - timedelta(days=1)).replace(day=1).isoformat(),
+        'siguiente': (primero + timedelta(days=31)).replace(day=1).isoformat(),
+        'semanas': [dias[i:i + 7] for i in range(0, len(dias), 7)],
+        'por_estado': _resumen(del_mes),
+        'total': sum(d['total'] for d in del_mes)
+    }
+
+
+def semana(fecha):
+    """Semana (lunes a domingo) que contiene `fecha`"""
+    desde = fecha - timedelta(days=fecha.weekday())
+    hasta = desde + timedelta(days=6)
+    dias = _rango('semana', desde, hasta, current_app.config.get('CALENDAR_WEEK_ENTRIES_PER_DAY', 25))
+    return {
+        'vista': 'semana',
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'anterior': (desde - timedelta(days=7)).isoformat(),
+        'siguiente': (desde + timedelta(days=7)).isoformat(),
+        'dias': dias,
+        'por_estado': _resumen(dias),
+        'total': sum(d['total'] for d in dias)
+    }
+
+
+def agenda(fecha, dias=None):
+    """Lista de los días con vacunaciones a partir de `fecha`"""
+    dias = dias or current_app.config.get('CALENDAR_AGENDA_DAYS', 14)
+    hasta = fecha + timedelta(days=dias - 1)
+    lista = _rango('agenda', fecha, hasta, current_app.config.get('CALENDAR_AGENDA_ENTRIES_PER_DAY', 200))
+    return {
+        'vista': 'agenda',
+        'desde': fecha.isoformat(),
+        'hasta': hasta.isoformat(),
+        'anterior': (fecha - timedelta(days=dias)).isoformat(),
+        'siguiente': (hasta + timedelta(days=1)).isoformat(),
+        'num_dias': dias,
+        'dias': [d for d in lista if d['total']],
+        'por_estado': _resumen(lista),
+        'total': sum(d['total'] for d in lista)
+    }
+
+
+# ============================================
+# INVALIDACIÓN
+# ============================================
+
+def invalidar(fechas=None):
+    """
+    Descarta en todos los procesos los rangos en caché si alguna de las
+    fechas (o cualquiera, sin fechas) es de un día pasado. Confirma la sesión.
+    """
+    if fechas is None or any(f < date.today() for f in fechas):
+        cache.incrementar_version(VERSION_CALENDARIO)
+
+
+@bus.suscriptor('CalendarioVacunacion', asincrono=True)
+def _invalidar_calendario(cambios):
+    """Las vacunaciones modificadas de días pasados invalidan esos rangos"""
+    if any(c.operacion == c.ELIMINADO for c in cambios):
+        return invalidar()
+    if any(c.operacion == c.ACTUALIZADO and 'fecha_programada' in c.valores for c in cambios):
+        return invalidar()  # Se desconoce la fecha anterior
+
+    fechas = {c.valores['fecha_programada'] for c in cambios if c.valores.get('fecha_programada')}
+    sin_fecha = [c.id for c in cambios if not c.valores.get('fecha_programada')]
+    if sin_fecha:
+        fechas.update(f for (f,) in db.session.query(CalendarioVacunacion.fecha_programada)
+                      .filter(CalendarioVacunacion.id_calendario.in_(sin_fecha)))
+    invalidar(fechas)
@@ -0,0 +1,101 @@
+"""
+Servicio de Campañas de Vacunación
+Programa una vacuna para todas las mascotas elegibles con un único
+INSERT ... SELECT (sin cargar las mascotas en Python).
+
+Una mascota es elegible si:
+    - está activa y es de la especie de la vacuna (o de la elegida, si la
+      vacuna aplica a todas),
+    - tiene la edad mínima de la vacuna en la fecha de la campaña (si la vacuna
+      exige edad mínima, las mascotas sin fecha de nacimiento se excluyen),
+    - no tiene esa vacuna pendiente ni aplicada a menos de `intervalo_dias`
+      de la fecha de la campaña.
+
+El INSERT masivo no pasa por el ORM: la campaña se publica en el bus de
+eventos como un único cambio de CalendarioVacunacion sin id (con la vacuna,
+la fecha y el estado), para que el calendario, el pronóstico y las demás
+suscripciones se enteren de las nuevas dosis.
+"""
+from datetime import datetime, timedelta
+
+from app import db
+from app.models.calendario_vacunacion import CalendarioVacunacion
+from app.models.mascota import Mascota
+from app.services import eventos
+
+
+def _elegibles(vacuna, fecha, id_especie=None):
+    """SELECT de los id_mascota elegibles para la campaña"""
+    calendario = db.aliased(CalendarioVacunacion)
+    ventana = timedelta(days=vacuna.intervalo_dias)
+
+    ya_cubierta = db.exists().where(
+        calendario.id_mascota == Mascota.id_mascota,
+        calendario.id_vacuna == vacuna.id_vacuna,
+        db.or_(
+            db.and_(calendario.estado == CalendarioVacunacion.ESTADO_PENDIENTE,
+                    calendario.fecha_programada > fecha - ventana,
+                    calendario.fecha_programada < fecha + ventana),
+            db.and_(calendario.estado == CalendarioVacunacion.ESTADO_APLICADA,
+                    calendario.fecha_aplicacion > fecha - ventana)
+        )
+    )
+
+    condiciones = [Mascota.activo == True, ~ya_cubierta]
+    especie = vacuna.id_especie or id_especie
+    if especie:
+        condiciones.append(Mascota.id_especie == especie)
+    if vacuna.edad_minima_dias:
+        # Fecha calculada aquí: la comparación usa la columna tal cual
+        condiciones.append(Mascota.fecha_nacimiento <= fecha - timedelta(days=vacuna.edad_minima_dias))
+
+    return db.select(Mascota.id_mascota).where(*condiciones)
+
+
+def contar(vacuna, fecha, id_especie=None):
+    """Número de mascotas que recibirían la vacuna (simulación)"""
+    consulta = _elegibles(vacuna, fecha, id_especie).subquery()
+    return db.session.execute(db.select(db.func.count()).select_from(consulta)).scalar()
+
+
+def programar(vacuna, fecha, id_especie=None, observaciones=None, id_usuario=None):
+    """
+    Crea una vacunación pendiente por cada mascota elegible.
+    Retorna el número de vacunaciones programadas.
+    """
+    elegibles = _elegibles(vacuna, fecha, id_especie).subquery()
+    aplicadas = db.aliased(CalendarioVacunacion)
+
+    # Número de dosis: última aplicada + 1 (las anteriores pueden estar archivadas)
+    dosis = db.select(db.func.coalesce(db.func.max(aplicadas.dosis_numero), 0) + 1).where(
+        aplicadas.id_mascota == elegibles.c.id_mascota,
+        aplicadas.id_vacuna == vacuna.id_vacuna,
+        aplicadas.estado == CalendarioVacunacion.ESTADO_APLICADA
+    ).scalar_subquery()
+
+    seleccion = db.select(
+        elegibles.c.id_mascota,
+        db.literal(vacuna.id_vacuna),
+        db.literal(fecha),
+        dosis,
+        db.literal(CalendarioVacunacion.ESTADO_PENDIENTE),
+        db.literal(False),
+        db.literal(observaciones, db.String),
+        db.literal(id_usuario, db.Integer),
+        db.literal(datetime.utcnow())
+    )
+
+    tabla = CalendarioVacunacion.__table__
+    resultado = db.session.execute(tabla.insert().from_select([
+        tabla.c.id_mascota, tabla.c.id_vacuna, tabla.c.fecha_programada, tabla.c.dosis_numero,
+        tabla.c.estado, tabla.c.recordatorio_enviado, tabla.c.observaciones,
+        tabla.c.id_usuario_registro, tabla.c.fecha_registro
+    ], seleccion))
+    if resultado.rowcount:
+        eventos.registrar(eventos.CambioEntidad('CalendarioVacunacion', None, eventos.CambioEntidad.CREADO, {
+            'id_vacuna': vacuna.id_vacuna,
+            'fecha_programada': fecha,
+            'estado': CalendarioVacunacion.ESTADO_PENDIENTE
+        }))
+    db.session.commit()
+    return resultado.rowcount
@@ -0,0 +1,181 @@
+"""
+Servicio de Cobranza
+Antigüedad de saldos (cuentas por cobrar) por propietario, en tramos de
+0-30, 31-60, 61-90 y más de 90 días desde la emisión de la factura.
+
+El resumen sale de una sola consulta agrupada por propietario sobre el
+saldo persistido (facturas.saldo_pendiente) y el índice filtrado
+idx_facturas_deudores: solo se leen las facturas con saldo. El resumen del
+día se guarda en caché hasta medianoche, hasta pedir ?actualizar=1 o hasta
+que cambie el saldo de alguna factura (pagos, anulaciones, facturas nuevas),
+en cualquier proceso.
+"""
+from datetime import date, datetime, timedelta
+
+from app import db
+from app.models.factura import Factura
+from app.models.fechas import inicio_dia
+from app.models.propietario import Propietario
+from app.services import cache
+from app.services.cache import CacheResultados
+from app.services.eventos import bus
+from app.services.tareas import cola
+
+# (clave, etiqueta, días desde, días hasta); None = sin límite
+TRAMOS = (
+    ('d0_30', '0-30', 0, 30),
+    ('d31_60', '31-60', 31, 60),
+    ('d61_90', '61-90', 61, 90),
+    ('d90', '+90', 91, None),
+)
+
+# Resumen del día por fecha de corte y versión: 'YYYY-MM-DD:version' -> datos
+cache_antiguedad = CacheResultados(max_bytes=16 * 1024 * 1024, ttl=None)
+VERSION_SALDOS = 'cobranza.saldos'
+
+# Columnas de Factura que usa el resumen
+_COLUMNAS_RESUMEN = {'saldo_pendiente', 'estado', 'fecha_emision', 'id_propietario'}
+
+
+def _limites(corte):
+    """Clave del tramo -> (desde, hasta) en fecha_emision: desde <= fecha < hasta (None = abierto)"""
+    limites = {}
+    for clave, _, dias_desde, dias_hasta in TRAMOS:
+        hasta = inicio_dia(corte - timedelta(days=dias_desde - 1))
+        desde = inicio_dia(corte - timedelta(days=dias_hasta)) if dias_hasta is not None else None
+        limites[clave] = (desde, hasta)
+    return limites
+
+
+def _en_tramo(desde, hasta):
+    condiciones = [Factura.fecha_emision < hasta]
+    if desde is not None:
+        condiciones.append(Factura.fecha_emision >= desde)
+    return db.and_(*condiciones)
+
+
+def tramo_de(fecha_emision, corte=None):
+    """Etiqueta del tramo de una factura emitida en `fecha_emision`"""
+    dias = ((corte or date.today()) - fecha_emision.date()).days
+    for _, etiqueta, _, dias_hasta in TRAMOS:
+        if dias_hasta is None or dias <= dias_hasta:
+            return etiqueta
+
+
+# ============================================
+# RESUMEN POR PROPIETARIO
+# ============================================
+
+def consulta_resumen(corte=None, minimo=0, tramo=None):
+    """
+    SELECT agrupado por propietario: (id_propietario, nombre, documento,
+    telefono, un saldo por tramo, total, num_facturas, mas_antigua).
+    `tramo`: solo propietarios con saldo en ese tramo (clave de TRAMOS).
+    """
+    corte = corte or date.today()
+    saldo = Factura.saldo_pendiente
+    por_tramo = {
+        clave: db.func.sum(db.case((_en_tramo(desde, hasta), saldo), else_=0)).label(clave)
+        for clave, (desde, hasta) in _limites(corte).items()
+    }
+    total = db.func.sum(saldo)
+
+    agrupado = db.select(
+        Factura.id_propietario, *por_tramo.values(), total.label('total'),
+        db.func.count().label('num_facturas'), db.func.min(Factura.fecha_emision).label('mas_antigua')
+    ).where(
+        Factura.con_saldo(), Factura.fecha_emision < inicio_dia(corte + timedelta(days=1))
+    ).group_by(Factura.id_propietario).having(total > minimo)
+    if tramo:
+        agrupado = agrupado.having(por_tramo[tramo] > 0)
+    agrupado = agrupado.subquery()
+
+    return db.select(
+        agrupado.c.id_propietario, Propietario.nombre, Propietario.documento, Propietario.telefono,
+        *[agrupado.c[clave] for clave, *_ in TRAMOS],
+        agrupado.c.total, agrupado.c.num_facturas, agrupado.c.mas_antigua
+    ).join(
+        Propietario, Propietario.id_propietario == agrupado.c.id_propietario
+    ).order_by(agrupado.c.total.desc())
+
+
+def calcular(corte=None):
+    """Resumen de antigüedad de saldos (serializable a JSON)"""
+    corte = corte or date.today()
+    deudores = []
+    totales = {clave: 0.0 for clave, *_ in TRAMOS}
+    totales['total'] = 0.0
+
+    for fila in db.session.execute(consulta_resumen(corte)):
+        deudor = {
+            'id_propietario': fila.id_propietario,
+            'nombre': fila.nombre,
+            'documento': fila.documento,
+            'telefono': fila.telefono,
+            'num_facturas': fila.num_facturas,
+            'mas_antigua': fila.mas_antigua.strftime('%Y-%m-%d') if fila.mas_antigua else None
+        }
+        for clave in list(totales):
+            deudor[clave] = float(getattr(fila, clave) or 0)
+            totales[clave] += deudor[clave]
+        deudores.append(deudor)
+
+    return {
+        'corte': corte.isoformat(),
+        'calculado': datetime.now().strftime('%d/%m/%Y %H:%M'),
+        'tramos': [{'clave': clave, 'etiqueta': etiqueta} for clave, etiqueta, *_ in TRAMOS],
+        'totales': {clave: round(valor, 2) for clave, valor in totales.items()},
+        'deudores': deudores
+    }
+
+
+def resumen(corte=None, actualizar=False):
+    """Resumen del día desde la caché (se recalcula si `actualizar`)"""
+    corte = corte or date.today()
+    clave = f'{corte.isoformat()}:{cache.version(VERSION_SALDOS)}'
+    datos = None if actualizar else cache_antiguedad.get(clave)
+    if datos is None:
+        datos = calcular(corte)
+        # Vale por el día: vence a medianoche
+        vence = datetime.combine(date.today() + timedelta(days=1), datetime.min.time()) - datetime.now()
+        cache_antiguedad.set(clave, datos, ttl=max(vence.total_seconds(), 60))
+    return datos
+
+
+@bus.suscriptor('Factura', asincrono=True)
+def _invalidar_resumen(cambios):
+    """Los pagos, anulaciones y facturas nuevas cambian el resumen en todos los procesos"""
+    if any(c.operacion != c.ACTUALIZADO or _COLUMNAS_RESUMEN & c.columnas for c in cambios):
+        cache.incrementar_version(VERSION_SALDOS)
+
+
+@cola.tarea('cobranza.antiguedad', max_concurrencia=1, reintentos=0)
+def tarea_antiguedad():
+    """Recalcula el resumen de antigüedad del día (tarea en segundo plano)"""
+    datos = resumen(actualizar=True)
+    return {'deudores': len(datos['deudores']), 'total': datos['totales']['total']}
+
+
+# ============================================
+# DETALLE
+# ============================================
+
+def consulta_detalle(id_propietario=None, corte=None, tramo=None):
+    """
+    SELECT de las facturas con saldo (de un propietario y/o de un tramo),
+    de la más antigua a la más reciente.
+    """
+    corte = corte or date.today()
+    consulta = db.select(
+        Factura.id_factura, Factura.numero_factura, Factura.fecha_emision, Factura.id_propietario,
+        Propietario.nombre, Factura.total, Factura.monto_pagado, Factura.saldo_pendiente, Factura.estado
+    ).join(
+        Propietario, Propietario.id_propietario == Factura.id_propietario
+    ).where(
+        Factura.con_saldo(), Factura.fecha_emision < inicio_dia(corte + timedelta(days=1))
+    )
+    if id_propietario is not None:
+        consulta = consulta.where(Factura.id_propietario == id_propietario)
+    if tramo:
+        consulta = consulta.where(_en_tramo(*_limites(corte)[tramo]))
+    return consulta.order_by(Factura.fecha_emision, Factura.id_factura)
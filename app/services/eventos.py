@@ -0,0 +1,257 @@
+"""
+Servicio de Eventos de Dominio
+Publica los cambios de los modelos después de cada commit.
+
+Los cambios se recogen en cada flush (entidad, id, columnas modificadas y
+sus nuevos valores), se agrupan por transacción y, solo si el commit se
+confirma, se entregan a los suscriptores de esa entidad en un único lote.
+Los UPDATE masivos (query.update o Core) no pasan por el flush: quien los
+ejecuta registra el cambio con `registrar` para que se publique igual.
+
+Uso:
+    @bus.suscriptor('Consulta', 'Factura')
+    def invalidar(cambios):
+        ...
+
+    @bus.suscriptor('CalendarioVacunacion', asincrono=True)
+    def notificar(cambios):
+        ...
+
+Los suscriptores síncronos se ejecutan dentro del after_commit y no deben
+usar la sesión; los asíncronos se ejecutan en orden en un hilo aparte, con
+su propio contexto de aplicación y su propia sesión.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlalchemy as sa
+
+from app.services.replica import SesionEnrutada
+
+# Claves en session.info: cambios pendientes de la transacción y copias
+# tomadas al abrir cada savepoint (para restaurarlas si se deshace)
+_CLAVE_PENDIENTES = 'eventos_pendientes'
+_CLAVE_SAVEPOINTS = 'eventos_savepoints'
+
+
+class CambioEntidad:
+    """Cambio de una fila confirmado en la base de datos"""
+
+    CREADO = 'creado'
+    ACTUALIZADO = 'actualizado'
+    ELIMINADO = 'eliminado'
+
+    __slots__ = ('entidad', 'id', 'operacion', 'valores')
+
+    def __init__(self, entidad, id, operacion, valores):
+        self.entidad = entidad
+        self.id = id  # None en los cambios masivos (varias filas, p. ej. una campaña)
+        self.operacion = operacion
+        self.valores = valores  # {columna: nuevo valor} de las columnas modificadas
+
+    def __repr__(self):
+        return f'<CambioEntidad {self.entidad} {self.id} {self.operacion} {sorted(self.valores)}>'
+
+    @property
+    def columnas(self):
+        """Nombres de las columnas modificadas"""
+        return set(self.valores)
+
+    def combinar(self, posterior):
+        """Acumula un cambio posterior de la misma fila en la misma transacción"""
+        if posterior.operacion == self.ELIMINADO:
+            self.operacion = self.ELIMINADO
+        self.valores.update(posterior.valores)
+
+    def to_dict(self):
+        """Convierte el objeto a diccionario"""
+        return {
+            'entidad': self.entidad,
+            'id': self.id,
+            'operacion': self.operacion,
+            'columnas': sorted(self.valores)
+        }
+
+
+class Suscriptor:
+    """Función suscrita a los cambios de una o varias entidades"""
+
+    def __init__(self, funcion, entidades, asincrono=False):
+        self.funcion = funcion
+        self.entidades = set(entidades)
+        self.asincrono = asincrono
+
+
+class BusEventos:
+    """Bus de eventos de dominio alimentado por los eventos de sesión de SQLAlchemy"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.suscriptores = []
+        self._entidades = set()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Asocia el bus a la aplicación"""
+        self.app = app
+        app.extensions['eventos'] = self
+
+    def suscriptor(self, *entidades, asincrono=False):
+        """Decorador que suscribe una función a los cambios de las entidades indicadas"""
+        def decorador(funcion):
+            self.suscriptores.append(Suscriptor(funcion, entidades, asincrono))
+            self._entidades.update(entidades)
+            return funcion
+        return decorador
+
+    def observa(self, entidad):
+        """Indica si alguna función está suscrita a la entidad"""
+        return entidad in self._entidades
+
+    # ============================================
+    # ENTREGA
+    # ============================================
+
+    def despachar(self, cambios):
+        """Entrega un lote de cambios confirmados a los suscriptores"""
+        for suscriptor in self.suscriptores:
+            propios = [c for c in cambios if c.entidad in suscriptor.entidades]
+            if not propios:
+                continue
+            if not suscriptor.asincrono:
+                self._ejecutar(suscriptor, propios)
+            elif self.app is None or self.app.config.get('TASKS_EAGER'):
+                self._ejecutar_en_contexto(suscriptor, propios)
+            else:
+                self._obtener_executor().submit(self._ejecutar_en_contexto, suscriptor, propios)
+
+    def _ejecutar(self, suscriptor, cambios):
+        try:
+            suscriptor.funcion(cambios)
+        except Exception:
+            if self.app is not None:
+                self.app.logger.exception('Suscriptor de eventos %s falló', suscriptor.funcion.__name__)
+
+    def _ejecutar_en_contexto(self, suscriptor, cambios):
+        """Ejecuta con un contexto de aplicación (y por tanto una sesión) propio"""
+        if self.app is None:
+            return self._ejecutar(suscriptor, cambios)
+        with self.app.app_context():
+            self._ejecutar(suscriptor, cambios)
+
+    def _obtener_executor(self):
+        """Un solo hilo por proceso: los lotes se entregan en el orden de los commits"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='vetcare-eventos')
+                    self._pid = os.getpid()
+        return self._executor
+
+
+# Instancia única del bus
+bus = BusEventos()
+
+
+# ============================================
+# EVENTOS DE SESIÓN
+# ============================================
+
+def _identificador(estado):
+    identidad = tuple(estado.mapper.primary_key_from_instance(estado.obj()))
+    return identidad[0] if len(identidad) == 1 else identidad
+
+
+def _copiar(pendientes):
+    return {clave: CambioEntidad(c.entidad, c.id, c.operacion, dict(c.valores))
+            for clave, c in pendientes.items()}
+
+
+def _cambio(objeto, operacion):
+    estado = sa.inspect(objeto)
+    entidad = type(objeto).__name__
+    if not bus.observa(entidad):
+        return None
+
+    valores = {}
+    for atributo in estado.mapper.column_attrs:
+        clave = atributo.key
+        if operacion == CambioEntidad.CREADO:
+            valores[clave] = estado.dict.get(clave)
+        elif operacion == CambioEntidad.ACTUALIZADO:
+            historial = estado.attrs[clave].history
+            if historial.added or historial.deleted:
+                valores[clave] = historial.added[0] if historial.added else None
+
+    if operacion == CambioEntidad.ACTUALIZADO and not valores:
+        return None  # Solo cambiaron relaciones
+    return CambioEntidad(entidad, _identificador(estado), operacion, valores)
+
+
+def _acumular(pendientes, cambio):
+    clave = (cambio.entidad, cambio.id)
+    anterior = pendientes.get(clave)
+    if anterior is None:
+        pendientes[clave] = cambio
+    elif anterior.operacion == CambioEntidad.CREADO and cambio.operacion == CambioEntidad.ELIMINADO:
+        del pendientes[clave]  # Creado y eliminado en la misma transacción
+    else:
+        anterior.combinar(cambio)
+
+
+def registrar(cambio, sesion=None):
+    """
+    Agrega a la transacción actual un cambio hecho sin el ORM (UPDATE de
+    Core); se publica con los demás si el commit se confirma.
+    """
+    if not bus.observa(cambio.entidad):
+        return
+    if sesion is None:
+        from app import db
+        sesion = db.session
+    _acumular(sesion.info.setdefault(_CLAVE_PENDIENTES, {}), cambio)
+
+
+@sa.event.listens_for(SesionEnrutada, 'after_flush')
+def _registrar_cambios(sesion, flush_context):
+    pendientes = sesion.info.setdefault(_CLAVE_PENDIENTES, {})
+
+    for objetos, operacion in ((sesion.new, CambioEntidad.CREADO),
+                               (sesion.dirty, CambioEntidad.ACTUALIZADO),
+                               (sesion.deleted, CambioEntidad.ELIMINADO)):
+        for objeto in objetos:
+            cambio = _cambio(objeto, operacion)
+            if cambio is not None:
+                _acumular(pendientes, cambio)
+
+
+@sa.event.listens_for(SesionEnrutada, 'after_transaction_create')
+def _abrir_savepoint(sesion, transaccion):
+    if transaccion.nested:
+        sesion.info.setdefault(_CLAVE_SAVEPOINTS, {})[transaccion] = \
+            _copiar(sesion.info.get(_CLAVE_PENDIENTES, {}))
+
+
+@sa.event.listens_for(SesionEnrutada, 'after_commit')
+def _publicar_cambios(sesion):
+    sesion.info.pop(_CLAVE_SAVEPOINTS, None)
+    pendientes = sesion.info.pop(_CLAVE_PENDIENTES, None)
+    if pendientes:
+        bus.despachar(list(pendientes.values()))
+
+
+@sa.event.listens_for(SesionEnrutada, 'after_soft_rollback')
+def _descartar_cambios(sesion, transaccion_anterior):
+    if transaccion_anterior.nested:
+        # Solo se pierde lo registrado dentro del savepoint
+        copia = sesion.info.get(_CLAVE_SAVEPOINTS, {}).pop(transaccion_anterior, None)
+        if copia is not None:
+            sesion.info[_CLAVE_PENDIENTES] = copia
+    elif transaccion_anterior.parent is None:
+        sesion.info.pop(_CLAVE_PENDIENTES, None)
+        sesion.info.pop(_CLAVE_SAVEPOINTS, None)
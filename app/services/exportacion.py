@@ -0,0 +1,74 @@
+"""
+Servicio de Exportación
+Generación de archivos CSV en streaming (memoria constante)
+"""
+import csv
+import io
+
+from flask import Response, stream_with_context
+from werkzeug.utils import secure_filename
+
+from app.services.replica import lectura_replica
+
+# Filas escritas por cada fragmento enviado al navegador
+FILAS_POR_FRAGMENTO = 500
+
+# Filas leídas por viaje al servidor de base de datos (cursor del lado del servidor)
+FILAS_POR_LOTE = 1000
+
+
+def _formatear(valor):
+    if valor is None:
+        return ''
+    if hasattr(valor, 'strftime'):
+        return valor.isoformat(sep=' ') if hasattr(valor, 'hour') else valor.isoformat()
+    return valor
+
+
+def generar_csv(encabezados, filas):
+    """Generador que produce el CSV por fragmentos (con BOM para que Excel detecte UTF-8)"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+
+    buffer.write('\ufeff')
+    escritor.writerow(encabezados)
+
+    for numero, fila in enumerate(filas, start=1):
+        escritor.writerow([_formatear(valor) for valor in fila])
+        if numero % FILAS_POR_FRAGMENTO == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue()
+
+
+def respuesta_csv(nombre_archivo, encabezados, consulta):
+    """
+    Respuesta HTTP que transmite el resultado de una consulta SELECT como CSV.
+    La consulta se ejecuta con yield_per para no cargar todas las filas en memoria
+    y, si hay réplica configurada, se envía a la réplica de lectura.
+    """
+    from app import db
+
+    def filas():
+        with lectura_replica():
+            resultado = db.session.execute(consulta.execution_options(yield_per=FILAS_POR_LOTE))
+        try:
+            for fila in resultado:
+                yield fila
+        finally:
+            resultado.close()
+
+    return respuesta_filas_csv(nombre_archivo, encabezados, filas())
+
+
+def respuesta_filas_csv(nombre_archivo, encabezados, filas):
+    """Respuesta HTTP que transmite como CSV las filas de un iterable"""
+    # El nombre va entre comillas en la cabecera: sin comillas ni saltos de línea
+    nombre_archivo = secure_filename(nombre_archivo) or 'exportacion.csv'
+    return Response(
+        stream_with_context(generar_csv(encabezados, filas)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{nombre_archivo}"'}
+    )
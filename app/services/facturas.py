@@ -0,0 +1,178 @@
+"""
+Servicio de Facturas
+Registro de pagos y verificación del resumen persistido de cada factura.
+
+Pagos: cada pago se inserta en la tabla pagos (no se modifican ni se
+borran) y descuenta el saldo de la factura con un UPDATE condicionado al
+saldo leído. Si otro cajero registró un pago entre la lectura y el UPDATE,
+no cambia ninguna fila y se vuelve a leer: dos pagos simultáneos nunca se
+pisan. El UPDATE no pasa por el ORM, así que el cambio de la factura se
+registra en el bus de eventos con eventos.registrar.
+
+Resumen: num_items y saldo_pendiente los mantienen las rutas de facturación
+al agregar o quitar items (con la fila de la factura bloqueada, ver
+Factura.bloquear) y al registrar pagos. La verificación compara, con
+una sola consulta, cada factura con el valor esperado (conteo de sus
+detalles, suma de sus pagos, total - pagado o cero si está anulada) y
+repara las diferencias por lotes.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from app import db
+from app.models.factura import CENTIMO, Factura, DetalleFactura, Pago
+from app.services import eventos
+from app.services.tareas import cola
+
+TAMAÑO_LOTE = 500
+TOLERANCIA = Decimal('0.005')  # Diferencias de redondeo por debajo del céntimo
+INTENTOS_PAGO = 5
+ESTADOS_POR_COBRAR = (Factura.ESTADO_PENDIENTE, Factura.ESTADO_PARCIAL)
+
+
+class PagoRechazado(ValueError):
+    """El pago no se puede registrar (el mensaje es apto para mostrar)"""
+
+
+# ============================================
+# PAGOS
+# ============================================
+
+def _decimal(valor):
+    return Decimal(str(valor or 0)).quantize(CENTIMO)
+
+
+def registrar_pago(id_factura, monto, metodo_pago, id_usuario=None):
+    """
+    Registra un pago de la factura y confirma la transacción.
+    Si el monto supera el saldo, se aplica solo el saldo.
+    Retorna el Pago registrado; lanza PagoRechazado si no se puede pagar.
+    """
+    monto = _decimal(monto)
+    if monto <= 0:
+        raise PagoRechazado('El monto debe ser mayor a cero.')
+    if metodo_pago not in Factura.METODOS_PAGO:
+        raise PagoRechazado('Método de pago inválido.')
+
+    F = Factura.__table__
+    for _ in range(INTENTOS_PAGO):
+        fila = db.session.execute(
+            db.select(F.c.estado, F.c.saldo_pendiente, F.c.monto_pagado).where(F.c.id_factura == id_factura)
+        ).first()
+        if fila is None:
+            raise PagoRechazado('La factura no existe.')
+        if fila.estado not in ESTADOS_POR_COBRAR:
+            raise PagoRechazado(f'No se puede pagar una factura en estado {fila.estado}.')
+        saldo = _decimal(fila.saldo_pendiente)
+        if saldo <= 0:
+            raise PagoRechazado('La factura no tiene saldo pendiente.')
+
+        aplicado = min(monto, saldo)
+        ahora = datetime.now()
+        valores = {
+            'saldo_pendiente': saldo - aplicado,
+            'estado': Factura.ESTADO_PAGADA if aplicado == saldo else Factura.ESTADO_PARCIAL,
+            'metodo_pago': metodo_pago,
+            'fecha_pago': ahora
+        }
+        cambiadas = db.session.execute(
+            F.update().where(
+                F.c.id_factura == id_factura,
+                F.c.estado.in_(ESTADOS_POR_COBRAR),
+                F.c.saldo_pendiente == saldo  # Nadie pagó desde la lectura
+            ).values(monto_pagado=db.func.coalesce(F.c.monto_pagado, 0) + aplicado, **valores)
+        ).rowcount
+        if not cambiadas:
+            db.session.rollback()
+            continue
+
+        pago = Pago(id_factura=id_factura, monto=aplicado, metodo_pago=metodo_pago,
+                    fecha_pago=ahora, id_usuario_registro=id_usuario)
+        db.session.add(pago)
+        valores['monto_pagado'] = _decimal(fila.monto_pagado) + aplicado
+        eventos.registrar(eventos.CambioEntidad('Factura', id_factura, eventos.CambioEntidad.ACTUALIZADO, valores))
+        db.session.commit()
+        return pago
+
+    raise PagoRechazado('La factura se modificó mientras se registraba el pago. Intente de nuevo.')
+
+
+# ============================================
+# VERIFICACIÓN DEL RESUMEN
+# ============================================
+
+def resumen_esperado(con_pagos=True):
+    """
+    {columna: expresión} con el valor correcto de cada columna del resumen.
+    `con_pagos`: monto_pagado sale de la tabla pagos (si no, se da por correcto).
+    """
+    F = Factura.__table__
+    D = DetalleFactura.__table__
+    P = Pago.__table__
+    esperado = {
+        'num_items': db.select(db.func.count()).where(D.c.id_factura == F.c.id_factura).scalar_subquery()
+    }
+    pagado = db.func.coalesce(F.c.monto_pagado, 0)
+    if con_pagos:
+        pagado = db.select(db.func.coalesce(db.func.sum(P.c.monto), 0))\
+            .where(P.c.id_factura == F.c.id_factura).scalar_subquery()
+        esperado['monto_pagado'] = _importe(pagado)
+    esperado['saldo_pendiente'] = _importe(db.case(
+        (F.c.estado == Factura.ESTADO_ANULADA, 0),
+        else_=db.func.coalesce(F.c.total, 0) - pagado
+    ))
+    return esperado
+
+
+def _importe(expresion):
+    """Importe redondeado al céntimo y leído como Decimal (SQLite calcula en coma flotante)"""
+    return db.type_coerce(db.func.round(expresion, 2), db.Numeric(10, 2))
+
+
+def desviaciones():
+    """
+    Facturas cuyo resumen no coincide: (id, número, items, items esperados,
+    pagado, pagado esperado, saldo, saldo esperado)
+    """
+    F = Factura.__table__
+    esperado = resumen_esperado()
+
+    def distinto(columna):
+        return db.func.abs(db.func.coalesce(F.c[columna], 0) - esperado[columna]) > TOLERANCIA
+
+    return db.session.execute(
+        db.select(
+            F.c.id_factura, F.c.numero_factura,
+            F.c.num_items, esperado['num_items'].label('num_items_esperado'),
+            F.c.monto_pagado, esperado['monto_pagado'].label('pagado_esperado'),
+            F.c.saldo_pendiente, esperado['saldo_pendiente'].label('saldo_esperado')
+        ).where(db.or_(
+            F.c.num_items != esperado['num_items'],
+            distinto('monto_pagado'),
+            distinto('saldo_pendiente')
+        )).order_by(F.c.id_factura)
+    ).all()
+
+
+def verificar(reparar=False):
+    """
+    Busca las facturas con el resumen desviado y, si `reparar`, las corrige.
+    Retorna la lista de desviaciones encontradas.
+    """
+    encontradas = desviaciones()
+    if reparar and encontradas:
+        F = Factura.__table__
+        ids = [fila.id_factura for fila in encontradas]
+        for inicio in range(0, len(ids), TAMAÑO_LOTE):
+            with db.engine.begin() as conexion:
+                conexion.execute(
+                    F.update().where(F.c.id_factura.in_(ids[inicio:inicio + TAMAÑO_LOTE]))
+                    .values(resumen_esperado())
+                )
+    return encontradas
+
+
+@cola.tarea('facturas.verificar_resumen', max_concurrencia=1, reintentos=0)
+def tarea_verificar():
+    """Verifica y repara el resumen de las facturas (tarea en segundo plano)"""
+    return len(verificar(reparar=True))
@@ -0,0 +1,198 @@
+"""
+Servicio de Historial Clínico
+Línea de tiempo de una mascota: consultas, tratamientos, vacunaciones y
+facturas en un único flujo ordenado del más reciente al más antiguo.
+
+Se lee por ventanas con paginación por clave (keyset): cada ventana pide a
+cada tipo como máximo `limite` filas anteriores al cursor (solo las columnas
+que se muestran, con los nombres en el mismo JOIN), las mezcla por fecha y
+devuelve el cursor del último evento. El costo de cada ventana no depende de
+cuánto historial se haya cargado antes.
+
+Consultas, tratamientos y vacunaciones se leen también de las tablas de
+archivo (ver app/models/archivo.py), con el mismo filtro en cada parte.
+
+Cursor: '<fecha ISO>_<tipo>_<id>' del último evento recibido.
+"""
+from datetime import date, datetime, time
+
+from app import db
+from app.models.archivo import tablas
+from app.models.calendario_vacunacion import CalendarioVacunacion
+from app.models.consulta import Consulta
+from app.models.factura import Factura
+from app.models.tratamiento import Tratamiento
+from app.models.vacuna import Vacuna
+from app.models.veterinario import Veterinario
+
+# Orden entre eventos con la misma fecha (mayor = aparece antes)
+TIPOS = ('factura', 'vacunacion', 'tratamiento', 'consulta')
+_RANGO = {tipo: i for i, tipo in enumerate(TIPOS)}
+
+LIMITE = 20
+MAX_LIMITE = 100
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no tiene el formato esperado"""
+
+
+def _a_datetime(valor):
+    if isinstance(valor, datetime):
+        return valor
+    return datetime.combine(valor, time.min)
+
+
+def leer_cursor(texto):
+    """Convierte el cursor de la petición en (fecha, rango, id)"""
+    try:
+        fecha, tipo, id_ = texto.rsplit('_', 2)
+        return datetime.fromisoformat(fecha), _RANGO[tipo], int(id_)
+    except (ValueError, KeyError):
+        raise CursorInvalido(texto)
+
+
+def _cursor(evento):
+    return f"{evento['fecha']}_{evento['tipo']}_{evento['id']}"
+
+
+def _anteriores(columna_fecha, columna_id, tipo, cursor, solo_fecha=False):
+    """
+    Condición SQL "evento anterior al cursor" en el orden
+    (fecha desc, rango del tipo desc, id desc).
+    """
+    if cursor is None:
+        return db.true()
+    fecha, rango, id_ = cursor
+    propio = _RANGO[tipo]
+
+    if solo_fecha:
+        # Columna DATE: la fecha del evento es la medianoche de ese día
+        dia = fecha.date()
+        if fecha.time() != time.min:
+            return columna_fecha <= dia
+        menor = columna_fecha < dia
+    else:
+        menor = columna_fecha < fecha
+        dia = fecha
+
+    if propio < rango:
+        return db.or_(menor, columna_fecha == dia)
+    if propio == rango:
+        return db.or_(menor, db.and_(columna_fecha == dia, columna_id < id_))
+    return menor
+
+
+# ============================================
+# CONSULTAS POR TIPO
+# ============================================
+
+def _unir(partes, orden, limite):
+    """Une las consultas en uso y archivadas y toma las primeras `limite` en `orden`"""
+    union = db.union_all(*partes).subquery()
+    return db.session.execute(
+        db.select(union).order_by(*[union.c[columna].desc() for columna in orden]).limit(limite)
+    )
+
+
+def _consultas(id_mascota, cursor, limite):
+    def parte(C):
+        return db.select(
+            C.c.id_consulta, C.c.fecha_hora, C.c.motivo, C.c.diagnostico,
+            C.c.estado, C.c.peso_actual, C.c.temperatura, Veterinario.nombre.label('veterinario')
+        ).join(Veterinario, C.c.id_veterinario == Veterinario.id_veterinario)\
+         .where(C.c.id_mascota == id_mascota,
+                _anteriores(C.c.fecha_hora, C.c.id_consulta, 'consulta', cursor))
+
+    filas = _unir([parte(C) for C in tablas(Consulta)], ('fecha_hora', 'id_consulta'), limite)
+    for id_, fecha, motivo, diagnostico, estado, peso, temperatura, veterinario in filas:
+        yield {
+            'tipo': 'consulta', 'id': id_, 'fecha': fecha, 'estado': estado,
+            'titulo': motivo, 'detalle': diagnostico, 'veterinario': veterinario,
+            'peso': float(peso) if peso is not None else None,
+            'temperatura': float(temperatura) if temperatura is not None else None
+        }
+
+
+def _tratamientos(id_mascota, cursor, limite):
+    # Se ubican en la fecha de su consulta (archivados junto con ella)
+    def parte(T, C):
+        return db.select(
+            T.c.id_tratamiento, C.c.fecha_hora, C.c.id_consulta, T.c.descripcion,
+            T.c.medicamento, T.c.dosis, T.c.duracion_dias, T.c.estado
+        ).join(C, T.c.id_consulta == C.c.id_consulta)\
+         .where(C.c.id_mascota == id_mascota,
+                _anteriores(C.c.fecha_hora, T.c.id_tratamiento, 'tratamiento', cursor))
+
+    filas = _unir([parte(T, C) for T, C in zip(tablas(Tratamiento), tablas(Consulta))],
+                  ('fecha_hora', 'id_tratamiento'), limite)
+    for id_, fecha, id_consulta, descripcion, medicamento, dosis, duracion, estado in filas:
+        yield {
+            'tipo': 'tratamiento', 'id': id_, 'fecha': fecha, 'estado': estado,
+            'titulo': descripcion, 'consulta_id': id_consulta,
+            'detalle': ', '.join(p for p in (medicamento, dosis, f'{duracion} días' if duracion else None) if p)
+        }
+
+
+def _vacunaciones(id_mascota, cursor, limite):
+    def parte(C):
+        return db.select(
+            C.c.id_calendario, C.c.fecha_programada, C.c.fecha_aplicacion, C.c.estado, C.c.dosis_numero,
+            C.c.lote_vacuna, Vacuna.nombre.label('vacuna')
+        ).join(Vacuna, C.c.id_vacuna == Vacuna.id_vacuna)\
+         .where(C.c.id_mascota == id_mascota,
+                _anteriores(C.c.fecha_programada, C.c.id_calendario, 'vacunacion', cursor, solo_fecha=True))
+
+    filas = _unir([parte(C) for C in tablas(CalendarioVacunacion)], ('fecha_programada', 'id_calendario'), limite)
+    for id_, programada, aplicada, estado, dosis, lote, vacuna in filas:
+        yield {
+            'tipo': 'vacunacion', 'id': id_, 'fecha': _a_datetime(programada), 'estado': estado,
+            'titulo': f'{vacuna} (dosis {dosis})',
+            'detalle': f"Aplicada el {aplicada.strftime('%d/%m/%Y')}" + (f' - Lote {lote}' if lote else '')
+                       if aplicada else None
+        }
+
+
+def _facturas(id_mascota, cursor, limite):
+    filas = db.session.query(
+        Factura.id_factura, Factura.fecha_emision, Factura.numero_factura, Factura.total, Factura.estado
+    ).filter(Factura.id_mascota == id_mascota,
+             _anteriores(Factura.fecha_emision, Factura.id_factura, 'factura', cursor))\
+     .order_by(Factura.fecha_emision.desc(), Factura.id_factura.desc())\
+     .limit(limite)
+    for id_, fecha, numero, total, estado in filas:
+        yield {
+            'tipo': 'factura', 'id': id_, 'fecha': fecha, 'estado': estado,
+            'titulo': f'Factura {numero}', 'total': float(total or 0), 'detalle': None
+        }
+
+
+_LECTORES = {
+    'consulta': _consultas,
+    'tratamiento': _tratamientos,
+    'vacunacion': _vacunaciones,
+    'factura': _facturas
+}
+
+
+def ventana(id_mascota, antes=None, limite=LIMITE, tipos=TIPOS):
+    """
+    Eventos de la mascota anteriores al cursor `antes` (None = los más
+    recientes). Retorna {'eventos': [...], 'siguiente': cursor o None}.
+    """
+    cursor = leer_cursor(antes) if antes else None
+    limite = max(1, min(limite, MAX_LIMITE))
+
+    eventos = []
+    for tipo in tipos:
+        eventos.extend(_LECTORES[tipo](id_mascota, cursor, limite + 1))
+    eventos.sort(key=lambda e: (e['fecha'], _RANGO[e['tipo']], e['id']), reverse=True)
+
+    hay_mas = len(eventos) > limite
+    eventos = eventos[:limite]
+    for evento in eventos:
+        evento['fecha'] = evento['fecha'].isoformat()
+    return {
+        'eventos': eventos,
+        'siguiente': _cursor(eventos[-1]) if hay_mas else None
+    }
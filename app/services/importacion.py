@@ -0,0 +1,260 @@
+"""
+Servicio de Importación
+Carga masiva de propietarios y mascotas desde CSV.
+
+El archivo se lee en streaming y se procesa por lotes: cada lote se valida
+en memoria (documentos y especies precargados en diccionarios, sin una
+consulta por fila) y se inserta con un único executemany por transacción.
+Si la base de datos rechaza el lote, se reintenta fila por fila para
+insertar las válidas y reportar la línea de las que fallan.
+
+Los archivos subidos desde la web se guardan en la tabla
+archivos_importacion hasta que la tarea los procesa.
+
+Columnas de propietarios:
+    nombre, documento, telefono, email, direccion
+Columnas de mascotas:
+    documento_propietario, nombre, especie, raza, sexo, fecha_nacimiento, peso, color, observaciones
+"""
+import csv
+import io
+from datetime import datetime
+
+from app import db
+from app.services.tareas import cola
+
+TAMAÑO_LOTE = 2000
+
+# Errores que se conservan en el resultado (el resto solo se cuenta)
+MAX_ERRORES = 1000
+
+TIPOS = ('propietarios', 'mascotas')
+
+
+class ResultadoImportacion:
+    """Resumen de una importación"""
+
+    def __init__(self, tipo):
+        self.tipo = tipo
+        self.total = 0
+        self.insertados = 0
+        self.num_errores = 0
+        self.errores = []  # [linea, valor, mensaje]
+
+    def agregar_error(self, linea, valor, mensaje):
+        self.num_errores += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append([linea, valor, mensaje])
+
+    def to_dict(self):
+        """Convierte el resultado a diccionario"""
+        return {
+            'tipo': self.tipo,
+            'total': self.total,
+            'insertados': self.insertados,
+            'num_errores': self.num_errores,
+            'errores': self.errores
+        }
+
+
+def _texto(fila, campo, maximo):
+    valor = (fila.get(campo) or '').strip()
+    if len(valor) > maximo:
+        raise ValueError(f'El campo {campo} supera {maximo} caracteres.')
+    return valor
+
+
+def _lotes(lector, tamaño):
+    lote = []
+    # La línea 1 es la cabecera
+    for linea, fila in enumerate(lector, start=2):
+        lote.append((linea, fila))
+        if len(lote) >= tamaño:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+# ============================================
+# PROPIETARIOS
+# ============================================
+
+def importar_propietarios(archivo, tamaño_lote=TAMAÑO_LOTE):
+    """Importa propietarios desde un archivo de texto CSV abierto"""
+    from app.models.propietario import Propietario
+
+    resultado = ResultadoImportacion('propietarios')
+    documentos = {doc for (doc,) in db.session.query(Propietario.documento)}
+    tabla = Propietario.__table__
+
+    for lote in _lotes(csv.DictReader(archivo), tamaño_lote):
+        validas = []
+        for linea, fila in lote:
+            resultado.total += 1
+            try:
+                nombre = _texto(fila, 'nombre', 100)
+                documento = _texto(fila, 'documento', 20)
+                telefono = _texto(fila, 'telefono', 20)
+                email = _texto(fila, 'email', 100)
+                direccion = _texto(fila, 'direccion', 200)
+            except ValueError as e:
+                resultado.agregar_error(linea, fila.get('documento'), str(e))
+                continue
+
+            if not nombre:
+                resultado.agregar_error(linea, documento, 'El nombre es requerido.')
+            elif not documento:
+                resultado.agregar_error(linea, documento, 'El documento es requerido.')
+            elif not telefono:
+                resultado.agregar_error(linea, documento, 'El teléfono es requerido.')
+            elif documento in documentos:
+                resultado.agregar_error(linea, documento, 'Ya existe un propietario con este documento.')
+            else:
+                documentos.add(documento)
+                validas.append((linea, documento, {
+                    'nombre': nombre,
+                    'documento': documento,
+                    'telefono': telefono,
+                    'email': email or None,
+                    'direccion': direccion or None,
+                    'fecha_registro': datetime.utcnow(),
+                    'activo': True
+                }))
+
+        _insertar_lote(tabla, validas, resultado)
+
+    return resultado
+
+
+# ============================================
+# MASCOTAS
+# ============================================
+
+def importar_mascotas(archivo, tamaño_lote=TAMAÑO_LOTE):
+    """Importa mascotas desde un archivo de texto CSV abierto"""
+    from app.models.propietario import Propietario
+    from app.models.especie import Especie
+    from app.models.mascota import Mascota
+
+    resultado = ResultadoImportacion('mascotas')
+    propietarios = dict(db.session.query(Propietario.documento, Propietario.id_propietario))
+    especies = {nombre.strip().lower(): id_especie
+                for nombre, id_especie in db.session.query(Especie.nombre, Especie.id_especie)}
+    tabla = Mascota.__table__
+
+    for lote in _lotes(csv.DictReader(archivo), tamaño_lote):
+        validas = []
+        for linea, fila in lote:
+            resultado.total += 1
+            try:
+                documento = _texto(fila, 'documento_propietario', 20)
+                nombre = _texto(fila, 'nombre', 50)
+                especie = _texto(fila, 'especie', 50)
+                raza = _texto(fila, 'raza', 50)
+                sexo = _texto(fila, 'sexo', 1).upper()
+                color = _texto(fila, 'color', 30)
+                fecha_nacimiento = _texto(fila, 'fecha_nacimiento', 10)
+                peso = _texto(fila, 'peso', 10)
+
+                if not nombre:
+                    raise ValueError('El nombre es requerido.')
+                if documento not in propietarios:
+                    raise ValueError('No existe un propietario con este documento.')
+                if especie.lower() not in especies:
+                    raise ValueError(f'Especie desconocida: {especie or "(vacía)"}.')
+                if sexo and sexo not in ('M', 'H'):
+                    raise ValueError('El sexo debe ser M o H.')
+
+                fecha = datetime.strptime(fecha_nacimiento, '%Y-%m-%d').date() if fecha_nacimiento else None
+                peso = float(peso.replace(',', '.')) if peso else None
+            except ValueError as e:
+                resultado.agregar_error(linea, fila.get('nombre'), str(e))
+                continue
+
+            validas.append((linea, nombre, {
+                'id_propietario': propietarios[documento],
+                'id_especie': especies[especie.lower()],
+                'nombre': nombre,
+                'raza': raza or None,
+                'fecha_nacimiento': fecha,
+                'sexo': sexo or None,
+                'peso': peso,
+                'color': color or None,
+                'observaciones': (fila.get('observaciones') or '').strip() or None,
+                'activo': True
+            }))
+
+        _insertar_lote(tabla, validas, resultado)
+
+    return resultado
+
+
+def _insertar_lote(tabla, filas, resultado):
+    """
+    Inserta un lote de filas (linea, valor, datos) con executemany en su
+    propia transacción. Si la base de datos lo rechaza (p. ej. un valor fuera
+    de rango), se reintenta fila por fila, cada una en un savepoint.
+    """
+    if not filas:
+        return
+    try:
+        db.session.execute(tabla.insert(), [datos for _, _, datos in filas])
+        db.session.commit()
+        resultado.insertados += len(filas)
+        return
+    except Exception:
+        db.session.rollback()
+
+    for linea, valor, datos in filas:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(tabla.insert(), datos)
+            resultado.insertados += 1
+        except Exception as e:
+            resultado.agregar_error(linea, valor, f'Error al insertar: {getattr(e, "orig", e)}')
+    db.session.commit()
+
+
+def importar(tipo, archivo, tamaño_lote=TAMAÑO_LOTE):
+    """Importa un archivo del tipo indicado ('propietarios' o 'mascotas')"""
+    if tipo == 'propietarios':
+        return importar_propietarios(archivo, tamaño_lote)
+    if tipo == 'mascotas':
+        return importar_mascotas(archivo, tamaño_lote)
+    raise ValueError(f'Tipo de importación desconocido: {tipo}')
+
+
+def escribir_errores(errores, destino):
+    """Escribe el reporte de errores ([linea, valor, mensaje]) en formato CSV"""
+    escritor = csv.writer(destino)
+    escritor.writerow(['Línea', 'Valor', 'Error'])
+    escritor.writerows(errores)
+
+
+def guardar_archivo(tipo, nombre, contenido):
+    """Guarda un CSV subido (bytes) para importarlo en segundo plano; retorna su id"""
+    from app.models.importacion import ArchivoImportacion
+
+    archivo = ArchivoImportacion(tipo=tipo, nombre=nombre, contenido=contenido)
+    db.session.add(archivo)
+    db.session.commit()
+    return archivo.id_archivo
+
+
+@cola.tarea('importacion.csv', max_concurrencia=1, reintentos=0)
+def importar_archivo(id_archivo):
+    """Tarea: importa un CSV guardado con guardar_archivo y luego lo elimina"""
+    from app.models.importacion import ArchivoImportacion
+
+    archivo = db.session.get(ArchivoImportacion, id_archivo)
+    if archivo is None:
+        raise ValueError(f'No existe el archivo de importación {id_archivo}.')
+    tipo, contenido = archivo.tipo, archivo.contenido
+    db.session.expunge(archivo)
+    try:
+        with io.TextIOWrapper(io.BytesIO(contenido), encoding='utf-8-sig', newline='') as texto:
+            return importar(tipo, texto).to_dict()
+    finally:
+        ArchivoImportacion.query.filter_by(id_archivo=id_archivo).delete()
+        db.session.commit()
@@ -0,0 +1,574 @@
+"""
+Servicio de Instantáneas para Reportes
+Copia de las tablas históricas (consultas, tratamientos, facturas,
+detalles_factura y calendario_vacunacion) en archivos por columnas,
+particionados por mes, para que los reportes pesados se calculen sin
+consultar la base de datos.
+
+Cada partición es el directorio <SNAPSHOT_DIR>/<tabla>/<AAAA-MM>/ con una
+versión por exportación (v<marca>/) que contiene meta.json y un archivo
+<columna>.col con los valores de la columna en binario (array):
+    - entero: int32 (nulo = 0)
+    - decimal: double (nulo = NaN)
+    - fecha: int32, ordinal del día (nulo = 0)
+    - fecha_hora: int64, segundos desde 0001-01-01 (nulo = 0)
+    - texto: int32, posición del valor en el diccionario de meta.json
+      (cada texto distinto se guarda una sola vez)
+El archivo `actual` de la partición indica la versión vigente: la
+exportación escribe la versión nueva completa y luego reemplaza `actual`,
+de modo que quien lee nunca ve una partición a medio escribir.
+
+Las columnas se leen con mmap (sin copiarlas en memoria y solo las que se
+usan). Las consultas, tratamientos y vacunaciones archivadas se incluyen
+(unión con las tablas de archivo).
+
+La exportación (`flask instantaneas exportar`, p. ej. cada noche) vuelve a
+escribir los meses desde hace SNAPSHOT_REFRESH_MONTHS y los que aún no
+tienen partición; con --completo, todos.
+"""
+import json
+import math
+import mmap
+import os
+import shutil
+import sys
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from itertools import compress, islice
+
+from flask import current_app
+
+from app import db
+from app.models.archivo import ARCHIVOS
+from app.models.calendario_vacunacion import CalendarioVacunacion
+from app.models.consulta import Consulta
+from app.models.factura import DetalleFactura, Factura
+from app.models.fechas import en_rango, inicio_dia
+from app.models.mascota import Mascota
+from app.models.servicio import Servicio
+from app.models.tratamiento import Tratamiento
+from app.services.replica import lectura_replica
+from app.services.tareas import cola
+
+# Filas leídas por viaje al servidor y filas por lote al leer una instantánea
+FILAS_POR_LOTE = 5000
+
+# Tipo de columna -> código de array
+TIPOS = {
+    'entero': 'i',
+    'decimal': 'd',
+    'fecha': 'i',
+    'fecha_hora': 'q',
+    'texto': 'i',
+}
+
+_SEGUNDOS_DIA = 86400
+
+
+# ============================================
+# CODIFICACIÓN
+# ============================================
+
+def _entero(valor):
+    return int(valor) if valor is not None else 0
+
+
+def _decimal(valor):
+    return float(valor) if valor is not None else math.nan
+
+
+def _fecha(valor):
+    return valor.toordinal() if valor is not None else 0
+
+
+def _fecha_hora(valor):
+    if valor is None:
+        return 0
+    if not isinstance(valor, datetime):
+        valor = inicio_dia(valor)
+    return valor.toordinal() * _SEGUNDOS_DIA + valor.hour * 3600 + valor.minute * 60 + valor.second
+
+
+def _leer_fecha_hora(valor):
+    if not valor:
+        return None
+    dias, segundos = divmod(valor, _SEGUNDOS_DIA)
+    return datetime.fromordinal(dias) + timedelta(seconds=segundos)
+
+
+_CODIFICAR = {'entero': _entero, 'decimal': _decimal, 'fecha': _fecha, 'fecha_hora': _fecha_hora}
+
+
+# ============================================
+# TABLAS EXPORTADAS
+# ============================================
+
+class TablaInstantanea:
+    """Tabla exportada: columnas (nombre, tipo), columna que define el mes y su SELECT"""
+
+    def __init__(self, nombre, columnas, columna_fecha, consulta, fechas):
+        self.nombre = nombre
+        self.columnas = columnas
+        self.columna_fecha = columna_fecha
+        self.consulta = consulta  # (desde, hasta) -> SELECT de las columnas en ese orden
+        self.fechas = fechas      # Columnas indexadas de las que sale el rango de meses
+
+
+def _consultas(desde, hasta):
+    defecto = current_app.config.get('CONSULTA_DURACION_MINUTOS', 30)
+
+    def seleccionar(c):
+        return db.select(
+            c.c.id_consulta, c.c.id_mascota, Mascota.id_especie, c.c.id_veterinario, c.c.id_servicio,
+            db.func.coalesce(Servicio.duracion_minutos, defecto), c.c.fecha_hora, c.c.fecha,
+            c.c.estado, c.c.costo
+        ).outerjoin(Mascota, Mascota.id_mascota == c.c.id_mascota)\
+         .outerjoin(Servicio, Servicio.id_servicio == c.c.id_servicio)\
+         .where(en_rango(c.c.fecha_hora, inicio_dia(desde), inicio_dia(hasta)))
+
+    return db.union_all(seleccionar(Consulta.__table__), seleccionar(ARCHIVOS['consultas']))
+
+
+def _tratamientos(desde, hasta):
+    def seleccionar(t, c):
+        return db.select(
+            t.c.id_tratamiento, t.c.id_consulta, c.c.fecha_hora, t.c.descripcion, t.c.medicamento,
+            t.c.duracion_dias, t.c.costo, t.c.estado
+        ).join(c, c.c.id_consulta == t.c.id_consulta)\
+         .where(en_rango(c.c.fecha_hora, inicio_dia(desde), inicio_dia(hasta)))
+
+    return db.union_all(seleccionar(Tratamiento.__table__, Consulta.__table__),
+                        seleccionar(ARCHIVOS['tratamientos'], ARCHIVOS['consultas']))
+
+
+def _facturas(desde, hasta):
+    F = Factura
+    return db.select(
+        F.id_factura, F.id_propietario, F.id_mascota, F.id_consulta, F.fecha_emision, F.estado,
+        F.metodo_pago, F.subtotal, F.descuento, F.igv, F.total, F.monto_pagado, F.saldo_pendiente,
+        F.num_items
+    ).where(en_rango(F.fecha_emision, inicio_dia(desde), inicio_dia(hasta)))
+
+
+def _detalles_factura(desde, hasta):
+    D = DetalleFactura
+    return db.select(
+        D.id_detalle, D.id_factura, Factura.fecha_emision, D.id_servicio, D.descripcion, D.cantidad,
+        D.precio_unitario, D.descuento, D.subtotal
+    ).join(Factura, Factura.id_factura == D.id_factura)\
+     .where(en_rango(Factura.fecha_emision, inicio_dia(desde), inicio_dia(hasta)))
+
+
+def _calendario_vacunacion(desde, hasta):
+    def seleccionar(v):
+        return db.select(
+            v.c.id_calendario, v.c.id_mascota, v.c.id_vacuna, v.c.id_veterinario, v.c.fecha_programada,
+            v.c.fecha_aplicacion, v.c.fecha_proxima, v.c.dosis_numero, v.c.estado
+        ).where(en_rango(v.c.fecha_programada, desde, hasta))
+
+    return db.union_all(seleccionar(CalendarioVacunacion.__table__),
+                        seleccionar(ARCHIVOS['calendario_vacunacion']))
+
+
+TABLAS = {t.nombre: t for t in (
+    TablaInstantanea('consultas', (
+        ('id_consulta', 'entero'), ('id_mascota', 'entero'), ('id_especie', 'entero'),
+        ('id_veterinario', 'entero'), ('id_servicio', 'entero'), ('duracion_minutos', 'entero'),
+        ('fecha_hora', 'fecha_hora'), ('fecha', 'fecha'), ('estado', 'texto'), ('costo', 'decimal'),
+    ), 'fecha_hora', _consultas,
+        (Consulta.fecha_hora, ARCHIVOS['consultas'].c.fecha_hora)),
+    TablaInstantanea('tratamientos', (
+        ('id_tratamiento', 'entero'), ('id_consulta', 'entero'), ('fecha_consulta', 'fecha_hora'),
+        ('descripcion', 'texto'), ('medicamento', 'texto'), ('duracion_dias', 'entero'),
+        ('costo', 'decimal'), ('estado', 'texto'),
+    ), 'fecha_consulta', _tratamientos,
+        (Consulta.fecha_hora, ARCHIVOS['consultas'].c.fecha_hora)),
+    TablaInstantanea('facturas', (
+        ('id_factura', 'entero'), ('id_propietario', 'entero'), ('id_mascota', 'entero'),
+        ('id_consulta', 'entero'), ('fecha_emision', 'fecha_hora'), ('estado', 'texto'),
+        ('metodo_pago', 'texto'), ('subtotal', 'decimal'), ('descuento', 'decimal'), ('igv', 'decimal'),
+        ('total', 'decimal'), ('monto_pagado', 'decimal'), ('saldo_pendiente', 'decimal'),
+        ('num_items', 'entero'),
+    ), 'fecha_emision', _facturas,
+        (Factura.fecha_emision,)),
+    TablaInstantanea('detalles_factura', (
+        ('id_detalle', 'entero'), ('id_factura', 'entero'), ('fecha_emision', 'fecha_hora'),
+        ('id_servicio', 'entero'), ('descripcion', 'texto'), ('cantidad', 'entero'),
+        ('precio_unitario', 'decimal'), ('descuento', 'decimal'), ('subtotal', 'decimal'),
+    ), 'fecha_emision', _detalles_factura,
+        (Factura.fecha_emision,)),
+    TablaInstantanea('calendario_vacunacion', (
+        ('id_calendario', 'entero'), ('id_mascota', 'entero'), ('id_vacuna', 'entero'),
+        ('id_veterinario', 'entero'), ('fecha_programada', 'fecha'), ('fecha_aplicacion', 'fecha'),
+        ('fecha_proxima', 'fecha'), ('dosis_numero', 'entero'), ('estado', 'texto'),
+    ), 'fecha_programada', _calendario_vacunacion,
+        (CalendarioVacunacion.fecha_programada, ARCHIVOS['calendario_vacunacion'].c.fecha_programada)),
+)}
+
+
+# ============================================
+# PARTICIONES
+# ============================================
+
+def _directorio(*partes):
+    return os.path.join(current_app.config['SNAPSHOT_DIR'], *partes)
+
+
+def _mes_siguiente(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def _meses(desde, hasta):
+    """Primer día de cada mes desde el mes de `desde` hasta el de `hasta` (ambos incluidos)"""
+    mes = date(desde.year, desde.month, 1)
+    while mes <= hasta:
+        yield mes
+        mes = _mes_siguiente(mes)
+
+
+def _version_actual(nombre_tabla, mes):
+    try:
+        with open(_directorio(nombre_tabla, f'{mes:%Y-%m}', 'actual'), encoding='utf-8') as archivo:
+            return archivo.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def particiones(nombre_tabla):
+    """Meses con partición vigente de la tabla (date del primer día), ordenados"""
+    try:
+        nombres = os.listdir(_directorio(nombre_tabla))
+    except FileNotFoundError:
+        return []
+    meses = []
+    for nombre in nombres:
+        try:
+            mes = datetime.strptime(nombre, '%Y-%m').date()
+        except ValueError:
+            continue
+        if _version_actual(nombre_tabla, mes):
+            meses.append(mes)
+    return sorted(meses)
+
+
+class Particion:
+    """Partición mensual abierta: columnas leídas con mmap"""
+
+    def __init__(self, ruta, meta):
+        self.ruta = ruta
+        self.meta = meta
+        self.mes = datetime.strptime(meta['mes'], '%Y-%m').date()
+        self.filas = meta['filas']
+        self.tipos = dict(meta['columnas'])
+        self._mapas = []
+        self._columnas = {}
+
+    def columna(self, nombre):
+        """Valores codificados de la columna (memoryview del tipo de TIPOS, sin copia)"""
+        vista = self._columnas.get(nombre)
+        if vista is None:
+            codigo = TIPOS[self.tipos[nombre]]
+            if not self.filas:
+                vista = memoryview(array(codigo))  # mmap no admite archivos vacíos
+            else:
+                with open(os.path.join(self.ruta, f'{nombre}.col'), 'rb') as archivo:
+                    mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+                self._mapas.append(mapa)
+                vista = memoryview(mapa).cast(codigo)
+            self._columnas[nombre] = vista
+        return vista
+
+    def decodificar(self, nombre, valor):
+        """Valor original de un valor codificado de la columna"""
+        tipo = self.tipos[nombre]
+        if tipo == 'texto':
+            return self.meta['diccionarios'][nombre][valor]
+        if tipo == 'decimal':
+            return None if math.isnan(valor) else valor
+        if tipo == 'fecha':
+            return date.fromordinal(valor) if valor else None
+        if tipo == 'fecha_hora':
+            return _leer_fecha_hora(valor)
+        return valor
+
+    def valores(self, nombre):
+        """Iterador de los valores originales de la columna"""
+        tipo = self.tipos[nombre]
+        vista = self.columna(nombre)
+        if tipo == 'texto':
+            return map(self.meta['diccionarios'][nombre].__getitem__, vista)
+        if tipo == 'entero':
+            return iter(vista)
+        return (self.decodificar(nombre, valor) for valor in vista)
+
+    def codificar(self, nombre, valor):
+        """Valor codificado de `valor` en la columna (None si un texto no aparece)"""
+        tipo = self.tipos[nombre]
+        if tipo == 'texto':
+            diccionario = self.meta['diccionarios'][nombre]
+            return diccionario.index(valor) if valor in diccionario else None
+        return _CODIFICAR[tipo](valor)
+
+    def seleccion(self, columna_fecha, desde=None, hasta=None, **iguales):
+        """
+        Filas con `columna_fecha` en [desde, hasta) y cada columna de `iguales`
+        con ese valor: lista de booleanos, o None si son todas.
+        """
+        mascaras = []
+        fin_mes = _mes_siguiente(self.mes)
+        if (desde is not None and _momento(desde) > inicio_dia(self.mes)) or \
+                (hasta is not None and _momento(hasta) < inicio_dia(fin_mes)):
+            minimo = self.codificar(columna_fecha, desde if desde is not None else self.mes)
+            maximo = self.codificar(columna_fecha, hasta if hasta is not None else fin_mes)
+            mascaras.append([minimo <= v < maximo for v in self.columna(columna_fecha)])
+        for nombre, valor in iguales.items():
+            codigo = self.codificar(nombre, valor)
+            if codigo is None:
+                return [False] * self.filas
+            mascaras.append([v == codigo for v in self.columna(nombre)])
+
+        if not mascaras:
+            return None
+        if len(mascaras) == 1:
+            return mascaras[0]
+        return list(map(all, zip(*mascaras)))
+
+    def cerrar(self):
+        for vista in self._columnas.values():
+            vista.release()
+        self._columnas.clear()
+        for mapa in self._mapas:
+            try:
+                mapa.close()
+            except BufferError:  # Aún hay vistas en uso: se cierra al liberarlas
+                pass
+        self._mapas.clear()
+
+
+def _abrir_particion(nombre_tabla, mes):
+    version = _version_actual(nombre_tabla, mes)
+    if version is None:
+        return None
+    ruta = _directorio(nombre_tabla, f'{mes:%Y-%m}', version)
+    with open(os.path.join(ruta, 'meta.json'), encoding='utf-8') as archivo:
+        meta = json.load(archivo)
+    if meta['orden_bytes'] != sys.byteorder:
+        raise ValueError(f'La instantánea {ruta} se generó en otra arquitectura; vuelva a exportarla.')
+    return Particion(ruta, meta)
+
+
+# ============================================
+# LECTURA
+# ============================================
+
+@contextmanager
+def abrir(nombre_tabla, desde=None, hasta=None):
+    """Particiones de la tabla que se cruzan con [desde, hasta); se cierran al salir"""
+    abiertas = []
+    try:
+        for mes in particiones(nombre_tabla):
+            if (desde is not None and _mes_siguiente(mes) <= _dia(desde)) or \
+                    (hasta is not None and mes >= _dia_final(hasta)):
+                continue
+            particion = _abrir_particion(nombre_tabla, mes)
+            if particion is not None:
+                abiertas.append(particion)
+        yield abiertas
+    finally:
+        for particion in abiertas:
+            particion.cerrar()
+
+
+def _momento(valor):
+    return valor if isinstance(valor, datetime) else inicio_dia(valor)
+
+
+def _dia(valor):
+    return valor.date() if isinstance(valor, datetime) else valor
+
+
+def _dia_final(hasta):
+    """Primer día que queda fuera de [.., hasta)"""
+    if isinstance(hasta, datetime) and hasta != inicio_dia(hasta):
+        return hasta.date() + timedelta(days=1)
+    return _dia(hasta)
+
+
+def cubre(nombre_tabla, desde, hasta):
+    """Indica si todos los meses de [desde, hasta) tienen partición"""
+    existentes = set(particiones(nombre_tabla))
+    ultimo = _dia_final(hasta) - timedelta(days=1)
+    return all(mes in existentes for mes in _meses(_dia(desde), ultimo))
+
+
+def contar(nombre_tabla, columna, desde=None, hasta=None, **iguales):
+    """Counter de los valores de `columna` en las filas elegidas (ver Particion.seleccion)"""
+    tabla = TABLAS[nombre_tabla]
+    total = Counter()
+    with abrir(nombre_tabla, desde, hasta) as abiertas:
+        for particion in abiertas:
+            mascara = particion.seleccion(tabla.columna_fecha, desde, hasta, **iguales)
+            codigos = particion.columna(columna)
+            cuenta = Counter(codigos if mascara is None else compress(codigos, mascara))
+            for codigo, cantidad in cuenta.items():
+                total[particion.decodificar(columna, codigo)] += cantidad
+    return total
+
+
+def lotes(nombre_tabla, columnas, desde=None, hasta=None, **iguales):
+    """Filas elegidas (tuplas con los valores de `columnas`) en listas de FILAS_POR_LOTE"""
+    tabla = TABLAS[nombre_tabla]
+    with abrir(nombre_tabla, desde, hasta) as abiertas:
+        for particion in abiertas:
+            filas = zip(*[particion.valores(c) for c in columnas])
+            mascara = particion.seleccion(tabla.columna_fecha, desde, hasta, **iguales)
+            if mascara is not None:
+                filas = compress(filas, mascara)
+            while True:
+                lote = list(islice(filas, FILAS_POR_LOTE))
+                if not lote:
+                    break
+                yield lote
+
+
+def estado():
+    """Resumen de cada tabla: meses, filas, primer y último mes, última exportación"""
+    resumen = {}
+    for nombre in TABLAS:
+        meses = particiones(nombre)
+        filas = 0
+        generado = None
+        for mes in meses:
+            particion = _abrir_particion(nombre, mes)
+            if particion is None:
+                continue
+            filas += particion.filas
+            generado = max(generado or '', particion.meta['generado'])
+        resumen[nombre] = {
+            'meses': len(meses),
+            'filas': filas,
+            'desde': meses[0].strftime('%Y-%m') if meses else None,
+            'hasta': meses[-1].strftime('%Y-%m') if meses else None,
+            'generado': generado
+        }
+    return resumen
+
+
+def generado(nombre_tabla, desde=None, hasta=None):
+    """Fecha de la exportación más antigua entre las particiones de [desde, hasta) (texto)"""
+    with abrir(nombre_tabla, desde, hasta) as abiertas:
+        fechas = [p.meta['generado'] for p in abiertas]
+    return min(fechas) if fechas else None
+
+
+# ============================================
+# EXPORTACIÓN
+# ============================================
+
+def _escribir(tabla, mes, lotes_filas):
+    """Escribe una versión nueva de la partición y la deja vigente; retorna las filas escritas"""
+    directorio = _directorio(tabla.nombre, f'{mes:%Y-%m}')
+    version = f'v{datetime.now():%Y%m%d%H%M%S%f}'
+    ruta = os.path.join(directorio, version)
+    os.makedirs(ruta)
+
+    columnas = [array(TIPOS[tipo]) for _, tipo in tabla.columnas]
+    diccionarios = {nombre: {} for nombre, tipo in tabla.columnas if tipo == 'texto'}
+    codificadores = [
+        (lambda valor, d=diccionarios[nombre]: d.setdefault(valor, len(d))) if tipo == 'texto'
+        else _CODIFICAR[tipo]
+        for nombre, tipo in tabla.columnas
+    ]
+    filas = 0
+    for lote in lotes_filas:
+        for fila in lote:
+            for columna, codificar, valor in zip(columnas, codificadores, fila):
+                columna.append(codificar(valor))
+        filas += len(lote)
+
+    for (nombre, _), columna in zip(tabla.columnas, columnas):
+        with open(os.path.join(ruta, f'{nombre}.col'), 'wb') as archivo:
+            columna.tofile(archivo)
+    meta = {
+        'tabla': tabla.nombre,
+        'mes': f'{mes:%Y-%m}',
+        'filas': filas,
+        'generado': datetime.now().strftime('%Y-%m-%d %H:%M'),
+        'orden_bytes': sys.byteorder,
+        'columnas': [list(c) for c in tabla.columnas],
+        'diccionarios': {nombre: list(valores) for nombre, valores in diccionarios.items()}
+    }
+    with open(os.path.join(ruta, 'meta.json'), 'w', encoding='utf-8') as archivo:
+        json.dump(meta, archivo, ensure_ascii=False)
+
+    # Cambio de versión en un paso (reemplazo atómico del archivo `actual`)
+    temporal = os.path.join(directorio, f'actual.{os.getpid()}')
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        archivo.write(version)
+    os.replace(temporal, os.path.join(directorio, 'actual'))
+
+    # Se conserva la versión anterior (puede estar abriéndose) y se borran las demás
+    versiones = sorted(v for v in os.listdir(directorio) if v.startswith('v') and v != version)
+    for vieja in versiones[:-1]:
+        shutil.rmtree(os.path.join(directorio, vieja), ignore_errors=True)
+    return filas
+
+
+def _lotes_bd(consulta):
+    conexion = db.session.connection(bind_arguments={'clause': consulta})
+    resultado = conexion.execute(consulta.execution_options(yield_per=FILAS_POR_LOTE))
+    try:
+        yield from resultado.partitions()
+    finally:
+        resultado.close()
+
+
+def _rango_datos(tabla):
+    """(primer, último) día con datos de la tabla, o None si está vacía"""
+    primero = ultimo = None
+    for columna in tabla.fechas:
+        minimo, maximo = db.session.execute(db.select(db.func.min(columna), db.func.max(columna))).one()
+        if minimo is not None:
+            primero = min(primero or _dia(minimo), _dia(minimo))
+            ultimo = max(ultimo or _dia(maximo), _dia(maximo))
+    return (primero, ultimo) if primero is not None else None
+
+
+def exportar(tablas=None, completo=False, salida=None):
+    """
+    Exporta las tablas (todas por defecto): los meses recientes, los que no
+    tienen partición y, si `completo`, todos. Retorna {tabla: {'meses', 'filas'}}.
+    """
+    salida = salida or (lambda texto: None)
+    recientes = current_app.config.get('SNAPSHOT_REFRESH_MONTHS', 2)
+    hoy = date.today()
+    limite = date(hoy.year, hoy.month, 1)
+    for _ in range(max(recientes, 1) - 1):
+        limite = date(limite.year - (limite.month == 1), (limite.month - 2) % 12 + 1, 1)
+
+    resultado = {}
+    with lectura_replica(consistencia='eventual'):
+        for nombre in tablas or TABLAS:
+            tabla = TABLAS[nombre]
+            resultado[nombre] = {'meses': 0, 'filas': 0}
+            rango = _rango_datos(tabla)
+            if rango is None:
+                continue
+            existentes = set(particiones(nombre))
+            for mes in _meses(*rango):
+                if not (completo or mes >= limite or mes not in existentes):
+                    continue
+                filas = _escribir(tabla, mes, _lotes_bd(tabla.consulta(mes, _mes_siguiente(mes))))
+                db.session.rollback()  # Termina la transacción de lectura entre meses
+                resultado[nombre]['meses'] += 1
+                resultado[nombre]['filas'] += filas
+                salida(f'  {nombre} {mes:%Y-%m}: {filas} filas')
+    return resultado
+
+
+@cola.tarea('instantaneas.exportar', max_concurrencia=1, reintentos=1)
+def tarea_exportar(completo=False):
+    """Exporta las instantáneas de los reportes (tarea en segundo plano)"""
+    return exportar(completo=completo)
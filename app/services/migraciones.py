@@ -0,0 +1,315 @@
+"""
+Servicio de Migraciones
+Aplica en orden los scripts de app/migraciones/ (vNNN_descripcion.py) que
+aún no figuran en la tabla schema_migraciones.
+
+Cada script define `actualizar(op)` y cambia el esquema con las operaciones
+de `Operaciones`, que revisan el esquema antes de cada cambio: un script
+interrumpido se puede repetir sin error. Una base vacía se crea directamente
+desde los modelos y se marca al día.
+
+Los rellenos de datos (backfills) se registran en el script con
+`op.rellenar(...)` y se ejecutan después del DDL por lotes de clave primaria,
+cada lote en su propia transacción corta y con una pausa entre lotes. El
+avance queda en la tabla backfills: un relleno interrumpido continúa desde
+el último lote confirmado.
+"""
+import importlib
+import pkgutil
+import re
+import time
+from datetime import datetime
+
+import sqlalchemy as sa
+from flask import current_app
+
+from app import db
+from app.models.migracion import MigracionAplicada, ProgresoBackfill
+
+PAQUETE = 'app.migraciones'
+_NOMBRE = re.compile(r'^v(\d{3})_(\w+)$')
+
+
+class Migracion:
+    """Script de migración disponible"""
+
+    def __init__(self, version, nombre, modulo):
+        self.version = version
+        self.nombre = nombre
+        self.modulo = modulo
+
+    @property
+    def descripcion(self):
+        """Primera línea del docstring del script"""
+        documentacion = importlib.import_module(self.modulo).__doc__ or ''
+        return documentacion.strip().split('\n')[0]
+
+    def __repr__(self):
+        return f'<Migracion {self.version:03d} {self.nombre}>'
+
+
+def disponibles():
+    """Scripts de app/migraciones ordenados por versión"""
+    paquete = importlib.import_module(PAQUETE)
+    migraciones = []
+    for info in pkgutil.iter_modules(paquete.__path__):
+        coincidencia = _NOMBRE.match(info.name)
+        if coincidencia:
+            migraciones.append(Migracion(int(coincidencia.group(1)), coincidencia.group(2),
+                                         f'{PAQUETE}.{info.name}'))
+    migraciones.sort(key=lambda m: m.version)
+    return migraciones
+
+
+def _tablas_control():
+    for modelo in (MigracionAplicada, ProgresoBackfill):
+        modelo.__table__.create(db.engine, checkfirst=True)
+
+
+def aplicadas():
+    """Versión -> MigracionAplicada"""
+    _tablas_control()
+    return {m.version: m for m in MigracionAplicada.query.all()}
+
+
+def pendientes():
+    hechas = aplicadas()
+    return [m for m in disponibles() if m.version not in hechas]
+
+
+def _marcar(migracion, duracion_ms=None):
+    db.session.add(MigracionAplicada(version=migracion.version, nombre=migracion.nombre,
+                                     duracion_ms=duracion_ms))
+    db.session.commit()
+
+
+def _base_vacia():
+    control = {MigracionAplicada.__tablename__, ProgresoBackfill.__tablename__}
+    return not (set(sa.inspect(db.engine).get_table_names()) - control)
+
+
+# ============================================
+# OPERACIONES DE ESQUEMA
+# ============================================
+
+class Operaciones:
+    """Cambios de esquema idempotentes disponibles para los scripts"""
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.dialecto = conexion.dialect.name
+        self.rellenos = []
+
+    def _inspector(self):
+        return sa.inspect(self.conexion)
+
+    def existe_tabla(self, tabla):
+        return self._inspector().has_table(tabla)
+
+    def existe_columna(self, tabla, columna):
+        return any(c['name'] == columna for c in self._inspector().get_columns(tabla))
+
+    def _indice(self, tabla, nombre):
+        for indice in self._inspector().get_indexes(tabla):
+            if indice['name'] == nombre:
+                return indice
+        return None
+
+    def sql(self, texto, dialecto=None):
+        """Ejecuta SQL literal (opcionalmente solo en un dialecto: 'mssql', 'sqlite')"""
+        if dialecto is None or dialecto == self.dialecto:
+            self.conexion.exec_driver_sql(texto)
+
+    def crear_tabla(self, modelo):
+        """Crea la tabla del modelo o Table (con sus índices) si no existe"""
+        getattr(modelo, '__table__', modelo).create(self.conexion, checkfirst=True)
+
+    def agregar_columna(self, tabla, columna):
+        """Agrega `columna` (db.Column sin tabla) si no existe"""
+        if self.existe_columna(tabla, columna.name):
+            return
+        if self.dialecto == 'sqlite' and columna.computed is not None and columna.computed.persisted:
+            # SQLite solo permite agregar columnas calculadas virtuales
+            columna = sa.Column(columna.name, columna.type,
+                                sa.Computed(columna.computed.sqltext, persisted=False))
+        sa.Table(tabla, sa.MetaData(), columna)
+        definicion = sa.schema.CreateColumn(columna).compile(dialect=self.conexion.dialect)
+        self.conexion.exec_driver_sql(f'ALTER TABLE {self._nombre(tabla)} ADD {definicion}')
+
+    def crear_indice(self, nombre, tabla, columnas, incluir=None, donde=None):
+        """
+        Crea el índice, o lo reconstruye si existe con otras columnas.
+        `incluir`: columnas de cobertura (INCLUDE, solo SQL Server).
+        `donde`: condición SQL de un índice filtrado (parcial en SQLite).
+        """
+        incluir = list(incluir or [])
+        existente = self._indice(tabla, nombre)
+        if existente is not None:
+            incluidas = existente.get('dialect_options', {}).get('mssql_include') or []
+            if existente['column_names'] == list(columnas) and \
+                    (self.dialecto != 'mssql' or list(incluidas) == incluir):
+                return
+
+        tabla_ddl = sa.Table(tabla, sa.MetaData(),
+                             *[sa.Column(c, sa.types.NullType()) for c in dict.fromkeys(list(columnas) + incluir)])
+        filtro = sa.text(donde) if donde else None
+        indice = sa.Index(nombre, *[tabla_ddl.c[c] for c in columnas], mssql_include=incluir,
+                          mssql_where=filtro, sqlite_where=filtro)
+        sentencia = str(sa.schema.CreateIndex(indice).compile(dialect=self.conexion.dialect))
+
+        if existente is not None and self.dialecto == 'mssql':
+            # Reemplazo en un paso: la tabla nunca queda sin el índice
+            sentencia += ' WITH (DROP_EXISTING = ON)'
+        elif existente is not None:
+            self.eliminar_indice(nombre, tabla)
+        self.conexion.exec_driver_sql(sentencia)
+
+    def eliminar_indice(self, nombre, tabla):
+        """Elimina el índice si existe"""
+        if self._indice(tabla, nombre) is None:
+            return
+        if self.dialecto == 'mssql':
+            self.conexion.exec_driver_sql(f'DROP INDEX {self._nombre(nombre)} ON {self._nombre(tabla)}')
+        else:
+            self.conexion.exec_driver_sql(f'DROP INDEX {self._nombre(nombre)}')
+
+    def agregar_clave_foranea(self, nombre, tabla, columnas, tabla_referida, columnas_referidas):
+        """Agrega la clave foránea de `tabla` sobre `columnas` si no existe"""
+        if self.dialecto == 'sqlite':
+            # SQLite no permite agregar restricciones a una tabla existente
+            return
+        for clave in self._inspector().get_foreign_keys(tabla):
+            if clave['constrained_columns'] == list(columnas):
+                return
+        self.conexion.exec_driver_sql(
+            f'ALTER TABLE {self._nombre(tabla)} ADD CONSTRAINT {self._nombre(nombre)} '
+            f'FOREIGN KEY ({", ".join(map(self._nombre, columnas))}) '
+            f'REFERENCES {self._nombre(tabla_referida)} ({", ".join(map(self._nombre, columnas_referidas))})'
+        )
+
+    def eliminar_clave_foranea(self, tabla, columnas):
+        """Elimina la clave foránea de `tabla` sobre `columnas` si existe"""
+        for clave in self._inspector().get_foreign_keys(tabla):
+            if clave['constrained_columns'] != list(columnas):
+                continue
+            if self.dialecto == 'sqlite' or not clave.get('name'):
+                # SQLite no permite quitar restricciones sin recrear la tabla
+                # (y no las aplica salvo con PRAGMA foreign_keys)
+                return
+            self.conexion.exec_driver_sql(
+                f'ALTER TABLE {self._nombre(tabla)} DROP CONSTRAINT {self._nombre(clave["name"])}'
+            )
+
+    def rellenar(self, nombre, tabla, valores, condicion=None):
+        """Registra un relleno por lotes a ejecutar al terminar el DDL (ver `rellenar`)"""
+        self.rellenos.append((nombre, tabla, valores, condicion))
+
+    def _nombre(self, identificador):
+        return self.conexion.dialect.identifier_preparer.quote(identificador)
+
+
+# ============================================
+# EJECUCIÓN
+# ============================================
+
+def actualizar(hasta=None, salida=None):
+    """
+    Aplica las migraciones pendientes (hasta la versión `hasta`).
+    Retorna la lista de migraciones aplicadas.
+    """
+    salida = salida or (lambda texto: None)
+    faltantes = [m for m in pendientes() if hasta is None or m.version <= hasta]
+    if not faltantes:
+        return []
+
+    if hasta is None and _base_vacia():
+        # Base nueva: el esquema de los modelos ya incluye todas las migraciones
+        db.create_all()
+        for migracion in faltantes:
+            _marcar(migracion)
+        salida(f'Esquema creado desde los modelos ({len(faltantes)} migraciones marcadas).')
+        return faltantes
+
+    for migracion in faltantes:
+        salida(f'Aplicando {migracion.version:03d} {migracion.nombre}...')
+        inicio = time.perf_counter()
+        with db.engine.begin() as conexion:
+            op = Operaciones(conexion)
+            importlib.import_module(migracion.modulo).actualizar(op)
+        for nombre, tabla, valores, condicion in op.rellenos:
+            filas = rellenar(nombre, tabla, valores, condicion)
+            salida(f'  Relleno {nombre}: {filas} filas.')
+        _marcar(migracion, int((time.perf_counter() - inicio) * 1000))
+    return faltantes
+
+
+def marcar_hasta(version):
+    """Marca como aplicadas (sin ejecutarlas) las migraciones hasta `version`"""
+    marcadas = [m for m in pendientes() if m.version <= version]
+    for migracion in marcadas:
+        _marcar(migracion)
+    return marcadas
+
+
+# ============================================
+# RELLENOS POR LOTES
+# ============================================
+
+def rellenar(nombre, tabla, valores, condicion=None, tamaño_lote=None, pausa=None):
+    """
+    Actualiza `tabla` (modelo o Table) con `valores` ({columna: expresión})
+    por lotes de clave primaria, una transacción por lote.
+    `condicion`: filtro adicional (p. ej. columna IS NULL).
+    Continúa desde el último lote confirmado si se interrumpió antes.
+    Retorna las filas actualizadas en total.
+    """
+    _tablas_control()
+    config = current_app.config
+    tamaño_lote = tamaño_lote or config.get('MIGRATIONS_BACKFILL_BATCH', 5000)
+    pausa = config.get('MIGRATIONS_BACKFILL_PAUSE', 0.1) if pausa is None else pausa
+
+    tabla = getattr(tabla, '__table__', tabla)
+    clave = list(tabla.primary_key.columns)[0]
+    condiciones = [condicion] if condicion is not None else []
+    progreso = ProgresoBackfill.__table__
+
+    with db.engine.begin() as conexion:
+        fila = conexion.execute(sa.select(progreso).where(progreso.c.nombre == nombre)).first()
+        if fila is None:
+            conexion.execute(progreso.insert().values(nombre=nombre, ultimo_id=0, filas=0, completado=False,
+                                                      fecha_inicio=datetime.utcnow(),
+                                                      fecha_actualizacion=datetime.utcnow()))
+            ultimo, total = 0, 0
+        elif fila.completado:
+            return fila.filas
+        else:
+            ultimo, total = fila.ultimo_id, fila.filas
+
+    while True:
+        with db.engine.begin() as conexion:
+            # Última clave del lote (recorre solo el índice de la clave primaria)
+            hasta = conexion.execute(
+                sa.select(clave).where(clave > ultimo).order_by(clave).offset(tamaño_lote - 1).limit(1)
+            ).scalar()
+            if hasta is None:
+                hasta = conexion.execute(sa.select(sa.func.max(clave)).where(clave > ultimo)).scalar()
+            if hasta is None:
+                conexion.execute(progreso.update().where(progreso.c.nombre == nombre)
+                                 .values(completado=True, fecha_actualizacion=datetime.utcnow()))
+                return total
+
+            filas = conexion.execute(
+                tabla.update().where(clave > ultimo, clave <= hasta, *condiciones).values(valores)
+            ).rowcount
+            total += max(filas, 0)
+            conexion.execute(progreso.update().where(progreso.c.nombre == nombre)
+                             .values(ultimo_id=hasta, filas=total, fecha_actualizacion=datetime.utcnow()))
+        ultimo = hasta
+        if pausa:
+            time.sleep(pausa)
+
+
+def estado_rellenos():
+    """Avance de los rellenos registrados"""
+    _tablas_control()
+    return [p.to_dict() for p in ProgresoBackfill.query.order_by(ProgresoBackfill.fecha_inicio)]
@@ -0,0 +1,126 @@
+"""
+Servicio de Verificación de Planes
+Ejecuta las consultas clave de los modelos sobre una base SQLite en memoria
+con el esquema y los índices de los modelos, y revisa el plan de cada
+sentencia con EXPLAIN QUERY PLAN:
+    - problema: recorre completa (SCAN) una de las tablas grandes (salvo por
+      un índice filtrado, que solo tiene las filas de la condición),
+    - aviso: necesita ordenar en una tabla temporal (USE TEMP B-TREE).
+
+Los índices se crean en producción con las migraciones (app/migraciones/).
+"""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event
+
+# Tablas que crecen con el uso; las de catálogo pueden recorrerse completas
+TABLAS_GRANDES = (
+    'consultas', 'tratamientos', 'calendario_vacunacion', 'mascotas',
+    'facturas', 'detalles_factura', 'pagos', 'recordatorios'
+)
+
+
+def _consultas_clave():
+    """Nombre -> función que ejecuta la consulta (dentro del contexto de la app)"""
+    from app import db
+    from app.models.calendario_vacunacion import CalendarioVacunacion
+    from app.models.consulta import Consulta
+    from app.models.factura import Factura, Pago
+    from app.models.fechas import en_rango
+    from app.models.mascota import Mascota
+    from app.services import caja, cobranza, historial_clinico, productividad
+
+    hoy = date.today()
+    inicio = datetime.combine(hoy - timedelta(days=30), datetime.min.time())
+    fin = datetime.combine(hoy, datetime.max.time())
+
+    return {
+        'Mascota.get_activas': Mascota.get_activas,
+        'Mascota.buscar': lambda: Mascota.buscar('fir'),
+        'Mascota.get_by_propietario': lambda: Mascota.get_by_propietario(1),
+        'Consulta.get_programadas': Consulta.get_programadas,
+        'Consulta.get_by_mascota': lambda: Consulta.get_by_mascota(1),
+        'Consulta.get_hoy': Consulta.get_hoy,
+        'Consulta.get_by_periodo': lambda: Consulta.get_by_periodo(inicio, fin),
+        # reportes.consultas_periodo
+        'Consultas por día': lambda: db.session.query(Consulta.fecha, db.func.count(Consulta.id_consulta))
+            .filter(en_rango(Consulta.fecha, inicio.date(), fin.date()))
+            .group_by(Consulta.fecha).all(),
+        'productividad.consulta_columnas': lambda: db.session.execute(
+            productividad.consulta_columnas(inicio, fin)).all(),
+        'CalendarioVacunacion.get_pendientes': CalendarioVacunacion.get_pendientes,
+        'CalendarioVacunacion.get_proximas': CalendarioVacunacion.get_proximas,
+        'CalendarioVacunacion.get_vencidas': CalendarioVacunacion.get_vencidas,
+        'CalendarioVacunacion.get_by_mascota': lambda: CalendarioVacunacion.get_by_mascota(1),
+        'Factura.get_pendientes': Factura.get_pendientes,
+        'Factura.get_by_propietario': lambda: Factura.get_by_propietario(1),
+        'Factura.get_by_periodo': lambda: Factura.get_by_periodo(inicio, fin),
+        'Factura.get_con_saldo': lambda: Factura.get_con_saldo(50),
+        'Factura.deudores': lambda: Factura.deudores(100),
+        'Pago.resumen_diario': lambda: Pago.resumen_diario(inicio, fin),
+        'caja.reporte': lambda: caja.reporte(inicio.date(), fin.date()),
+        'cobranza.consulta_resumen': lambda: db.session.execute(cobranza.consulta_resumen()).all(),
+        'cobranza.consulta_detalle': lambda: db.session.execute(cobranza.consulta_detalle(1)).all(),
+        # facturacion.show
+        'Pagos de una factura': lambda: Pago.query.filter_by(id_factura=1).order_by(Pago.fecha_pago).all(),
+        # facturacion.api_consultas_mascota
+        'Consultas sin facturar': lambda: Consulta.query.filter_by(id_mascota=1)
+            .filter(Consulta.factura == None)
+            .order_by(Consulta.fecha_hora.desc()).limit(10).all(),
+        'historial_clinico.ventana': lambda: historial_clinico.ventana(1),
+    }
+
+
+def _revisar(detalles, parciales=()):
+    """Clasifica las líneas del plan en problemas y avisos (`parciales`: índices filtrados)"""
+    problemas, avisos = [], []
+    for detalle in detalles:
+        partes = detalle.split()
+        if partes[:1] == ['SCAN'] and len(partes) > 1 and partes[1] in TABLAS_GRANDES \
+                and partes[-1] not in parciales:
+            problemas.append(detalle)
+        elif 'USE TEMP B-TREE' in detalle:
+            avisos.append(detalle)
+    return problemas, avisos
+
+
+def verificar():
+    """
+    Revisa el plan de las consultas clave.
+    Retorna una lista de {'consulta', 'sql', 'plan', 'problemas', 'avisos'}.
+    """
+    from app import create_app, db
+
+    app = create_app('testing')
+    resultados = []
+    with app.app_context():
+        db.create_all()
+        motor = db.engine
+        parciales = {indice.name for tabla in db.metadata.tables.values() for indice in tabla.indexes
+                     if indice.dialect_options['sqlite']['where'] is not None}
+        sentencias = []
+
+        def capturar(conn, cursor, sql, parametros, contexto, multiples):
+            if sql.lstrip().upper().startswith('SELECT'):
+                sentencias.append((sql, parametros))
+
+        event.listen(motor, 'before_cursor_execute', capturar)
+        try:
+            for nombre, consulta in _consultas_clave().items():
+                sentencias.clear()
+                consulta()
+                db.session.rollback()
+
+                with motor.connect() as conn:
+                    for sql, parametros in list(sentencias):
+                        plan = [fila[3] for fila in
+                                conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, parametros)]
+                        problemas, avisos = _revisar(plan, parciales)
+                        resultados.append({
+                            'consulta': nombre, 'sql': sql, 'plan': plan,
+                            'problemas': problemas, 'avisos': avisos
+                        })
+        finally:
+            event.remove(motor, 'before_cursor_execute', capturar)
+            db.session.remove()
+    return resultados
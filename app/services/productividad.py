@@ -0,0 +1,235 @@
+"""
+Servicio de Productividad de Veterinarios
+Indicadores por veterinario (por id_veterinario: dos veterinarios con el
+mismo nombre no se mezclan) sobre las consultas de un período:
+    - consultas, atendidas (completadas), pendientes (programadas o en
+      curso) y tasa de cancelación,
+    - ingresos, horas atendidas (duración del servicio o
+      CONSULTA_DURACION_MINUTOS) e ingresos por hora,
+    - consultas por día activo y percentiles (consultas por día, costo),
+    - tendencia: promedio móvil de 7 y 30 días de consultas atendidas,
+    - especies atendidas.
+Ingresos, horas, percentiles, tendencia y especies cuentan solo las
+consultas completadas.
+
+Las consultas se leen por lotes (yield_per) proyectando solo las columnas
+necesarias y se guardan en columnas compactas (array) separadas por
+veterinario: cada indicador se calcula luego sobre la columna completa con
+funciones de la biblioteca estándar (sum, sorted, Counter, accumulate), sin
+guardar objetos por fila. Un millón de consultas ocupa unos 16 MB.
+"""
+import math
+from array import array
+from collections import Counter
+from itertools import accumulate
+
+from flask import current_app
+
+from app import db
+from app.models.archivo import con_archivo
+from app.models.consulta import Consulta
+from app.models.especie import Especie
+from app.models.fechas import en_rango
+from app.models.mascota import Mascota
+from app.models.servicio import Servicio
+from app.models.veterinario import Veterinario
+
+# Filas leídas por viaje al servidor de base de datos
+FILAS_POR_LOTE = 5000
+
+# Columnas de consulta_columnas (mismos nombres en la instantánea de consultas)
+COLUMNAS = ('id_veterinario', 'fecha', 'costo', 'estado', 'id_especie', 'duracion_minutos')
+
+# Días de la serie de tendencia que se devuelven (los últimos del período)
+DIAS_SERIE = 90
+
+
+class Columnas:
+    """Consultas completadas de un veterinario, por columnas (y conteo de las demás)"""
+
+    __slots__ = ('dia', 'costo', 'minutos', 'especie', 'canceladas', 'pendientes')
+
+    def __init__(self):
+        self.dia = array('H')        # Días desde el inicio del período
+        self.costo = array('d')
+        self.minutos = array('H')
+        self.especie = array('i')
+        self.canceladas = 0
+        self.pendientes = 0  # Programadas o en curso
+
+    def __len__(self):
+        return len(self.dia)
+
+
+# ============================================
+# CARGA
+# ============================================
+
+def consulta_columnas(desde, hasta, estado=None):
+    """
+    SELECT de las columnas del análisis: (id_veterinario, fecha, costo, estado, id_especie, minutos),
+    sobre las consultas en uso y las archivadas.
+    """
+    defecto = current_app.config.get('CONSULTA_DURACION_MINUTOS', 30)
+    C = con_archivo(Consulta, **({'estado': estado} if estado else {}))
+    return db.select(
+        C.id_veterinario, C.fecha, db.cast(C.costo, db.Float), C.estado,
+        Mascota.id_especie, db.func.coalesce(Servicio.duracion_minutos, defecto)
+    ).join(
+        Mascota, Mascota.id_mascota == C.id_mascota
+    ).outerjoin(
+        Servicio, Servicio.id_servicio == C.id_servicio
+    ).where(en_rango(C.fecha_hora, desde, hasta))
+
+
+def lotes_bd(desde, hasta, estado=None):
+    """Lotes de filas de consulta_columnas leídos con un cursor del servidor"""
+    consulta = consulta_columnas(desde, hasta, estado)
+    # Ejecución en Core (sin la capa del ORM), en la conexión que elige la sesión (réplica)
+    conexion = db.session.connection(bind_arguments={'clause': consulta})
+    resultado = conexion.execute(consulta.execution_options(yield_per=FILAS_POR_LOTE))
+    try:
+        yield from resultado.partitions()
+    finally:
+        resultado.close()
+
+
+def cargar(lotes, desde):
+    """
+    Separa por veterinario las filas de `lotes` (iterable de listas de filas
+    como las de consulta_columnas): id_veterinario -> Columnas.
+    """
+    base = desde.toordinal()
+    completada = Consulta.ESTADO_COMPLETADA
+    cancelada = Consulta.ESTADO_CANCELADA
+    columnas = {}
+    for lote in lotes:
+        for id_veterinario, fecha, costo, estado, id_especie, minutos in lote:
+            c = columnas.get(id_veterinario)
+            if c is None:
+                c = columnas[id_veterinario] = Columnas()
+            if estado != completada:
+                if estado == cancelada:
+                    c.canceladas += 1
+                else:
+                    c.pendientes += 1
+                continue
+            c.dia.append(fecha.toordinal() - base)
+            c.costo.append(costo or 0)
+            c.minutos.append(minutos or 0)
+            c.especie.append(id_especie)
+    return columnas
+
+
+# ============================================
+# INDICADORES
+# ============================================
+
+def percentil(ordenados, p):
+    """Percentil `p` (0-100) de una secuencia ordenada, con interpolación lineal"""
+    if not ordenados:
+        return None
+    posicion = (len(ordenados) - 1) * p / 100
+    inferior = math.floor(posicion)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    fraccion = posicion - inferior
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * fraccion
+
+
+def promedio_movil(serie, ventana):
+    """Promedio de los últimos `ventana` valores en cada posición (sumas acumuladas)"""
+    sumas = [0, *accumulate(serie)]
+    return [(sumas[i + 1] - sumas[max(0, i + 1 - ventana)]) / min(i + 1, ventana)
+            for i in range(len(serie))]
+
+
+def _variacion(actual, anterior):
+    if not anterior:
+        return None
+    return round((actual - anterior) / anterior * 100, 1)
+
+
+def indicadores(c, num_dias):
+    """Indicadores de un veterinario a partir de sus Columnas"""
+    atendidas = len(c)
+    consultas = atendidas + c.canceladas + c.pendientes
+    ingresos = math.fsum(c.costo)
+    horas = sum(c.minutos) / 60
+    por_dia = Counter(c.dia)
+
+    serie = [0] * num_dias
+    for dia, cantidad in por_dia.items():
+        serie[dia] = cantidad
+    media_7 = promedio_movil(serie, 7)
+    media_30 = promedio_movil(serie, 30)
+    previa_7 = sum(serie[-14:-7]) / 7 if num_dias >= 14 else None
+
+    costos = sorted(c.costo)
+    diarias = sorted(por_dia.values())
+    return {
+        'consultas': consultas,
+        'atendidas': atendidas,
+        'canceladas': c.canceladas,
+        'pendientes': c.pendientes,
+        'tasa_cancelacion': round(c.canceladas / consultas * 100, 1) if consultas else 0.0,
+        'ingresos': round(ingresos, 2),
+        'horas': round(horas, 1),
+        'ingresos_hora': round(ingresos / horas, 2) if horas else None,
+        'dias_activos': len(por_dia),
+        'consultas_dia': round(atendidas / len(por_dia), 2) if por_dia else 0.0,
+        'consultas_dia_p50': percentil(diarias, 50),
+        'consultas_dia_p90': percentil(diarias, 90),
+        'costo_p50': round(percentil(costos, 50), 2) if costos else None,
+        'costo_p90': round(percentil(costos, 90), 2) if costos else None,
+        'promedio_7': round(media_7[-1], 2) if num_dias else 0.0,
+        'promedio_30': round(media_30[-1], 2) if num_dias else 0.0,
+        'variacion_7': _variacion(media_7[-1], previa_7) if previa_7 is not None else None,
+        'serie_7': [round(v, 2) for v in media_7[-DIAS_SERIE:]],
+        'serie_30': [round(v, 2) for v in media_30[-DIAS_SERIE:]],
+        'especies': Counter(c.especie).most_common(),
+    }
+
+
+def calcular(desde, hasta, estado=None, lotes=None):
+    """
+    Productividad de cada veterinario en [desde, hasta) (resultado serializable a JSON).
+    `lotes`: filas ya leídas (por defecto se leen de la base de datos).
+    """
+    num_dias = max((hasta - desde).days, 0)
+    if lotes is None:
+        lotes = lotes_bd(desde, hasta, estado)
+    columnas = cargar(lotes, desde.date() if hasattr(desde, 'date') else desde)
+
+    nombres = dict(db.session.query(Veterinario.id_veterinario, Veterinario.nombre)
+                   .filter(Veterinario.id_veterinario.in_(list(columnas))))
+    especies = dict(db.session.query(Especie.id_especie, Especie.nombre))
+
+    veterinarios = []
+    for id_veterinario, c in columnas.items():
+        fila = indicadores(c, num_dias)
+        fila['especies'] = [[especies.get(id_especie, '-'), cantidad] for id_especie, cantidad in fila['especies']]
+        fila['id_veterinario'] = id_veterinario
+        fila['nombre'] = nombres.get(id_veterinario, '-')
+        veterinarios.append(fila)
+    veterinarios.sort(key=lambda v: (-v['atendidas'], v['nombre']))
+
+    consultas = sum(v['consultas'] for v in veterinarios)
+    atendidas = sum(v['atendidas'] for v in veterinarios)
+    canceladas = sum(v['canceladas'] for v in veterinarios)
+    ingresos = math.fsum(v['ingresos'] for v in veterinarios)
+    horas = sum(v['horas'] for v in veterinarios)
+    return {
+        'desde': desde.strftime('%Y-%m-%d'),
+        'dias': num_dias,
+        'veterinarios': veterinarios,
+        'totales': {
+            'consultas': consultas,
+            'atendidas': atendidas,
+            'canceladas': canceladas,
+            'pendientes': consultas - atendidas - canceladas,
+            'tasa_cancelacion': round(canceladas / consultas * 100, 1) if consultas else 0.0,
+            'ingresos': round(ingresos, 2),
+            'horas': round(horas, 1),
+            'ingresos_hora': round(ingresos / horas, 2) if horas else None,
+        }
+    }
@@ -0,0 +1,301 @@
+"""
+Servicio de Pronóstico de Vacunación
+Estima cuántas dosis de cada vacuna se aplicarán por semana en los próximos
+FORECAST_HORIZON_DAYS días, para planificar la compra de stock.
+
+Las dosis salen de tres consultas agregadas (conteos por vacuna y fecha, sin
+cargar mascotas):
+    - programadas: vacunaciones pendientes (las atrasadas cuentan en la
+      primera semana),
+    - proyectadas: vacunaciones aplicadas cuya `fecha_proxima` cae en el
+      horizonte y que aún no tienen la siguiente dosis registrada,
+    - tasas históricas por vacuna (último FORECAST_HISTORY_DAYS):
+        aplicación   = pendientes que se aplicaron / pendientes que vencieron,
+        continuación = dosis aplicadas seguidas de otra dosis.
+
+Cada dosis genera las siguientes cada `intervalo_dias` mientras caigan en el
+horizonte (refuerzos), ponderadas por la tasa de continuación. Mientras
+`dosis_numero` < `dosis_requeridas` (serie inicial) la continuación se
+considera segura.
+
+El resultado se guarda por vacuna (en cada proceso) junto con la versión
+compartida de esa vacuna en versiones_cache ('pronostico:<id_vacuna>'). Al
+cambiar sus vacunaciones se incrementa la versión (ver
+`_actualizar_pronostico`) y todos los procesos recalculan solo esa vacuna.
+"""
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from flask import current_app
+
+from app import db
+from app.models.calendario_vacunacion import CalendarioVacunacion
+from app.models.vacuna import Vacuna
+from app.services import cache
+from app.services.eventos import bus
+
+# Versión de todo el pronóstico; la de cada vacuna es 'pronostico:<id_vacuna>'
+VERSION_PRONOSTICO = 'pronostico'
+
+
+def _inicio_semana(fecha):
+    return fecha - timedelta(days=fecha.weekday())
+
+
+class PronosticoVacunacion:
+    """Pronóstico por vacuna con recálculo incremental"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # horizonte -> {'hoy', 'expira', 'version', 'vacunas': {id_vacuna: fila},
+        #               'versiones': {id_vacuna: versión con la que se calculó}}
+        self._estados = {}
+
+    def obtener(self, horizonte=None):
+        """Pronóstico completo (calcula solo las vacunas que faltan)"""
+        config = current_app.config
+        horizonte = horizonte or config.get('FORECAST_HORIZON_DAYS', 90)
+        hoy = date.today()
+        versiones = cache.versiones(VERSION_PRONOSTICO)
+        general = versiones.get(VERSION_PRONOSTICO, 0)
+
+        def version(id_vacuna):
+            return versiones.get(f'{VERSION_PRONOSTICO}:{id_vacuna}', 0)
+
+        with self._lock:
+            estado = self._estados.get(horizonte)
+            if estado is None or estado['hoy'] != hoy or estado['expira'] < time.monotonic() \
+                    or estado['version'] != general:
+                estado = {'hoy': hoy, 'version': general, 'vacunas': {}, 'versiones': {},
+                          'expira': time.monotonic() + config.get('FORECAST_TTL_SECONDS', 900)}
+                self._estados[horizonte] = estado
+            # Vacunas que cambiaron (en cualquier proceso) desde que se calcularon
+            for id_vacuna, calculada in list(estado['versiones'].items()):
+                if calculada != version(id_vacuna):
+                    estado['vacunas'].pop(id_vacuna, None)
+                    del estado['versiones'][id_vacuna]
+            calculadas = dict(estado['vacunas'])
+
+        vacunas = Vacuna.get_activas()
+        faltantes = [v for v in vacunas if v.id_vacuna not in calculadas]
+        if faltantes:
+            nuevas = calcular(faltantes, hoy, horizonte)
+            with self._lock:
+                if self._estados.get(horizonte) is estado:
+                    estado['vacunas'].update(nuevas)
+                    estado['versiones'].update((id_vacuna, version(id_vacuna)) for id_vacuna in nuevas)
+            calculadas.update(nuevas)
+
+        semanas = _semanas(hoy, horizonte)
+        filas = [calculadas[v.id_vacuna] for v in vacunas]
+        return {
+            'desde': hoy.isoformat(),
+            'hasta': (hoy + timedelta(days=horizonte)).isoformat(),
+            'semanas': [s.isoformat() for s in semanas],
+            'vacunas': filas,
+            'totales': [round(sum(f['esperadas'][i] for f in filas), 1) for i in range(len(semanas))],
+            'total': sum(f['total'] for f in filas)
+        }
+
+    @property
+    def en_uso(self):
+        """Indica si este proceso ya calculó algún pronóstico"""
+        return bool(self._estados)
+
+    def invalidar(self, ids_vacuna=None):
+        """
+        Descarta en todos los procesos el pronóstico de las vacunas indicadas
+        (o de todas) incrementando sus versiones. Confirma la sesión.
+        """
+        if ids_vacuna is None:
+            cache.incrementar_version(VERSION_PRONOSTICO)
+        else:
+            for id_vacuna in ids_vacuna:
+                cache.incrementar_version(f'{VERSION_PRONOSTICO}:{id_vacuna}')
+
+
+# Instancia única por proceso
+pronostico = PronosticoVacunacion()
+
+
+def _semanas(hoy, horizonte):
+    primera = _inicio_semana(hoy)
+    ultima = _inicio_semana(hoy + timedelta(days=horizonte))
+    return [primera + timedelta(weeks=i) for i in range((ultima - primera).days // 7 + 1)]
+
+
+# ============================================
+# CÁLCULO
+# ============================================
+
+def _tasas(ids, hoy, historial):
+    """Tasas de aplicación y continuación por vacuna"""
+    inicio = hoy - timedelta(days=historial)
+    C = CalendarioVacunacion
+
+    aplicacion = {}
+    filas = db.session.query(
+        C.id_vacuna,
+        db.func.sum(db.case((C.estado == C.ESTADO_APLICADA, 1), else_=0)),
+        db.func.count(C.id_calendario)
+    ).filter(
+        C.id_vacuna.in_(ids),
+        C.fecha_programada >= inicio,
+        C.fecha_programada < hoy,
+        C.estado != C.ESTADO_PENDIENTE
+    ).group_by(C.id_vacuna)
+    for id_vacuna, aplicadas, total in filas:
+        aplicacion[id_vacuna] = (aplicadas or 0) / total if total else None
+
+    # Dosis cuya fecha_proxima ya pasó: ¿se registró una dosis posterior?
+    siguiente = db.aliased(C)
+    continuada = db.exists().where(
+        siguiente.id_mascota == C.id_mascota,
+        siguiente.id_vacuna == C.id_vacuna,
+        siguiente.dosis_numero > C.dosis_numero,
+        siguiente.estado == C.ESTADO_APLICADA
+    )
+    continuacion = {}
+    filas = db.session.query(
+        C.id_vacuna,
+        db.func.sum(db.case((continuada, 1), else_=0)),
+        db.func.count(C.id_calendario)
+    ).filter(
+        C.id_vacuna.in_(ids),
+        C.estado == C.ESTADO_APLICADA,
+        C.fecha_proxima >= inicio,
+        C.fecha_proxima < hoy
+    ).group_by(C.id_vacuna)
+    for id_vacuna, continuadas, total in filas:
+        continuacion[id_vacuna] = (continuadas or 0) / total if total else None
+
+    return aplicacion, continuacion
+
+
+def _semillas(ids, hoy, fin, atraso):
+    """
+    Conteos (id_vacuna, fecha, dosis_numero, cantidad, programada) de las
+    próximas dosis conocidas
+    """
+    C = CalendarioVacunacion
+    desde = hoy - timedelta(days=atraso)
+
+    programadas = db.session.query(
+        C.id_vacuna, C.fecha_programada, C.dosis_numero, db.func.count(C.id_calendario)
+    ).filter(
+        C.id_vacuna.in_(ids),
+        C.estado == C.ESTADO_PENDIENTE,
+        C.fecha_programada >= desde,
+        C.fecha_programada <= fin
+    ).group_by(C.id_vacuna, C.fecha_programada, C.dosis_numero)
+
+    posterior = db.aliased(C)
+    registrada = db.exists().where(
+        posterior.id_mascota == C.id_mascota,
+        posterior.id_vacuna == C.id_vacuna,
+        posterior.dosis_numero > C.dosis_numero,
+        posterior.estado.in_([C.ESTADO_PENDIENTE, C.ESTADO_APLICADA])
+    )
+    proyectadas = db.session.query(
+        C.id_vacuna, C.fecha_proxima, C.dosis_numero + 1, db.func.count(C.id_calendario)
+    ).filter(
+        C.id_vacuna.in_(ids),
+        C.estado == C.ESTADO_APLICADA,
+        C.fecha_proxima >= desde,
+        C.fecha_proxima <= fin,
+        ~registrada
+    ).group_by(C.id_vacuna, C.fecha_proxima, C.dosis_numero)
+
+    for fila in programadas:
+        yield (*fila, True)
+    for fila in proyectadas:
+        yield (*fila, False)
+
+
+def calcular(vacunas, hoy, horizonte):
+    """Calcula el pronóstico de las vacunas indicadas. Retorna {id_vacuna: fila}."""
+    config = current_app.config
+    fin = hoy + timedelta(days=horizonte)
+    semanas = _semanas(hoy, horizonte)
+    primera = semanas[0]
+    por_id = {v.id_vacuna: v for v in vacunas}
+    ids = list(por_id)
+
+    aplicacion, continuacion = _tasas(ids, hoy, config.get('FORECAST_HISTORY_DAYS', 365))
+
+    programadas = defaultdict(lambda: [0] * len(semanas))
+    proyectadas = defaultdict(lambda: [0.0] * len(semanas))
+
+    def semana(fecha):
+        return (_inicio_semana(max(fecha, hoy)) - primera).days // 7
+
+    for id_vacuna, fecha, dosis, cantidad, programada in _semillas(
+            ids, hoy, fin, config.get('FORECAST_OVERDUE_DAYS', 90)):
+        vacuna = por_id[id_vacuna]
+        tasa_aplicacion = aplicacion.get(id_vacuna)
+        if tasa_aplicacion is None:
+            tasa_aplicacion = 1.0  # Sin historial: se asume que se aplican todas
+        tasa_continuacion = continuacion.get(id_vacuna)
+        if tasa_continuacion is None:
+            tasa_continuacion = 1.0
+        requeridas = vacuna.dosis_requeridas or 1
+
+        if programada:
+            programadas[id_vacuna][semana(fecha)] += cantidad
+            peso = cantidad * tasa_aplicacion
+        else:
+            peso = cantidad * (1.0 if dosis <= requeridas else tasa_continuacion)
+            proyectadas[id_vacuna][semana(fecha)] += peso
+
+        # Dosis siguientes dentro del horizonte
+        intervalo = vacuna.intervalo_dias
+        fecha = max(fecha, hoy)
+        while intervalo and fecha + timedelta(days=intervalo) <= fin:
+            fecha += timedelta(days=intervalo)
+            peso *= 1.0 if dosis < requeridas else tasa_continuacion
+            dosis += 1
+            proyectadas[id_vacuna][semana(fecha)] += peso
+
+    resultado = {}
+    for id_vacuna, vacuna in por_id.items():
+        tasa = aplicacion.get(id_vacuna)
+        factor = tasa if tasa is not None else 1.0
+        progr = programadas[id_vacuna]
+        proy = proyectadas[id_vacuna]
+        esperadas = [round(progr[i] * factor + proy[i], 1) for i in range(len(semanas))]
+        resultado[id_vacuna] = {
+            'id': id_vacuna,
+            'nombre': vacuna.nombre,
+            'tasa_aplicacion': round(tasa, 3) if tasa is not None else None,
+            'tasa_continuacion': round(continuacion[id_vacuna], 3)
+                if continuacion.get(id_vacuna) is not None else None,
+            'programadas': progr,
+            'proyectadas': [round(p, 1) for p in proy],
+            'esperadas': esperadas,
+            'total': math.ceil(sum(progr[i] * factor + proy[i] for i in range(len(semanas))))
+        }
+    return resultado
+
+
+# ============================================
+# ACTUALIZACIÓN INCREMENTAL
+# ============================================
+
+@bus.suscriptor('CalendarioVacunacion', asincrono=True)
+def _actualizar_pronostico(cambios):
+    """Invalida (en todos los procesos) solo las vacunas afectadas por los cambios confirmados"""
+    ids_vacuna = {c.valores['id_vacuna'] for c in cambios if c.valores.get('id_vacuna')}
+    sin_vacuna = [c.id for c in cambios if not c.valores.get('id_vacuna') and c.operacion != c.ELIMINADO]
+    if sin_vacuna:
+        ids_vacuna.update(id_vacuna for (id_vacuna,) in
+                          db.session.query(CalendarioVacunacion.id_vacuna)
+                          .filter(CalendarioVacunacion.id_calendario.in_(sin_vacuna)).distinct())
+    if any(c.operacion == c.ELIMINADO and not c.valores.get('id_vacuna') for c in cambios):
+        ids_vacuna = None  # Sin datos de la fila eliminada: se descarta todo
+
+    pronostico.invalidar(ids_vacuna)
+    if ids_vacuna and pronostico.en_uso:
+        pronostico.obtener()  # Deja calculadas las vacunas afectadas en este proceso
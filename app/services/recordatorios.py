@@ -0,0 +1,367 @@
+"""
+Servicio de Recordatorios de Vacunación
+Bandeja de salida (outbox) y despachador de recordatorios.
+
+1. `generar` selecciona por lotes las vacunaciones que requieren recordatorio
+   (consulta sobre idx_calendario_recordatorio) y, en la misma transacción,
+   inserta un recordatorio por fila y marca `recordatorio_enviado`. Si la
+   transacción falla no queda ni el recordatorio ni la marca.
+2. `despachar` reclama recordatorios pendientes con un UPDATE condicional
+   (varios procesos pueden despachar a la vez sin duplicar envíos), los envía
+   en paralelo respetando REMINDERS_RATE_PER_SECOND y guarda el resultado.
+   Los fallos se reintentan con espera creciente hasta REMINDERS_MAX_ATTEMPTS.
+
+El remitente se configura con REMINDERS_SENDER (ruta 'modulo.Clase'). Debe
+tener un método `enviar(recordatorio)` que recibe un diccionario (canal,
+destino, asunto, mensaje) y lanza una excepción si el envío falla, y puede
+tener un método `cerrar()` que se llama al terminar el despacho.
+
+Ambos pasos se programan con `flask recordatorios generar` y
+`flask recordatorios enviar` (cron o Programador de tareas).
+"""
+import logging
+import smtplib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from importlib import import_module
+
+from flask import current_app
+
+from app import db
+from app.models.calendario_vacunacion import CalendarioVacunacion
+from app.models.mascota import Mascota
+from app.models.propietario import Propietario
+from app.models.recordatorio import Recordatorio
+from app.models.vacuna import Vacuna
+
+logger = logging.getLogger(__name__)
+
+# Filas por transacción al generar y recordatorios reclamados por vuelta al despachar
+TAMAÑO_LOTE = 500
+
+
+class ErrorPermanente(Exception):
+    """Fallo de envío que no se resuelve reintentando (p. ej. canal no soportado)"""
+
+
+# ============================================
+# REMITENTES
+# ============================================
+
+class RemitenteLog:
+    """Escribe los recordatorios en el log (desarrollo)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def enviar(self, recordatorio):
+        logger.info('Recordatorio %s a %s: %s', recordatorio['canal'],
+                    recordatorio['destino'], recordatorio['asunto'])
+
+
+class RemitenteMemoria:
+    """Guarda los recordatorios en una lista (pruebas)"""
+
+    enviados = []
+
+    def __init__(self, app):
+        self.app = app
+
+    def enviar(self, recordatorio):
+        RemitenteMemoria.enviados.append(recordatorio)
+
+
+class RemitenteSMTP:
+    """Envía los recordatorios por correo (MAIL_SERVER, MAIL_PORT, ...)"""
+
+    def __init__(self, app):
+        self.config = app.config
+        self._local = threading.local()  # Una conexión SMTP por hilo
+        self._abiertas = set()
+        self._lock = threading.Lock()
+
+    def enviar(self, recordatorio):
+        if recordatorio['canal'] != Recordatorio.CANAL_EMAIL:
+            raise ErrorPermanente(f"Canal no soportado: {recordatorio['canal']}")
+
+        mensaje = EmailMessage()
+        mensaje['From'] = self.config.get('MAIL_SENDER')
+        mensaje['To'] = recordatorio['destino']
+        mensaje['Subject'] = recordatorio['asunto']
+        mensaje.set_content(recordatorio['mensaje'])
+
+        try:
+            self._conexion().send_message(mensaje)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise ErrorPermanente(str(e))
+        except smtplib.SMTPException:
+            # Se reabre en el siguiente intento
+            conexion, self._local.conexion = self._local.conexion, None
+            self._cerrar(conexion)
+            raise
+
+    def cerrar(self):
+        """Cierra las conexiones abiertas por todos los hilos"""
+        with self._lock:
+            abiertas, self._abiertas = self._abiertas, set()
+        for conexion in abiertas:
+            self._cerrar(conexion)
+
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = smtplib.SMTP(self.config.get('MAIL_SERVER'), self.config.get('MAIL_PORT', 25), timeout=30)
+            with self._lock:
+                self._abiertas.add(conexion)
+            if self.config.get('MAIL_USE_TLS'):
+                conexion.starttls()
+            if self.config.get('MAIL_USERNAME'):
+                conexion.login(self.config['MAIL_USERNAME'], self.config.get('MAIL_PASSWORD'))
+            self._local.conexion = conexion
+        return conexion
+
+    def _cerrar(self, conexion):
+        if conexion is None:
+            return
+        with self._lock:
+            self._abiertas.discard(conexion)
+        try:
+            conexion.quit()
+        except (smtplib.SMTPException, OSError):
+            conexion.close()
+
+
+def obtener_remitente(app=None):
+    """Instancia el remitente configurado en REMINDERS_SENDER"""
+    app = app or current_app._get_current_object()
+    ruta = app.config.get('REMINDERS_SENDER', 'app.services.recordatorios.RemitenteLog')
+    modulo, _, clase = ruta.rpartition('.')
+    return getattr(import_module(modulo), clase)(app)
+
+
+class LimitadorTasa:
+    """Limita los envíos por segundo entre todos los hilos del despachador"""
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1.0 / por_segundo if por_segundo else 0
+        self._siguiente = time.monotonic()
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        if not self.intervalo:
+            return
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(self._siguiente, ahora)
+            self._siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+# ============================================
+# GENERACIÓN (OUTBOX)
+# ============================================
+
+def _contenido(nombre_propietario, nombre_mascota, vacuna, dosis, fecha):
+    asunto = f'Recordatorio de vacunación de {nombre_mascota}'
+    mensaje = (f'Hola {nombre_propietario}, le recordamos que {nombre_mascota} tiene programada '
+               f'la vacuna {vacuna} (dosis {dosis}) para el {fecha.strftime("%d/%m/%Y")}. '
+               f'Le esperamos en VetCare Pro.')
+    return asunto, mensaje
+
+
+def generar(dias=None, tamaño_lote=TAMAÑO_LOTE):
+    """
+    Crea los recordatorios de las vacunaciones próximas.
+    Retorna el número de recordatorios creados.
+    """
+    if dias is None:
+        dias = current_app.config.get('REMINDERS_DAYS_BEFORE', 7)
+    tabla = Recordatorio.__table__
+    total = 0
+    ultimo = 0
+
+    while True:
+        filas = db.session.query(
+            CalendarioVacunacion.id_calendario,
+            CalendarioVacunacion.dosis_numero,
+            CalendarioVacunacion.fecha_programada,
+            Mascota.nombre,
+            Vacuna.nombre,
+            Propietario.nombre,
+            Propietario.email,
+            Propietario.telefono
+        ).join(Mascota, CalendarioVacunacion.id_mascota == Mascota.id_mascota)\
+         .join(Propietario, Mascota.id_propietario == Propietario.id_propietario)\
+         .join(Vacuna, CalendarioVacunacion.id_vacuna == Vacuna.id_vacuna)\
+         .filter(*CalendarioVacunacion.criterios_recordatorio(dias))\
+         .filter(CalendarioVacunacion.id_calendario > ultimo)\
+         .order_by(CalendarioVacunacion.id_calendario)\
+         .limit(tamaño_lote).all()
+        if not filas:
+            break
+        ultimo = filas[-1][0]
+
+        ahora = datetime.utcnow()
+        recordatorios = []
+        for id_calendario, dosis, fecha, mascota, vacuna, propietario, email, telefono in filas:
+            asunto, mensaje = _contenido(propietario, mascota, vacuna, dosis, fecha)
+            recordatorios.append({
+                'id_calendario': id_calendario,
+                'canal': Recordatorio.CANAL_EMAIL if email else Recordatorio.CANAL_SMS,
+                'destino': email or telefono,
+                'asunto': asunto,
+                'mensaje': mensaje,
+                'estado': Recordatorio.ESTADO_PENDIENTE,
+                'intentos': 0,
+                'fecha_creacion': ahora,
+                'proximo_intento': ahora
+            })
+
+        ids = [r['id_calendario'] for r in recordatorios]
+        try:
+            # Solo se marcan las que siguen sin recordatorio: si otro proceso
+            # se adelantó, la restricción única de id_calendario revierte el lote
+            CalendarioVacunacion.query.filter(
+                CalendarioVacunacion.id_calendario.in_(ids),
+                CalendarioVacunacion.recordatorio_enviado == False
+            ).update({CalendarioVacunacion.recordatorio_enviado: True}, synchronize_session=False)
+            db.session.execute(tabla.insert(), recordatorios)
+            db.session.commit()
+            total += len(recordatorios)
+        except Exception:
+            db.session.rollback()
+            logger.exception('No se pudieron generar los recordatorios del lote %s-%s', ids[0], ids[-1])
+
+    return total
+
+
+# ============================================
+# DESPACHO
+# ============================================
+
+def _reclamar(token, tamaño_lote):
+    """Marca como 'Enviando' un lote de pendientes y retorna los reclamados por este despachador"""
+    ahora = datetime.utcnow()
+    candidatos = [id_ for (id_,) in db.session.query(Recordatorio.id_recordatorio).filter(
+        Recordatorio.estado == Recordatorio.ESTADO_PENDIENTE,
+        Recordatorio.proximo_intento <= ahora
+    ).order_by(Recordatorio.proximo_intento).limit(tamaño_lote)]
+    if not candidatos:
+        return []
+
+    Recordatorio.query.filter(
+        Recordatorio.id_recordatorio.in_(candidatos),
+        Recordatorio.estado == Recordatorio.ESTADO_PENDIENTE
+    ).update({
+        Recordatorio.estado: Recordatorio.ESTADO_ENVIANDO,
+        Recordatorio.reclamado_por: token,
+        Recordatorio.proximo_intento: ahora
+    }, synchronize_session=False)
+    db.session.commit()
+
+    filas = db.session.query(
+        Recordatorio.id_recordatorio, Recordatorio.intentos, Recordatorio.canal,
+        Recordatorio.destino, Recordatorio.asunto, Recordatorio.mensaje
+    ).filter(
+        Recordatorio.id_recordatorio.in_(candidatos),
+        Recordatorio.reclamado_por == token,
+        Recordatorio.estado == Recordatorio.ESTADO_ENVIANDO
+    ).all()
+    return [dict(fila._mapping) for fila in filas]
+
+
+def _recuperar_interrumpidos():
+    """Devuelve a 'Pendiente' los recordatorios de un despachador que no terminó"""
+    limite = datetime.utcnow() - timedelta(seconds=current_app.config.get('REMINDERS_STALE_SECONDS', 600))
+    Recordatorio.query.filter(
+        Recordatorio.estado == Recordatorio.ESTADO_ENVIANDO,
+        Recordatorio.proximo_intento < limite
+    ).update({Recordatorio.estado: Recordatorio.ESTADO_PENDIENTE,
+              Recordatorio.reclamado_por: None}, synchronize_session=False)
+    db.session.commit()
+
+
+def _enviar(remitente, limitador, recordatorio):
+    """Envía un recordatorio. Retorna (id, error, permanente)."""
+    limitador.esperar()
+    try:
+        remitente.enviar(recordatorio)
+        return recordatorio['id_recordatorio'], None, False
+    except ErrorPermanente as e:
+        return recordatorio['id_recordatorio'], str(e), True
+    except Exception as e:
+        return recordatorio['id_recordatorio'], str(e) or type(e).__name__, False
+
+
+def _guardar_resultados(lote, resultados):
+    config = current_app.config
+    max_intentos = config.get('REMINDERS_MAX_ATTEMPTS', 5)
+    espera = config.get('REMINDERS_RETRY_DELAY', 60)
+    intentos = {r['id_recordatorio']: r['intentos'] for r in lote}
+    ahora = datetime.utcnow()
+
+    enviados = [id_ for id_, error, _ in resultados if error is None]
+    if enviados:
+        Recordatorio.query.filter(Recordatorio.id_recordatorio.in_(enviados)).update({
+            Recordatorio.estado: Recordatorio.ESTADO_ENVIADO,
+            Recordatorio.intentos: Recordatorio.intentos + 1,
+            Recordatorio.fecha_envio: ahora,
+            Recordatorio.error: None
+        }, synchronize_session=False)
+
+    # Los fallos son pocos: se actualizan uno a uno con su propia espera
+    for id_, error, permanente in resultados:
+        if error is None:
+            continue
+        intento = intentos[id_] + 1
+        definitivo = permanente or intento >= max_intentos
+        Recordatorio.query.filter_by(id_recordatorio=id_).update({
+            Recordatorio.estado: Recordatorio.ESTADO_FALLIDO if definitivo else Recordatorio.ESTADO_PENDIENTE,
+            Recordatorio.intentos: intento,
+            Recordatorio.error: error[:1000],
+            Recordatorio.reclamado_por: None,
+            Recordatorio.proximo_intento: ahora + timedelta(seconds=espera * 2 ** (intento - 1))
+        }, synchronize_session=False)
+
+    db.session.commit()
+    return len(enviados)
+
+
+def despachar(remitente=None, tamaño_lote=TAMAÑO_LOTE, max_envios=None):
+    """
+    Envía los recordatorios pendientes hasta vaciar la bandeja (o hasta
+    `max_envios`). Retorna {'enviados': n, 'fallidos': n}.
+    """
+    config = current_app.config
+    propio = remitente is None
+    remitente = remitente or obtener_remitente()
+    limitador = LimitadorTasa(config.get('REMINDERS_RATE_PER_SECOND', 20))
+    token = uuid.uuid4().hex
+    enviados = fallidos = 0
+
+    _recuperar_interrumpidos()
+
+    try:
+        with ThreadPoolExecutor(max_workers=config.get('REMINDERS_CONCURRENCY', 8),
+                                thread_name_prefix='vetcare-recordatorios') as executor:
+            while max_envios is None or enviados + fallidos < max_envios:
+                limite = tamaño_lote if max_envios is None else min(tamaño_lote, max_envios - enviados - fallidos)
+                lote = _reclamar(token, limite)
+                if not lote:
+                    break
+                # Los hilos solo llaman al remitente; la sesión se usa en este hilo
+                resultados = list(executor.map(lambda r: _enviar(remitente, limitador, r), lote))
+                ok = _guardar_resultados(lote, resultados)
+                enviados += ok
+                fallidos += len(lote) - ok
+    finally:
+        # Las conexiones del remitente creado aquí no sobreviven al despacho
+        if propio and hasattr(remitente, 'cerrar'):
+            remitente.cerrar()
+
+    return {'enviados': enviados, 'fallidos': fallidos}
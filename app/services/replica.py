@@ -0,0 +1,113 @@
+"""
+Servicio de Réplica de Lectura
+Enruta los SELECT de las vistas marcadas a una réplica de solo lectura;
+las escrituras siempre van al servidor principal.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+import sqlalchemy as sa
+from flask import g, session, has_request_context
+from flask_sqlalchemy.session import Session
+
+# Clave del bind de la réplica en SQLALCHEMY_BINDS
+BIND_REPLICA = 'replica'
+
+# Clave en la sesión del navegador: leer del principal hasta este instante
+_CLAVE_PRIMARIO_HASTA = '_leer_primario_hasta'
+
+_usar_replica = ContextVar('usar_replica', default=False)
+
+
+class SesionEnrutada(Session):
+    """Sesión que envía las lecturas a la réplica cuando el contexto lo permite"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._puede_leer_de_replica(clause):
+            return self._db.engines[BIND_REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _puede_leer_de_replica(self, clause):
+        if not _usar_replica.get() or BIND_REPLICA not in self._db.engines:
+            return False
+        # Lo escrito en la transacción actual solo existe en el principal
+        if self._flushing or self.new or self.dirty or self.deleted or self.info.get('escritura'):
+            return False
+        return isinstance(clause, sa.Select)
+
+
+@sa.event.listens_for(SesionEnrutada, 'after_flush')
+def _marcar_escritura(sesion, flush_context):
+    sesion.info['escritura'] = True
+
+
+@sa.event.listens_for(SesionEnrutada, 'after_commit')
+def _escritura_confirmada(sesion):
+    if sesion.info.pop('escritura', False) and has_request_context():
+        g.escritura_confirmada = True
+
+
+@sa.event.listens_for(SesionEnrutada, 'after_rollback')
+def _descartar_escritura(sesion):
+    sesion.info.pop('escritura', None)
+
+
+def configurar(app):
+    """Agrega el bind de la réplica a la configuración (antes de db.init_app)"""
+    uri = app.config.get('SQLALCHEMY_REPLICA_URI')
+    if uri:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[BIND_REPLICA] = uri
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+    @app.after_request
+    def _recordar_escritura(response):
+        # Read-your-writes: tras confirmar una escritura, las siguientes
+        # peticiones de este usuario (p. ej. la redirección) leen del principal
+        if g.get('escritura_confirmada'):
+            session[_CLAVE_PRIMARIO_HASTA] = time.time() + app.config.get('REPLICA_READ_YOUR_WRITES_SECONDS', 5)
+        return response
+
+
+@contextmanager
+def lectura_replica(consistencia='propias'):
+    """
+    Contexto en el que los SELECT se envían a la réplica.
+
+    consistencia='propias' lee del principal si el usuario escribió hace
+    menos de REPLICA_READ_YOUR_WRITES_SECONDS; 'eventual' siempre usa la réplica.
+    """
+    activar = True
+    if consistencia == 'propias' and has_request_context():
+        activar = session.get(_CLAVE_PRIMARIO_HASTA, 0) <= time.time()
+    token = _usar_replica.set(activar)
+    try:
+        yield
+    finally:
+        _usar_replica.reset(token)
+
+
+@contextmanager
+def lectura_primario():
+    """Contexto en el que los SELECT van al principal aunque la vista use la réplica"""
+    token = _usar_replica.set(False)
+    try:
+        yield
+    finally:
+        _usar_replica.reset(token)
+
+
+def usar_replica(vista=None, consistencia='propias'):
+    """Decorador para vistas de solo lectura: @usar_replica o @usar_replica(consistencia='eventual')"""
+    def decorador(f):
+        @wraps(f)
+        def envoltura(*args, **kwargs):
+            with lectura_replica(consistencia):
+                return f(*args, **kwargs)
+        return envoltura
+
+    if vista is not None:
+        return decorador(vista)
+    return decorador
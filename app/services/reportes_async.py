@@ -0,0 +1,96 @@
+"""
+Servicio de Reportes Asíncronos
+Genera reportes pesados en segundo plano y guarda el resultado en caché.
+Las peticiones con los mismos parámetros comparten una única ejecución.
+"""
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app
+
+from app.services.cache import CacheResultados
+from app.services.tareas import cola
+
+# Resultados de reportes ya calculados (por proceso)
+cache_reportes = CacheResultados()
+
+# Cálculos síncronos en curso: clave -> [lock, peticiones que lo usan]
+_calculos = {}
+_lock_calculos = threading.Lock()
+
+
+def configurar(app):
+    """Ajusta la caché de reportes a la configuración de la aplicación"""
+    cache_reportes.ttl = app.config.get('REPORTS_CACHE_TTL', 600)
+    cache_reportes.max_bytes = app.config.get('REPORTS_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+
+
+def clave_reporte(tipo, parametros):
+    """Hash estable del tipo de reporte y sus parámetros"""
+    contenido = json.dumps({'tipo': tipo, 'parametros': parametros}, sort_keys=True, default=str)
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
+
+@contextmanager
+def _exclusivo(clave):
+    """Serializa los cálculos de una misma clave dentro del proceso"""
+    with _lock_calculos:
+        entrada = _calculos.setdefault(clave, [threading.Lock(), 0])
+        entrada[1] += 1
+    try:
+        with entrada[0]:
+            yield
+    finally:
+        with _lock_calculos:
+            entrada[1] -= 1
+            if not entrada[1]:
+                del _calculos[clave]
+
+
+def calcular(tipo, parametros):
+    """
+    Calcula un reporte en la petición, usando la misma caché que `solicitar`.
+    Las peticiones simultáneas con los mismos parámetros esperan al primer
+    cálculo y reutilizan su resultado.
+    """
+    clave = clave_reporte(tipo, parametros)
+    resultado = cache_reportes.get(clave)
+    if resultado is not None:
+        return resultado
+
+    with _exclusivo(clave):
+        resultado = cache_reportes.get(clave)
+        if resultado is None:
+            resultado = cola.tipos[tipo].funcion(**parametros)
+            cache_reportes.set(clave, resultado)
+    return resultado
+
+
+def solicitar(tipo, parametros):
+    """
+    Retorna (resultado, id_tarea). Si el resultado está listo `resultado`
+    contiene los datos; si no, es None y el reporte queda encolado.
+
+    El id de la tarea incluye el período de vigencia de la caché: dentro de
+    ese período todas las peticiones (de cualquier proceso, si la cola es
+    persistente) apuntan a la misma tarea.
+    """
+    clave = clave_reporte(tipo, parametros)
+    resultado = cache_reportes.get(clave)
+    if resultado is not None:
+        return resultado, None
+
+    ttl = current_app.config.get('REPORTS_CACHE_TTL', 600)
+    periodo = int(time.time() // ttl) if ttl else 0
+    id_tarea = hashlib.sha1(f'{clave}:{periodo}'.encode('utf-8')).hexdigest()[:32]
+
+    id_tarea = cola.encolar_unica(id_tarea, tipo, **parametros)
+    estado = cola.estado(id_tarea)
+    if estado and estado['estado'] == cola.COMPLETADA:
+        resultado = estado.get('resultado')
+        cache_reportes.set(clave, resultado)
+        return resultado, id_tarea
+    return None, id_tarea
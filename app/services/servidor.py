@@ -0,0 +1,75 @@
+"""
+Servicio de Servidor
+Dimensionamiento de procesos e hilos para el servidor WSGI de producción
+"""
+import os
+
+
+def calcular_dimensionamiento(cpus=None, pool_size=10, max_overflow=5, max_conexiones_bd=100, hilos_sse=0):
+    """
+    Calcula procesos (workers) e hilos por proceso.
+
+    - Procesos: 2 x CPU + 1 (regla habitual para cargas mixtas E/S y CPU),
+      limitado para que procesos x conexiones por proceso no supere el
+      máximo de conexiones admitido por el servidor de base de datos.
+    - Hilos: tantos como conexiones tiene el pool de cada proceso, para que
+      ningún hilo quede esperando una conexión libre, más los reservados
+      para los flujos SSE (que no usan conexiones a la base de datos).
+    """
+    cpus = cpus or os.cpu_count() or 1
+    conexiones_por_proceso = max(1, pool_size + max_overflow)
+    hilos = conexiones_por_proceso + hilos_sse
+
+    procesos = 2 * cpus + 1
+    procesos = min(procesos, max(1, max_conexiones_bd // conexiones_por_proceso))
+
+    return {
+        'workers': max(1, procesos),
+        'threads': max(1, hilos),
+        'conexiones_bd': max(1, procesos) * conexiones_por_proceso
+    }
+
+
+def dimensionamiento_desde_entorno():
+    """Calcula el dimensionamiento usando variables de entorno (WEB_WORKERS/WEB_THREADS las fuerzan)"""
+    calculo = calcular_dimensionamiento(
+        pool_size=int(os.environ.get('DB_POOL_SIZE', 10)),
+        max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+        max_conexiones_bd=int(os.environ.get('DB_MAX_CONNECTIONS', 100)),
+        hilos_sse=int(os.environ.get('REALTIME_MAX_CLIENTS', 25))
+    )
+    if os.environ.get('WEB_WORKERS'):
+        calculo['workers'] = int(os.environ['WEB_WORKERS'])
+    if os.environ.get('WEB_THREADS'):
+        calculo['threads'] = int(os.environ['WEB_THREADS'])
+    return calculo
+
+
+def preparar_para_fork(app):
+    """
+    Deja la aplicación completamente cargada en el proceso maestro para que
+    los workers compartan esas páginas de memoria (copy-on-write).
+    """
+    from app import db
+
+    # Forzar la carga de blueprints diferidos antes de hacer fork
+    cargar = getattr(app.wsgi_app, 'cargar', None)
+    if cargar is not None:
+        cargar()
+
+    # El maestro no debe conservar conexiones abiertas que heredarían los hijos
+    with app.app_context():
+        db.engine.dispose()
+
+
+def despues_de_fork(app):
+    """
+    Descarta en el worker las conexiones heredadas del maestro y arranca su
+    cola de tareas (recupera las tareas persistidas que quedaron sin terminar)
+    """
+    from app import db
+    from app.services.tareas import cola
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+    cola.iniciar()
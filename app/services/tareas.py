@@ -0,0 +1,341 @@
+"""
+Servicio de Tareas en Segundo Plano
+Cola de trabajos en el propio proceso, respaldada por un pool de hilos y,
+opcionalmente, por la tabla `tareas` para sobrevivir a reinicios.
+No requiere ningún broker externo.
+
+Uso:
+    @cola.tarea('propietarios.desactivar_mascotas', max_concurrencia=2)
+    def desactivar_mascotas(id_propietario):
+        ...
+
+    id_tarea = cola.encolar('propietarios.desactivar_mascotas', id_propietario=5)
+
+Cada proceso llama a `cola.iniciar()` al arrancar (post_fork en gunicorn):
+importa los módulos que registran tareas y vuelve a encolar las tareas
+persistidas que quedaron sin terminar.
+"""
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from importlib import import_module
+
+
+class TipoTarea:
+    """Definición de un tipo de tarea registrado en la cola"""
+
+    def __init__(self, nombre, funcion, max_concurrencia=1, reintentos=None):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.max_concurrencia = max_concurrencia
+        self.reintentos = reintentos
+
+
+class ColaTareas:
+    """Cola de tareas en proceso con límite de concurrencia por tipo"""
+
+    # Estados (mismos valores que el modelo Tarea)
+    PENDIENTE = 'Pendiente'
+    EN_CURSO = 'En Curso'
+    COMPLETADA = 'Completada'
+    FALLIDA = 'Fallida'
+
+    # Estados en memoria que se conservan para consulta
+    MAX_ESTADOS_EN_MEMORIA = 1000
+
+    def __init__(self, app=None):
+        self.app = None
+        self.tipos = {}
+        self.modulos = ()
+        self._lock = threading.Lock()
+        self._lock_unicas = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._pendientes = defaultdict(deque)
+        self._en_curso = defaultdict(int)
+        self._estados = OrderedDict()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, modulos=()):
+        """Asocia la cola a la aplicación (`modulos`: módulos que registran tareas)"""
+        self.app = app
+        self.modulos = tuple(modulos)
+        app.extensions['cola_tareas'] = self
+
+    def iniciar(self):
+        """Arranca la cola en este proceso y recupera las tareas interrumpidas"""
+        with self.app.app_context():
+            self._iniciar_proceso()
+
+    # ============================================
+    # REGISTRO Y ENCOLADO
+    # ============================================
+
+    def tarea(self, nombre, max_concurrencia=1, reintentos=None):
+        """Decorador que registra una función como tipo de tarea"""
+        def decorador(funcion):
+            self.tipos[nombre] = TipoTarea(nombre, funcion, max_concurrencia, reintentos)
+            return funcion
+        return decorador
+
+    def encolar(self, nombre, **parametros):
+        """Encola una tarea y retorna su identificador (los parámetros deben ser JSON)"""
+        return self._encolar(uuid.uuid4().hex, nombre, parametros)
+
+    def encolar_unica(self, id_tarea, nombre, **parametros):
+        """
+        Encola una tarea con un identificador determinista. Si ya existe una
+        tarea con ese identificador (pendiente, en curso o completada) no se
+        vuelve a encolar: las peticiones idénticas comparten el mismo cálculo.
+        """
+        with self._lock_unicas:
+            existente = self.estado(id_tarea)
+            if existente is not None and existente['estado'] != self.FALLIDA:
+                return id_tarea
+
+            if existente is not None and self.persistente:
+                from app import db
+                from app.models.tarea import Tarea
+                Tarea.query.filter_by(id_tarea=id_tarea).delete()
+                db.session.commit()
+
+            try:
+                return self._encolar(id_tarea, nombre, parametros)
+            except Exception:
+                # Otro proceso insertó la misma tarea al mismo tiempo
+                from app import db
+                db.session.rollback()
+                if self.estado(id_tarea) is None:
+                    raise
+                return id_tarea
+
+    def _encolar(self, id_tarea, nombre, parametros):
+        if nombre not in self.tipos:
+            raise KeyError(f'Tipo de tarea no registrado: {nombre}')
+
+        self._iniciar_proceso()
+
+        if self.persistente:
+            from app import db
+            from app.models.tarea import Tarea
+            db.session.add(Tarea(
+                id_tarea=id_tarea,
+                tipo=nombre,
+                parametros=json.dumps(parametros),
+                estado=Tarea.ESTADO_PENDIENTE
+            ))
+            db.session.commit()
+
+        self._guardar_estado(id_tarea, nombre, parametros, self.PENDIENTE)
+
+        if self.app.config.get('TASKS_EAGER'):
+            self._ejecutar(id_tarea, nombre, parametros, 1)
+        else:
+            self._poner_en_cola(id_tarea, nombre, parametros, 1)
+        return id_tarea
+
+    def estado(self, id_tarea):
+        """Retorna el estado de una tarea como diccionario (o None si no existe)"""
+        with self._lock:
+            estado = self._estados.get(id_tarea)
+            if estado is not None:
+                return dict(estado)
+
+        if self.persistente:
+            from app.models.tarea import Tarea
+            from app.services.replica import lectura_primario
+            # La tabla de tareas se lee siempre del principal: en la réplica
+            # puede faltar una tarea recién insertada
+            with lectura_primario():
+                tarea = Tarea.query.get(id_tarea)
+            return tarea.to_dict() if tarea else None
+        return None
+
+    @property
+    def persistente(self):
+        """Indica si las tareas se guardan en la tabla `tareas`"""
+        return bool(self.app and self.app.config.get('TASKS_PERSISTENT'))
+
+    # ============================================
+    # RECUPERACIÓN TRAS REINICIO
+    # ============================================
+
+    def recuperar(self):
+        """
+        Vuelve a encolar las tareas persistidas que no terminaron.
+        Las que siguen 'En Curso' solo se recuperan si llevan más de
+        TASKS_STALE_SECONDS sin terminar (su proceso murió).
+        """
+        if not self.persistente:
+            return 0
+
+        from app import db
+        from app.models.tarea import Tarea
+
+        # Los tipos se registran al importar sus módulos (algunos son controladores)
+        for modulo in self.modulos:
+            import_module(modulo)
+
+        limite = datetime.utcnow() - timedelta(seconds=self.app.config.get('TASKS_STALE_SECONDS', 600))
+        Tarea.query.filter(
+            Tarea.estado == Tarea.ESTADO_EN_CURSO,
+            Tarea.fecha_inicio < limite
+        ).update({Tarea.estado: Tarea.ESTADO_PENDIENTE}, synchronize_session=False)
+        db.session.commit()
+
+        from app.services.replica import lectura_primario
+        with lectura_primario():
+            recuperables = Tarea.get_recuperables()
+
+        recuperadas = 0
+        for tarea in recuperables:
+            if tarea.estado != Tarea.ESTADO_PENDIENTE:
+                continue
+            if tarea.tipo not in self.tipos:
+                self.app.logger.warning('Tarea %s sin recuperar: tipo %s no registrado', tarea.id_tarea, tarea.tipo)
+                continue
+            parametros = json.loads(tarea.parametros) if tarea.parametros else {}
+            self._guardar_estado(tarea.id_tarea, tarea.tipo, parametros, self.PENDIENTE)
+            self._poner_en_cola(tarea.id_tarea, tarea.tipo, parametros, tarea.intentos + 1)
+            recuperadas += 1
+        return recuperadas
+
+    # ============================================
+    # EJECUCIÓN
+    # ============================================
+
+    def _iniciar_proceso(self):
+        """Crea el pool de hilos en este proceso (los hilos no sobreviven a un fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.app.config.get('TASKS_MAX_WORKERS', 4),
+                thread_name_prefix='vetcare-tarea'
+            )
+            self._pendientes = defaultdict(deque)
+            self._en_curso = defaultdict(int)
+            self._pid = os.getpid()
+        self.recuperar()
+
+    def _poner_en_cola(self, id_tarea, nombre, parametros, intento):
+        with self._lock:
+            self._pendientes[nombre].append((id_tarea, parametros, intento))
+            self._despachar(nombre)
+
+    def _despachar(self, nombre):
+        """Envía al pool las tareas que caben en el límite del tipo (con el lock tomado)"""
+        tipo = self.tipos[nombre]
+        while self._pendientes[nombre] and self._en_curso[nombre] < tipo.max_concurrencia:
+            id_tarea, parametros, intento = self._pendientes[nombre].popleft()
+            self._en_curso[nombre] += 1
+            self._executor.submit(self._ejecutar_y_liberar, id_tarea, nombre, parametros, intento)
+
+    def _ejecutar_y_liberar(self, id_tarea, nombre, parametros, intento):
+        try:
+            self._ejecutar(id_tarea, nombre, parametros, intento)
+        finally:
+            with self._lock:
+                self._en_curso[nombre] -= 1
+                self._despachar(nombre)
+
+    def _ejecutar(self, id_tarea, nombre, parametros, intento):
+        """Ejecuta una tarea dentro de su propio contexto de aplicación"""
+        from app import db
+
+        tipo = self.tipos[nombre]
+        reintentos = tipo.reintentos
+        if reintentos is None:
+            reintentos = self.app.config.get('TASKS_MAX_RETRIES', 3)
+
+        with self.app.app_context():
+            if self.persistente and not self._reclamar(id_tarea):
+                return  # Otro proceso ya la tomó
+
+            self._guardar_estado(id_tarea, nombre, parametros, self.EN_CURSO, intentos=intento)
+            try:
+                resultado = tipo.funcion(**parametros)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.exception('Tarea %s (%s) falló en el intento %s', id_tarea, nombre, intento)
+                if intento <= reintentos:
+                    self._actualizar(id_tarea, nombre, parametros, self.PENDIENTE,
+                                     intentos=intento, error=str(e))
+                    self._reintentar(id_tarea, nombre, parametros, intento + 1)
+                else:
+                    self._actualizar(id_tarea, nombre, parametros, self.FALLIDA,
+                                     intentos=intento, error=str(e))
+                return
+
+            self._actualizar(id_tarea, nombre, parametros, self.COMPLETADA,
+                             intentos=intento, resultado=resultado)
+
+    def _reintentar(self, id_tarea, nombre, parametros, intento):
+        """Vuelve a encolar con espera exponencial"""
+        if self.app.config.get('TASKS_EAGER'):
+            self._ejecutar(id_tarea, nombre, parametros, intento)
+            return
+        espera = self.app.config.get('TASKS_RETRY_DELAY', 2) * (2 ** (intento - 2))
+        temporizador = threading.Timer(espera, self._poner_en_cola, (id_tarea, nombre, parametros, intento))
+        temporizador.daemon = True
+        temporizador.start()
+
+    def _reclamar(self, id_tarea):
+        """Marca la tarea 'En Curso' solo si sigue 'Pendiente' (UPDATE condicional)"""
+        from app import db
+        from app.models.tarea import Tarea
+
+        tomadas = Tarea.query.filter(
+            Tarea.id_tarea == id_tarea,
+            Tarea.estado == Tarea.ESTADO_PENDIENTE
+        ).update({
+            Tarea.estado: Tarea.ESTADO_EN_CURSO,
+            Tarea.intentos: Tarea.intentos + 1,
+            Tarea.fecha_inicio: datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        return tomadas == 1
+
+    def _actualizar(self, id_tarea, nombre, parametros, estado, intentos, resultado=None, error=None):
+        self._guardar_estado(id_tarea, nombre, parametros, estado,
+                             intentos=intentos, resultado=resultado, error=error)
+        if not self.persistente:
+            return
+
+        from app import db
+        from app.models.tarea import Tarea
+
+        cambios = {Tarea.estado: estado, Tarea.error: error}
+        if estado in (self.COMPLETADA, self.FALLIDA):
+            cambios[Tarea.fecha_fin] = datetime.utcnow()
+        if resultado is not None:
+            cambios[Tarea.resultado] = json.dumps(resultado, default=str)
+        Tarea.query.filter_by(id_tarea=id_tarea).update(cambios, synchronize_session=False)
+        db.session.commit()
+
+    def _guardar_estado(self, id_tarea, nombre, parametros, estado, intentos=0, resultado=None, error=None):
+        with self._lock:
+            actual = self._estados.pop(id_tarea, {
+                'id': id_tarea,
+                'tipo': nombre,
+                'parametros': parametros,
+                'fecha_creacion': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+            })
+            actual.update({'estado': estado, 'intentos': intentos, 'error': error})
+            if resultado is not None:
+                actual['resultado'] = resultado
+            self._estados[id_tarea] = actual
+            while len(self._estados) > self.MAX_ESTADOS_EN_MEMORIA:
+                self._estados.popitem(last=False)
+
+
+# Instancia única de la cola
+cola = ColaTareas()
@@ -0,0 +1,240 @@
+"""
+Servicio de Tiempo Real
+Difusión de cambios a las pantallas abiertas mediante Server-Sent Events.
+
+Cada evento se serializa una sola vez y se entrega a todas las conexiones
+del proceso. Con varios procesos (gunicorn) y REALTIME_DB_RELAY activo, los
+eventos se escriben en la tabla `eventos_tiempo_real` y un único hilo por
+proceso los lee cada REALTIME_POLL_SECONDS para difundirlos localmente.
+
+Uso:
+    canal.publicar('consulta', {'id': 5, 'estado': 'Completada'})
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+
+from flask import current_app, render_template
+
+from app.services.eventos import bus
+
+
+class CanalEventos:
+    """Canal de eventos en proceso con suscriptores SSE"""
+
+    # Mensajes que se conservan para reenviar tras una reconexión (Last-Event-ID)
+    MAX_HISTORIAL = 200
+
+    # Mensajes pendientes por conexión antes de considerarla bloqueada
+    MAX_PENDIENTES = 100
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._suscriptores = set()
+        self._historial = deque(maxlen=self.MAX_HISTORIAL)
+        self._ultimo_id = 0
+        self._pid_relevo = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Asocia el canal a la aplicación"""
+        self.app = app
+        app.extensions['tiempo_real'] = self
+
+    @property
+    def relevo(self):
+        """Indica si los eventos pasan por la base de datos (varios procesos)"""
+        return bool(self.app and self.app.config.get('REALTIME_DB_RELAY'))
+
+    # ============================================
+    # PUBLICACIÓN
+    # ============================================
+
+    def publicar(self, tipo, datos):
+        """Publica un evento. Nunca interrumpe la petición que lo origina."""
+        carga = json.dumps(datos, default=str)
+
+        if not self.relevo:
+            with self._lock:
+                self._ultimo_id += 1
+                self._difundir(self._ultimo_id, tipo, carga)
+            return
+
+        from app import db
+        from app.models.evento import EventoTiempoReal
+        try:
+            db.session.add(EventoTiempoReal(tipo=tipo, datos=carga))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            self.app.logger.exception('No se pudo publicar el evento %s', tipo)
+
+    def _difundir(self, id_evento, tipo, carga):
+        """Entrega un mensaje a todas las conexiones (con el lock tomado)"""
+        mensaje = f'id: {id_evento}\nevent: {tipo}\ndata: {carga}\n\n'
+        self._historial.append((id_evento, mensaje))
+        for suscriptor in list(self._suscriptores):
+            try:
+                suscriptor.put_nowait(mensaje)
+            except queue.Full:
+                # Conexión que no consume: se descarta y el navegador reconecta
+                self._suscriptores.discard(suscriptor)
+
+    # ============================================
+    # SUSCRIPCIÓN
+    # ============================================
+
+    @property
+    def conexiones(self):
+        """Número de conexiones abiertas en este proceso"""
+        return len(self._suscriptores)
+
+    def suscribir(self, ultimo_id=None):
+        """Registra una conexión y retorna su cola (con los eventos perdidos desde `ultimo_id`)"""
+        if self.relevo:
+            self._iniciar_relevo()
+
+        suscriptor = queue.Queue(maxsize=self.MAX_PENDIENTES)
+        with self._lock:
+            if ultimo_id is not None:
+                for id_evento, mensaje in self._historial:
+                    if id_evento > ultimo_id and not suscriptor.full():
+                        suscriptor.put_nowait(mensaje)
+            self._suscriptores.add(suscriptor)
+        return suscriptor
+
+    def cancelar(self, suscriptor):
+        """Elimina una conexión"""
+        with self._lock:
+            self._suscriptores.discard(suscriptor)
+
+    def flujo(self, ultimo_id=None):
+        """
+        Generador de la respuesta SSE. Envía un comentario periódico para
+        mantener viva la conexión y se cierra tras REALTIME_MAX_SECONDS para
+        liberar el hilo (el navegador reconecta solo).
+        """
+        latido = self.app.config.get('REALTIME_HEARTBEAT_SECONDS', 20)
+        limite = time.monotonic() + self.app.config.get('REALTIME_MAX_SECONDS', 300)
+        suscriptor = self.suscribir(ultimo_id)
+
+        def generar():
+            try:
+                yield 'retry: 3000\n\n'
+                while time.monotonic() < limite:
+                    try:
+                        yield suscriptor.get(timeout=latido)
+                    except queue.Empty:
+                        yield ': ping\n\n'
+            finally:
+                self.cancelar(suscriptor)
+
+        return generar()
+
+    # ============================================
+    # RELEVO ENTRE PROCESOS
+    # ============================================
+
+    def _iniciar_relevo(self):
+        """Arranca el hilo lector en este proceso (los hilos no sobreviven a un fork)"""
+        if self._pid_relevo == os.getpid():
+            return
+        with self._lock:
+            if self._pid_relevo == os.getpid():
+                return
+            self._pid_relevo = os.getpid()
+            hilo = threading.Thread(target=self._leer_relevo, name='vetcare-tiempo-real', daemon=True)
+            hilo.start()
+
+    def _leer_relevo(self):
+        from app import db
+        from app.models.evento import EventoTiempoReal
+
+        intervalo = self.app.config.get('REALTIME_POLL_SECONDS', 1)
+        retencion = timedelta(seconds=self.app.config.get('REALTIME_RETENTION_SECONDS', 3600))
+        ultimo = None
+        proxima_limpieza = 0
+
+        while True:
+            try:
+                with self.app.app_context():
+                    if ultimo is None:
+                        ultimo = db.session.query(db.func.max(EventoTiempoReal.id_evento)).scalar() or 0
+
+                    filas = db.session.query(
+                        EventoTiempoReal.id_evento, EventoTiempoReal.tipo, EventoTiempoReal.datos
+                    ).filter(EventoTiempoReal.id_evento > ultimo)\
+                     .order_by(EventoTiempoReal.id_evento).limit(500).all()
+
+                    if filas:
+                        with self._lock:
+                            for id_evento, tipo, datos in filas:
+                                self._difundir(id_evento, tipo, datos)
+                        ultimo = filas[-1][0]
+
+                    if time.monotonic() > proxima_limpieza:
+                        EventoTiempoReal.query.filter(
+                            EventoTiempoReal.fecha_creacion < datetime.utcnow() - retencion
+                        ).delete(synchronize_session=False)
+                        proxima_limpieza = time.monotonic() + 300
+                    db.session.commit()
+            except Exception:
+                self.app.logger.exception('Error leyendo eventos en tiempo real')
+            time.sleep(intervalo)
+
+
+# Instancia única del canal
+canal = CanalEventos()
+
+
+# ============================================
+# EVENTOS DE LAS PANTALLAS EN VIVO
+# ============================================
+
+def publicar_consulta(consulta):
+    """Publica una consulta de hoy con sus fragmentos ya renderizados (tarjeta y fila)"""
+    if not consulta or not consulta.fecha_hora or consulta.fecha_hora.date() != date.today():
+        return
+    canal.publicar('consulta', {
+        'id': consulta.id_consulta,
+        'hora': consulta.fecha_hora.strftime('%H:%M'),
+        'estado': consulta.estado,
+        'tarjeta': render_template('consultas/_tarjeta_hoy.html', c=consulta),
+        'fila': render_template('consultas/_fila_hoy.html', consulta=consulta)
+    })
+
+
+@bus.suscriptor('Consulta', 'Factura', asincrono=True)
+def _consultas_en_vivo(cambios):
+    """Consultas nuevas o modificadas (o cuya factura cambió) se envían a las pantallas"""
+    from app.models.consulta import Consulta
+    from app.models.factura import Factura
+
+    ids = {c.id for c in cambios if c.entidad == 'Consulta' and c.operacion != c.ELIMINADO}
+    ids_facturas = [c.id for c in cambios if c.entidad == 'Factura']
+    if ids_facturas:
+        ids.update(id_consulta for (id_consulta,) in
+                   Factura.query.with_entities(Factura.id_consulta)
+                   .filter(Factura.id_factura.in_(ids_facturas), Factura.id_consulta.isnot(None)))
+    if not ids:
+        return
+
+    # Los fragmentos usan url_for: se renderizan en un contexto de petición simulado
+    with current_app.test_request_context():
+        for consulta in Consulta.query.filter(Consulta.id_consulta.in_(ids)):
+            publicar_consulta(consulta)
+
+
+@bus.suscriptor('CalendarioVacunacion', asincrono=True)
+def _vacunacion_en_vivo(cambios):
+    """Cambios de estado de las vacunaciones"""
+    for cambio in cambios:
+        # Las campañas (INSERT masivo) se publican sin id de fila
+        if cambio.id is not None and 'estado' in cambio.valores:
+            canal.publicar('vacunacion', {'id': cambio.id, 'estado': cambio.valores['estado']})
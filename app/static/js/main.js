@@ -170,8 +170,57 @@ function hideLoading(elementId) {
     }
 }
 
+/**
+ * Pantallas en vivo: escucha el flujo SSE y llama al manejador de cada tipo
+ * de evento. Si el servidor no acepta más conexiones, recarga la página
+ * periódicamente como antes.
+ */
+function conectarEnVivo(url, manejadores, segundosRespaldo) {
+    if (!window.EventSource) {
+        setTimeout(function() { window.location.reload(); }, (segundosRespaldo || 120) * 1000);
+        return null;
+    }
+
+    var fuente = new EventSource(url);
+    Object.keys(manejadores).forEach(function(tipo) {
+        fuente.addEventListener(tipo, function(e) {
+            manejadores[tipo](JSON.parse(e.data));
+        });
+    });
+    fuente.onerror = function() {
+        if (fuente.readyState === EventSource.CLOSED) {
+            setTimeout(function() { window.location.reload(); }, (segundosRespaldo || 120) * 1000);
+        }
+    };
+    return fuente;
+}
+
+/**
+ * Reemplaza el elemento con id `id` por `html`, o lo inserta en `contenedor`
+ * respetando el orden por data-hora. Retorna true si el elemento es nuevo.
+ */
+function reemplazarOInsertar(contenedor, id, html, hora) {
+    var plantilla = document.createElement('template');
+    plantilla.innerHTML = html.trim();
+    var nuevo = plantilla.content.firstElementChild;
+
+    var actual = document.getElementById(id);
+    if (actual) {
+        actual.replaceWith(nuevo);
+        return false;
+    }
+
+    var siguiente = Array.prototype.find.call(contenedor.children, function(el) {
+        return (el.dataset.hora || '') > hora;
+    });
+    contenedor.insertBefore(nuevo, siguiente || null);
+    return true;
+}
+
 // Exportar funciones para uso global
 window.VetCare = {
+    conectarEnVivo: conectarEnVivo,
+    reemplazarOInsertar: reemplazarOInsertar,
     cargarMascotas: cargarMascotas,
     formatDate: formatDate,
     formatDateTime: formatDateTime,
@@ -54,6 +54,126 @@ class Config:
     
     # Mostrar consultas SQL en consola (solo para desarrollo)
     SQLALCHEMY_ECHO = False
+    
+    # ============================================
+    # RÉPLICA DE LECTURA (opcional)
+    # ============================================
+    # Las vistas marcadas con @usar_replica envían sus SELECT a esta réplica
+    SQLALCHEMY_REPLICA_URI = os.environ.get('SQLALCHEMY_REPLICA_URI')
+    
+    # Segundos que un usuario lee del principal después de escribir
+    REPLICA_READ_YOUR_WRITES_SECONDS = 5
+    
+    # ============================================
+    # TAREAS EN SEGUNDO PLANO
+    # ============================================
+    TASKS_MAX_WORKERS = int(os.environ.get('TASKS_MAX_WORKERS', 4))  # Hilos por proceso
+    TASKS_MAX_RETRIES = 3
+    TASKS_RETRY_DELAY = 2  # Segundos (se duplica en cada reintento)
+    # Guardar las tareas en la tabla `tareas` (necesario con varios procesos)
+    TASKS_PERSISTENT = os.environ.get('TASKS_PERSISTENT', '0') == '1'
+    TASKS_STALE_SECONDS = 600  # Tareas 'En Curso' más antiguas se consideran interrumpidas
+    TASKS_EAGER = False  # Ejecutar en la misma petición (pruebas)
+    
+    # ============================================
+    # REPORTES ASÍNCRONOS
+    # ============================================
+    REPORTS_ASYNC_MIN_DAYS = 90  # Rangos más largos se generan en segundo plano
+    REPORTS_CACHE_TTL = 600  # Segundos que se reutiliza un reporte generado
+    REPORTS_CACHE_MAX_BYTES = 32 * 1024 * 1024  # Tamaño máximo de la caché por proceso
+    
+    # ============================================
+    # PANTALLAS EN VIVO (Server-Sent Events)
+    # ============================================
+    # Conexiones SSE por proceso (cada una ocupa un hilo, pero no una conexión a BD)
+    REALTIME_MAX_CLIENTS = int(os.environ.get('REALTIME_MAX_CLIENTS', 25))
+    REALTIME_HEARTBEAT_SECONDS = 20
+    REALTIME_MAX_SECONDS = 300  # El navegador reconecta al cerrarse el flujo
+    # Compartir eventos entre procesos a través de la tabla `eventos_tiempo_real`
+    REALTIME_DB_RELAY = os.environ.get('REALTIME_DB_RELAY', '0') == '1'
+    REALTIME_POLL_SECONDS = 1
+    REALTIME_RETENTION_SECONDS = 3600
+    
+    # ============================================
+    # AGENDA DE CONSULTAS
+    # ============================================
+    AGENDA_HORA_INICIO = '08:00'
+    AGENDA_HORA_FIN = '18:00'
+    AGENDA_DIAS_LABORABLES = (0, 1, 2, 3, 4, 5)  # Lunes a sábado
+    AGENDA_INTERVALO_MINUTOS = 15  # Separación entre horarios propuestos
+    AGENDA_DIAS_BUSQUEDA = 14  # Días hacia adelante al buscar horarios libres
+    CONSULTA_DURACION_MINUTOS = 30  # Duración si la consulta no tiene servicio
+    
+    # ============================================
+    # RECORDATORIOS DE VACUNACIÓN
+    # ============================================
+    REMINDERS_DAYS_BEFORE = 7  # Días de anticipación
+    # Clase que envía los recordatorios ('modulo.Clase' con método enviar)
+    REMINDERS_SENDER = os.environ.get('REMINDERS_SENDER', 'app.services.recordatorios.RemitenteLog')
+    REMINDERS_CONCURRENCY = int(os.environ.get('REMINDERS_CONCURRENCY', 8))
+    REMINDERS_RATE_PER_SECOND = int(os.environ.get('REMINDERS_RATE_PER_SECOND', 50))
+    REMINDERS_MAX_ATTEMPTS = 5
+    REMINDERS_RETRY_DELAY = 60  # Segundos (se duplica en cada reintento)
+    REMINDERS_STALE_SECONDS = 600  # Envíos 'Enviando' más antiguos se consideran interrumpidos
+    
+    # Servidor de correo (RemitenteSMTP)
+    MAIL_SERVER = os.environ.get('MAIL_SERVER', 'localhost')
+    MAIL_PORT = int(os.environ.get('MAIL_PORT', 25))
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', '0') == '1'
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_SENDER = os.environ.get('MAIL_SENDER', 'VetCare Pro <no-reply@vetcare.local>')
+    
+    # ============================================
+    # CALENDARIO DE VACUNACIÓN
+    # ============================================
+    # Entradas visibles por día en cada vista (el resto solo se cuenta)
+    CALENDAR_MONTH_ENTRIES_PER_DAY = 4
+    CALENDAR_WEEK_ENTRIES_PER_DAY = 25
+    CALENDAR_AGENDA_ENTRIES_PER_DAY = 200
+    CALENDAR_AGENDA_DAYS = 14
+    CALENDAR_CACHE_TTL = 3600  # Segundos que se reutiliza un rango ya cerrado
+    
+    # ============================================
+    # PRONÓSTICO DE VACUNACIÓN
+    # ============================================
+    FORECAST_HORIZON_DAYS = 90
+    FORECAST_HISTORY_DAYS = 365  # Período para las tasas históricas
+    FORECAST_OVERDUE_DAYS = 90  # Dosis atrasadas que aún se esperan
+    FORECAST_TTL_SECONDS = 900  # Recalcular aunque no haya cambios (otros procesos)
+    
+    # ============================================
+    # MIGRACIONES (ver app/services/migraciones.py)
+    # ============================================
+    MIGRATIONS_BACKFILL_BATCH = 5000  # Filas por transacción en los rellenos de datos
+    MIGRATIONS_BACKFILL_PAUSE = 0.1  # Segundos entre lotes (deja pasar al resto del tráfico)
+    
+    # ============================================
+    # ARCHIVO (ver app/services/archivo.py)
+    # ============================================
+    # Consultas y vacunaciones cerradas con más antigüedad pasan a las tablas
+    # de archivo (debe superar los períodos de los reportes habituales)
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 730))
+    ARCHIVE_BATCH_SIZE = 1000
+    ARCHIVE_PAUSE = 0.1  # Segundos entre lotes
+    
+    # ============================================
+    # INSTANTÁNEAS PARA REPORTES (ver app/services/instantaneas.py)
+    # ============================================
+    SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'instance', 'instantaneas')
+    SNAPSHOT_REFRESH_MONTHS = 2  # Meses recientes que se vuelven a exportar en cada ejecución
+    # Fuente de los reportes históricos: 'bd' o 'instantanea' (se puede elegir con ?fuente=)
+    REPORTS_SOURCE = os.environ.get('REPORTS_SOURCE', 'bd')
+    
+    # ============================================
+    # ARRANQUE
+    # ============================================
+    # Diferir la carga de controladores y modelos hasta la primera petición
+    LAZY_BLUEPRINTS = os.environ.get('LAZY_BLUEPRINTS', '0') == '1'
+    
+    # Crear/actualizar el esquema al iniciar con las migraciones (inspecciona el esquema en cada arranque)
+    CREATE_TABLES_ON_STARTUP = True
 
 
 class DevelopmentConfig(Config):
@@ -66,12 +186,31 @@ class ProductionConfig(Config):
     """Configuración para producción"""
     DEBUG = False
     SQLALCHEMY_ECHO = False
+    LAZY_BLUEPRINTS = os.environ.get('LAZY_BLUEPRINTS', '1') == '1'
+    TASKS_PERSISTENT = os.environ.get('TASKS_PERSISTENT', '1') == '1'
+    REALTIME_DB_RELAY = os.environ.get('REALTIME_DB_RELAY', '1') == '1'
+    CREATE_TABLES_ON_STARTUP = False  # El esquema se actualiza con: flask migraciones aplicar
+    
+    # Pool de conexiones por proceso (ver app/services/servidor.py)
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+        # executemany de pyodbc en un solo viaje (importaciones masivas)
+        'fast_executemany': True
+    }
 
 
 class TestingConfig(Config):
     """Configuración para pruebas"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    TASKS_EAGER = True
+    REMINDERS_SENDER = 'app.services.recordatorios.RemitenteMemoria'
+    REMINDERS_RATE_PER_SECOND = 0  # Sin límite
+    MIGRATIONS_BACKFILL_PAUSE = 0
+    ARCHIVE_PAUSE = 0
 
 
 # Diccionario de configuraciones
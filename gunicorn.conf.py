@@ -0,0 +1,55 @@
+"""
+VetCare Pro - Configuración de Gunicorn (producción)
+
+Uso:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Recarga sin cortes:   kill -HUP <pid del maestro>
+Detención ordenada:   kill -TERM <pid del maestro>
+"""
+import gc
+import os
+
+from app.services.servidor import dimensionamiento_desde_entorno, preparar_para_fork, despues_de_fork
+
+_dimension = dimensionamiento_desde_entorno()
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:8000')
+
+# Procesos x hilos según CPU y tamaño del pool de conexiones
+worker_class = 'gthread'
+workers = _dimension['workers']
+threads = _dimension['threads']
+
+# Reciclar workers tras N peticiones (con dispersión para no reiniciarlos a la vez)
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', 100))
+
+# Cargar la aplicación en el maestro antes del fork (copy-on-write)
+preload_app = True
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    """Se ejecuta en el maestro con la aplicación ya cargada"""
+    server.log.info('VetCare Pro: %s workers x %s hilos (%s conexiones BD máx.)',
+                    workers, threads, _dimension['conexiones_bd'])
+
+
+def on_starting(server):
+    """Prepara la aplicación precargada antes de crear los workers"""
+    preparar_para_fork(server.app.wsgi())
+    # Congelar los objetos del maestro para que el GC de los workers
+    # no escriba en las páginas compartidas
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Cada worker abre su propio pool de conexiones"""
+    despues_de_fork(server.app.wsgi())
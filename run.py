@@ -2,16 +2,22 @@
 VetCare Pro - Sistema de Gestión de Veterinaria
 Punto de entrada de la aplicación
 """
-from app import create_app, db
+from app import create_app
 
 # Crear la instancia de la aplicación
 app = create_app('development')
 
 if __name__ == '__main__':
-    # Crear las tablas si no existen
-    with app.app_context():
-        db.create_all()
-        print("✓ Base de datos verificada/creada correctamente")
+    # Crear las tablas o aplicar las migraciones pendientes
+    if app.config.get('CREATE_TABLES_ON_STARTUP'):
+        from app.services import migraciones
+        with app.app_context():
+            migraciones.actualizar(salida=print)
+            print("✓ Base de datos verificada/actualizada correctamente")
+    
+    # Desglose del tiempo de arranque
+    print("\nTiempo de arranque:")
+    print(app.extensions['vetcare_arranque'].texto())
     
     # Ejecutar el servidor de desarrollo
     print("\n" + "="*50)
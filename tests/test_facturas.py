@@ -0,0 +1,103 @@
+"""
+Pruebas: registro de pagos (app/services/facturas.py)
+Usan una base SQLite en archivo (TestingConfig) para poder abrir dos
+sesiones sobre la misma factura.
+"""
+from decimal import Decimal
+
+import pytest
+
+import config
+from app import create_app, db
+from app.models import DetalleFactura, Especie, Factura, Mascota, Propietario
+from app.services import facturas
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_DATABASE_URI',
+                        f"sqlite:///{tmp_path / 'facturas.db'}")
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def factura(app):
+    """Factura pendiente de un item de 100 + IGV (total 118.00)"""
+    propietario = Propietario(nombre='Pérez, Ana', documento='12345678', telefono='999')
+    especie = Especie(nombre='Perro')
+    db.session.add_all([propietario, especie])
+    db.session.flush()
+    mascota = Mascota(id_propietario=propietario.id_propietario, id_especie=especie.id_especie, nombre='Firulais')
+    db.session.add(mascota)
+    db.session.flush()
+    factura = Factura(numero_factura='F-0001', id_propietario=propietario.id_propietario,
+                      id_mascota=mascota.id_mascota)
+    db.session.add(factura)
+    db.session.flush()
+    detalle = DetalleFactura(id_factura=factura.id_factura, descripcion='Consulta', cantidad=1, precio_unitario=100)
+    detalle.calcular_subtotal()
+    db.session.add(detalle)
+    factura.calcular_totales()
+    db.session.commit()
+    return factura.id_factura
+
+
+def _leer(id_factura):
+    db.session.expire_all()
+    return db.session.get(Factura, id_factura)
+
+
+def test_pago_parcial(factura):
+    pago = facturas.registrar_pago(factura, 50, 'Efectivo')
+
+    f = _leer(factura)
+    assert pago.monto == Decimal('50.00')
+    assert f.total == Decimal('118.00')
+    assert f.monto_pagado == Decimal('50.00')
+    assert f.saldo_pendiente == Decimal('68.00')
+    assert f.estado == Factura.ESTADO_PARCIAL
+    assert facturas.verificar() == []
+
+
+def test_pago_mayor_al_saldo_aplica_solo_el_saldo(factura):
+    facturas.registrar_pago(factura, 100, 'Efectivo')
+    pago = facturas.registrar_pago(factura, 100, 'Tarjeta')
+
+    f = _leer(factura)
+    assert pago.monto == Decimal('18.00')
+    assert f.monto_pagado == Decimal('118.00')
+    assert f.saldo_pendiente == Decimal('0.00')
+    assert f.estado == Factura.ESTADO_PAGADA
+    assert facturas.verificar() == []
+
+    with pytest.raises(facturas.PagoRechazado):
+        facturas.registrar_pago(factura, 1, 'Efectivo')
+
+
+def test_pago_durante_el_cambio_de_items_no_se_pierde(app, factura):
+    # Sesión del usuario que agrega un item: carga la factura antes del pago
+    f = db.session.get(Factura, factura)
+    assert f.monto_pagado in (None, 0)
+
+    # Otro cajero registra un pago en otra sesión y lo confirma
+    with app.app_context():
+        facturas.registrar_pago(factura, 50, 'Efectivo')
+        db.session.remove()
+
+    detalle = DetalleFactura(id_factura=factura, descripcion='Vacuna', cantidad=1, precio_unitario=10)
+    detalle.calcular_subtotal()
+    db.session.add(detalle)
+    f.agregar_detalle(detalle)
+    db.session.commit()
+
+    f = _leer(factura)
+    assert f.num_items == 2
+    assert f.total == Decimal('129.80')
+    assert f.monto_pagado == Decimal('50.00')
+    assert f.saldo_pendiente == Decimal('79.80')
+    assert facturas.verificar() == []
@@ -0,0 +1,35 @@
+"""
+Pruebas: planes de las consultas clave (app/services/planes.py)
+Se ejecutan con `python -m pytest` sobre SQLite en memoria (TestingConfig).
+"""
+import pytest
+
+from app.services import planes
+
+
+@pytest.fixture(scope='module')
+def resultados():
+    return planes.verificar()
+
+
+def test_se_revisan_todas_las_consultas_clave(resultados):
+    revisadas = {r['consulta'] for r in resultados}
+    assert revisadas, 'No se capturó ninguna sentencia'
+    assert 'Consulta.get_by_periodo' in revisadas
+    assert 'cobranza.consulta_resumen' in revisadas
+
+
+def test_ninguna_consulta_recorre_tablas_grandes(resultados):
+    problemas = {r['consulta']: r['problemas'] for r in resultados if r['problemas']}
+    assert not problemas, f'Recorridos completos de {planes.TABLAS_GRANDES}: {problemas}'
+
+
+def test_revisar_detecta_recorridos_completos():
+    problemas, avisos = planes._revisar([
+        'SCAN consultas',
+        'SEARCH pagos USING INDEX idx_pagos_dia (fecha>? AND fecha<?)',
+        'SCAN facturas USING INDEX idx_facturas_deudores',
+        'USE TEMP B-TREE FOR ORDER BY'
+    ], parciales={'idx_facturas_deudores'})
+    assert problemas == ['SCAN consultas']
+    assert avisos == ['USE TEMP B-TREE FOR ORDER BY']
@@ -0,0 +1,27 @@
+"""
+VetCare Pro - Punto de entrada WSGI para producción
+
+Linux:    gunicorn -c gunicorn.conf.py wsgi:app
+Windows:  python wsgi.py   (waitress, un proceso con varios hilos)
+"""
+import os
+
+from app import create_app
+
+app = create_app(os.environ.get('FLASK_CONFIG', 'production'))
+
+
+if __name__ == '__main__':
+    from app.services.servidor import dimensionamiento_desde_entorno
+
+    dimension = dimensionamiento_desde_entorno()
+    host, _, port = os.environ.get('WEB_BIND', '0.0.0.0:8000').partition(':')
+
+    if os.name == 'nt':
+        # Gunicorn no funciona en Windows: waitress con un hilo por conexión del pool
+        from waitress import serve
+        from app.services.tareas import cola
+        cola.iniciar()
+        serve(app, host=host, port=int(port or 8000), threads=dimension['threads'])
+    else:
+        os.execvp('gunicorn', ['gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'])